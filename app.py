@@ -1,18 +1,95 @@
-from flask import Flask, render_template, jsonify, request
-from typing import Optional
+from flask import Flask, Response, g, render_template, jsonify, request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import contextvars
 import copy
+import functools
+import hashlib
+import json
+import logging
 import os
+import sqlite3
+import threading
+import time
 
-from support_models import SUPPORT_MODELS, get_model_blueprint, DEFAULT_NODE_INSIGHT
+from support_models import SUPPORT_MODELS, get_model_blueprint, registry_version, DEFAULT_NODE_INSIGHT
+from support_models.blueprint_store import (
+    BlueprintStore,
+    batch_blueprint_store,
+    blueprint_store,
+    get_stored_blueprint,
+)
+from support_models.blueprint_token import (
+    InvalidBlueprintToken,
+    decode_token,
+    encode_token,
+    token_key,
+    token_ttl,
+)
+from support_models.compression import (
+    available_encodings,
+    compress,
+    compression_enabled,
+    compression_threshold,
+    negotiate,
+    precompressed_cache,
+)
+from support_models import json_patch
+from support_models.admission import AdmissionRejected, llm_priority
+from support_models.metrics import (
+    FALLBACKS,
+    REGISTRY,
+    REQUEST_SECONDS,
+    CallbackMetric,
+    collect_request_stages,
+    render_metrics,
+    request_stages,
+    reset_request_stages,
+    restore_metrics,
+    stage_timer,
+    suppress_metrics,
+)
+from support_models.job_queue import JobWorkers, get_job_queue
+from support_models.logging_config import configure_logging
 from support_models.offroad_logistics import generate_dynamic_blueprint
+from support_models.profiling import get_profile_store, is_authorized, profile_token, profiler_from_request
+from support_models.tracing import current_span, finish_trace, span, start_trace, traced, wrap_context
 from support_models.llm_client import (
     BlueprintResult,
     ClassificationResult,
     classify_model_with_llm,
     generate_blueprint_with_llm,
 )
+from support_models.scenarios import find_best_scenario, load_scenarios
+from support_models.warmup import WarmupStep, blueprint_steps, scenario_steps, warmup
 
 app = Flask(__name__)
+configure_logging()
+logger = logging.getLogger("app")
+
+# 启动预热发出的内部请求在 WSGI environ 中带此标记：不计入指标，不追踪，不剖析
+WARMUP_ENVIRON = 'supportmodel.warmup'
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return max(1.0, float(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+# 异步任务执行期间发生的回退原因；只在任务工作线程中设置（见 _run_update_job）
+_job_fallbacks: "contextvars.ContextVar[Optional[List[str]]]" = contextvars.ContextVar(
+    "supportmodel_job_fallbacks", default=None
+)
+
+
+def _record_fallback(reason: str) -> None:
+    FALLBACKS.inc(reason=reason)
+    current_span().set_attribute("fallback.cause", reason)
+    reasons = _job_fallbacks.get()
+    if reasons is not None:
+        reasons.append(reason)
 
 
 def _normalize_model_name(model_name):
@@ -21,6 +98,7 @@ def _normalize_model_name(model_name):
     return SUPPORT_MODELS[0]
 
 
+@traced()
 def _auto_detect_model(task_description: str) -> str:
     """
     通过大模型根据任务描述自动判断所属支援模型。
@@ -29,31 +107,39 @@ def _auto_detect_model(task_description: str) -> str:
     - 仅在 USE_LLM_BLUEPRINT 为真时启用自动分类，避免在纯离线模式下误调用
     """
     use_llm = os.environ.get("USE_LLM_BLUEPRINT", "").lower() in {"1", "true", "yes"}
+    trace_span = current_span()
     if not task_description.strip():
         # 无任务描述时，保持默认模型且不调 LLM
+        trace_span.set_attribute("classification.path", "empty_task")
         return SUPPORT_MODELS[0]
 
     if not use_llm:
         # 未开启 LLM 时，仅使用默认模型
-        return SUPPORT_MODELS[0]
+        trace_span.set_attribute("classification.path", "local_default")
+        with stage_timer("classify_local"):
+            return SUPPORT_MODELS[0]
 
+    trace_span.set_attribute("classification.path", "llm")
     try:
-        result: ClassificationResult = classify_model_with_llm(task_description)
+        with stage_timer("classify_llm"):
+            result: ClassificationResult = classify_model_with_llm(task_description)
         model_name = result.model_name
+        trace_span.set_attribute("model.name", model_name)
         if model_name in SUPPORT_MODELS:
-            print(
-                f"[LLM] 自动分类结果: model_name={model_name}, reason={result.reason}",
-                flush=True,
-            )
+            logger.info("自动分类结果: model_name=%s, reason=%s", model_name, result.reason)
             return model_name
-        print(
-            f"[LLM] 分类结果不在候选集合中，回退默认模型: raw={result.raw_content!r}",
-            flush=True,
-        )
+        logger.warning("分类结果不在候选集合中，回退默认模型: raw=%r", result.raw_content)
+        _record_fallback("classification_out_of_set")
+        return SUPPORT_MODELS[0]
+    except AdmissionRejected as e:
+        # 大模型调用排队超过时限，不再等待，直接使用默认模型
+        logger.warning("自动分类被准入控制拒绝: %s", e)
+        _record_fallback("classification_shed")
         return SUPPORT_MODELS[0]
     except Exception as e:
         # 任意异常都不影响原有逻辑
-        print(f"[LLM] 自动分类异常: {e}", flush=True)
+        logger.warning("自动分类异常: %s", e)
+        _record_fallback("classification_error")
         return SUPPORT_MODELS[0]
 
 
@@ -64,7 +150,7 @@ def _maybe_use_llm_blueprint(
     在保持现有输入输出结构不变的前提下，按需调用大模型生成蓝图。
 
     - 通过环境变量 USE_LLM_BLUEPRINT 控制是否启用（值为 "1" 或 "true" 时启用）。
-    - 若 LLM 生成失败，则回退到传入的 base_blueprint。
+    - 若 LLM 生成失败，或排队超过准入控制的时限，则回退到传入的 base_blueprint（规则/静态蓝图）。
     """
     use_llm = os.environ.get("USE_LLM_BLUEPRINT", "").lower() in {"1", "true", "yes"}
     if not use_llm or not task_description.strip():
@@ -77,36 +163,64 @@ def _maybe_use_llm_blueprint(
         blueprint = result.blueprint
         # 简单校验关键字段，避免前端崩溃
         if not isinstance(blueprint, dict):
+            _record_fallback("invalid_blueprint")
             return base_blueprint
         if "behavior_tree" not in blueprint or "node_insights" not in blueprint:
+            _record_fallback("invalid_blueprint")
             return base_blueprint
         return blueprint
+    except AdmissionRejected as e:
+        logger.warning("蓝图生成被准入控制拒绝，回退规则/静态蓝图: %s", e)
+        _record_fallback("llm_shed")
+        return base_blueprint
     except Exception:
         # 出现任何异常都不影响原有逻辑，直接回退
+        _record_fallback("llm_error")
         return base_blueprint
 
 
+def _no_progress(stage: str) -> None:
+    pass
+
+
+@traced()
 def build_behavior_tree(
-    blueprint: dict, task_description: str, model_name: Optional[str] = None
+    blueprint: dict,
+    task_description: str,
+    model_name: Optional[str] = None,
+    progress: Callable[[str], None] = _no_progress,
 ):
     """
     根据蓝图和任务描述构建行为树，并返回最终使用的蓝图。
 
+    progress 在进入 match / generate / validate 阶段时被调用，供异步任务上报进度。
+
     返回值:
         (behavior_tree: dict, final_blueprint: dict)
     """
+    progress("match")
+    trace_span = current_span()
+    trace_span.set_attributes(**{"model.name": model_name, "blueprint.source": "static"})
     # 对于越野物流模型，优先使用现有的规则动态生成
     if model_name == "越野物流" and task_description.strip():
-        blueprint = generate_dynamic_blueprint(task_description)
+        trace_span.set_attribute("blueprint.source", "rule")
+        with stage_timer("dynamic_parse"):
+            blueprint = generate_dynamic_blueprint(task_description)
 
     # 可选：使用大模型生成/替换蓝图（例如当正则解析能力不足时）
-    blueprint = _maybe_use_llm_blueprint(
+    progress("generate")
+    llm_blueprint = _maybe_use_llm_blueprint(
         model_name=model_name or "",
         task_description=task_description,
         base_blueprint=blueprint,
     )
+    if llm_blueprint is not blueprint:
+        trace_span.set_attribute("blueprint.source", "llm")
+    blueprint = llm_blueprint
 
-    tree = copy.deepcopy(blueprint.get("behavior_tree", {}))
+    progress("validate")
+    with stage_timer("deepcopy"):
+        tree = copy.deepcopy(blueprint.get("behavior_tree", {}))
     description = (task_description or "等待输入的任务描述").strip()
 
     def _inject_summary(node):
@@ -121,21 +235,14 @@ def build_behavior_tree(
     return tree, blueprint
 
 
-def extract_node_insight(
-    model_name: str,
-    node_id: str,
-    blueprint: Optional[dict] = None,
-    task_description: Optional[str] = None,
-):
-    """从蓝图中提取节点描述"""
-    if not node_id:
-        node_id = "task_ingest"
-
-    blueprint = blueprint or get_model_blueprint(model_name)
+def _rebuild_blueprint(model_name: str, task_description: Optional[str]) -> dict:
+    """按任务描述重新构建蓝图（会话蓝图已淘汰或未携带时的回退路径）。"""
+    blueprint = get_model_blueprint(model_name)
 
     # 对于越野物流模型，使用规则生成的蓝图作为基础
     if model_name == "越野物流" and task_description and task_description.strip():
-        blueprint = generate_dynamic_blueprint(task_description)
+        with stage_timer("dynamic_parse"):
+            blueprint = generate_dynamic_blueprint(task_description)
 
     # 可选：在节点洞察请求场景下也允许通过 LLM 调整蓝图
     if task_description:
@@ -144,6 +251,27 @@ def extract_node_insight(
             task_description=task_description,
             base_blueprint=blueprint,
         )
+    return blueprint
+
+
+@traced()
+def extract_node_insight(
+    model_name: str,
+    node_id: str,
+    blueprint: Optional[dict] = None,
+    task_description: Optional[str] = None,
+):
+    """
+    从蓝图中提取节点描述。
+
+    传入 blueprint 时直接读取；未传入时按任务描述重新构建蓝图（规则/LLM）。
+    """
+    if not node_id:
+        node_id = "task_ingest"
+    current_span().set_attributes(**{"node.id": node_id, "blueprint.provided": blueprint is not None})
+
+    if blueprint is None:
+        blueprint = _rebuild_blueprint(model_name, task_description)
 
     node_info = copy.deepcopy(
         blueprint.get("node_insights", {}).get(node_id, DEFAULT_NODE_INSIGHT)
@@ -160,6 +288,264 @@ def extract_node_insight(
     }
 
 
+def _use_llm() -> bool:
+    return os.environ.get("USE_LLM_BLUEPRINT", "").lower() in {"1", "true", "yes"}
+
+
+def _content_etag(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def _not_modified(etag: str, cache_control: str):
+    """
+    If-None-Match 命中 etag（或其压缩表示 "<etag>-<编码>"）时返回 304 响应，否则返回 None。
+
+    POST 请求同样按 If-None-Match 处理（由前端显式携带上次的 ETag）。
+    """
+    for variant in (etag,) + tuple(f"{etag}-{encoding}" for encoding in available_encodings()):
+        if request.if_none_match.contains(variant):
+            response = app.response_class(status=304)
+            response.set_etag(variant)
+            response.headers['Cache-Control'] = cache_control
+            return response
+    return None
+
+
+def _conditional_json(payload, etag: str, cache_control: str, precompress: bool = False):
+    """
+    带强校验器的 JSON 响应：If-None-Match 命中时返回 304（见 _not_modified），不再发送响应体。
+
+    precompress 只用于固定的预置内容（/api/models、空任务静态蓝图、example_output）：
+    响应体由 etag 唯一确定，以最高级别压缩一次后缓存复用；其余响应按动态级别逐次压缩。
+    """
+    response = _not_modified(etag, cache_control)
+    if response is not None:
+        return response
+    with stage_timer("serialize"):
+        response = jsonify(payload)
+    response.set_etag(etag)
+    if precompress:
+        response.precompress_key = etag
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _server_timing_enabled() -> bool:
+    return os.environ.get("SERVER_TIMING", "").lower() in {"1", "true", "yes"}
+
+
+def _is_warmup_request() -> bool:
+    return bool(request.environ.get(WARMUP_ENVIRON))
+
+
+@app.before_request
+def _start_request_timer():
+    if _is_warmup_request():
+        g.metrics_token = suppress_metrics()
+        return
+    g.request_started = time.perf_counter()
+    if _server_timing_enabled():
+        g.stage_token = collect_request_stages()
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    g.trace = start_trace(
+        f"{request.method} {rule}",
+        request.headers.get('traceparent'),
+        **{"http.method": request.method, "http.route": rule},
+    )
+
+
+@app.teardown_request
+def _finish_request_trace(error):
+    finish_trace(g.pop('trace', None), error)
+    token = g.pop('stage_token', None)
+    if token is not None:
+        reset_request_stages(token)
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        restore_metrics(token)
+
+
+@app.after_request
+def _observe_request(response):
+    """
+    按路由模板（而非实际路径）记录请求耗时，避免 job_id 等路径参数撑大标签基数。
+
+    SERVER_TIMING 开启时附带 Server-Timing 响应头（各阶段与总耗时，毫秒），供压测按请求拆分耗时。
+    """
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(
+            elapsed,
+            route=rule,
+            method=request.method,
+            status=str(response.status_code),
+        )
+        stages = request_stages()
+        if stages is not None:
+            timings = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in stages.items()]
+            response.headers['Server-Timing'] = ", ".join(timings + [f"total;dur={elapsed * 1000:.2f}"])
+    trace_span = current_span()
+    if trace_span.trace_id:
+        trace_span.set_attribute("http.status_code", response.status_code)
+        response.headers['X-Trace-Id'] = trace_span.trace_id
+    return response
+
+
+@app.after_request
+def _compress_response(response):
+    """
+    按 Accept-Encoding 协商 gzip / brotli 压缩超过阈值的响应。
+
+    只有带 precompress_key 的预置内容以最高级别压缩并缓存复用，其余响应（包括带 ETag 的
+    规则蓝图）按动态级别压缩，避免为不会重复的响应付出 brotli 11 的代价；流式响应与非 200 响应保持原样。
+    """
+    if not compression_enabled() or response.status_code != 200:
+        return response
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+    if not (response.mimetype or '').startswith(('application/json', 'text/')):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    if not encoding:
+        return response
+    body = response.get_data()
+    if len(body) < compression_threshold():
+        return response
+
+    key = getattr(response, 'precompress_key', None)
+    if key:
+        data = precompressed_cache.get_or_compress(key, encoding, body)
+    else:
+        data = compress(body, encoding)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def _profile_credential() -> Optional[str]:
+    return request.headers.get('X-Profile') or request.args.get('profile')
+
+
+@app.before_request
+def _start_profiler():
+    """管理员按需剖析：未配置 PROFILE_TOKEN 时直接返回。"""
+    if not profile_token() or _is_warmup_request():
+        return
+    profiler = profiler_from_request(
+        _profile_credential(),
+        request.headers.get('X-Profile-Mode') or request.args.get('profile_mode'),
+    )
+    if profiler is not None:
+        g.profiler = profiler
+        profiler.start()
+
+
+@app.after_request
+def _attach_profile(response):
+    """
+    停止剖析并保存报告（X-Profile-Id 响应头，/api/profiles/<id> 下载）。
+
+    JSON 对象响应额外附带 profile 字段；响应体已改变，因此去掉 ETag 与预压缩键。
+    注册在压缩钩子之后，按 Flask 的逆序执行，先于压缩运行。
+    """
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+    report = profiler.report()
+    profile_id = get_profile_store().save(report, profiler.format)
+    response.headers['X-Profile-Id'] = profile_id
+    response.headers['Cache-Control'] = 'no-store'
+    if response.status_code == 200 and response.is_json and not response.is_streamed:
+        payload = response.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload['profile'] = {
+                'id': profile_id,
+                'mode': profiler.mode,
+                'format': profiler.format,
+                'elapsed_seconds': round(profiler.elapsed, 6),
+                'samples': profiler.samples,
+                'report': report,
+            }
+            response.set_data(app.json.dumps(payload))
+            response.headers.pop('ETag', None)
+            response.precompress_key = None
+    return response
+
+
+@app.teardown_request
+def _stop_profiler(error):
+    # 异常路径上 after_request 可能未执行，保证剖析器不会遗留在线程上
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """下载剖析报告（同样需要 PROFILE_TOKEN），top 为文本表格，collapsed 可直接生成火焰图"""
+    stored = get_profile_store().load(profile_id) if is_authorized(_profile_credential()) else None
+    if stored is None:
+        return jsonify({'error': 'profile not found'}), 404
+    fmt, report = stored
+    response = Response(report, content_type='text/plain; charset=utf-8')
+    response.headers['X-Profile-Format'] = fmt
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def _is_canned_update(model_name: str, task_description: str, explicit: bool) -> bool:
+    """
+    判断 /api/update 的响应是否为固定的预置内容：空任务的静态蓝图，或显式指定模型且命中预置 example_output。
+
+    这类响应会被反复请求，值得预压缩；规则生成的普通任务虽然确定，但大多不会重复出现。
+    """
+    if not task_description:
+        return True
+    if not explicit:
+        return False
+    scenario, score = find_best_scenario(model_name=model_name, query=task_description)
+    return scenario is not None and score >= 0.9 and bool(scenario.example_output)
+
+
+def _update_validator(data: dict) -> Optional[Tuple[str, bool]]:
+    """
+    在构建响应体之前计算 /api/update 的强校验器，返回 (etag, 是否预置内容)；响应不确定时返回 None。
+
+    只有结果由 (注册表版本, 模型, 任务描述, 精简模式) 唯一决定的请求才带 ETag：
+    未启用 LLM 时规则/静态蓝图总是确定的；启用 LLM 时只有预置内容（见 _is_canned_update）是确定的，
+    自动分类与大模型生成不是。返回补丁还是完整内容取决于会话存储是否仍有 base 蓝图，
+    签名令牌带有过期时间，这两类响应同样不带校验器。
+    """
+    if data.get('base_blueprint_id') or token_key():
+        return None
+    task_description = (data.get('task_description') or '').strip()
+    explicit_model_name = data.get('model_name')
+    if explicit_model_name:
+        model_name = _normalize_model_name(explicit_model_name)
+    elif task_description and _use_llm():
+        return None
+    else:
+        model_name = SUPPORT_MODELS[0]
+    canned = _is_canned_update(model_name, task_description, bool(explicit_model_name))
+    if _use_llm() and not canned:
+        return None
+    etag = _content_etag(
+        registry_version(),
+        model_name,
+        hashlib.sha256(task_description.encode('utf-8')).hexdigest(),
+        'lean' if data.get('lean') else 'full',
+    )
+    return etag, canned
+
+
 @app.route('/')
 def index():
     """主页面"""
@@ -169,48 +555,331 @@ def index():
 @app.route('/api/models', methods=['GET'])
 def get_models():
     """获取支援模型列表"""
-    return jsonify({'models': SUPPORT_MODELS})
+    return _conditional_json(
+        {'models': SUPPORT_MODELS},
+        _content_etag('models', registry_version()),
+        'public, no-cache',
+        precompress=True,
+    )
 
 
-@app.route('/api/update', methods=['POST'])
-def update():
-    """根据任务描述生成行为树与策略依据"""
-    data = request.json or {}
-    task_description = data.get('task_description', '').strip()
+def _use_patch_if_smaller(response: dict, base_id: str, base: dict, current: dict) -> None:
+    """
+    用相对 base 的 RFC 6902 补丁替换响应中的完整行为树（及节点洞察）。
+
+    补丁作用于 {"default_focus", "behavior_tree"[, "node_insights"]}，精简模式下不含节点洞察；
+    补丁序列化后不小于完整内容时保持原样。
+    """
+    keys = [key for key in ('default_focus', 'behavior_tree', 'node_insights') if key == 'default_focus' or key in response]
+    old = {key: base.get(key) for key in keys}
+    new = {key: current.get(key) for key in keys}
+    patch = json_patch.diff(old, new)
+    full_size = len(json.dumps({key: new[key] for key in keys if key != 'default_focus'}, ensure_ascii=False))
+    if len(json.dumps(patch, ensure_ascii=False)) >= full_size:
+        return
+    for key in keys:
+        response.pop(key, None)
+    response['base_blueprint_id'] = base_id
+    response['patch'] = patch
+
+
+def _build_update_payload(
+    data: dict,
+    progress: Callable[[str], None] = _no_progress,
+    store: BlueprintStore = blueprint_store,
+) -> dict:
+    """
+    /api/update 的响应体：分类 → 构建行为树 → 提取默认节点洞察 → 保存会话蓝图。
 
-    # 优先使用自动分类结果；如前端仍显式传入 model_name，则以显式参数为准
-    auto_model_name = _auto_detect_model(task_description)
+    会话蓝图写入 store；批量接口传入 batch_blueprint_store，避免挤掉交互会话。
+    """
+    task_description = (data.get('task_description') or '').strip()
+
+    progress("classify")
+
+    # 前端显式传入 model_name 时以显式参数为准，不再调用自动分类；否则使用自动分类结果
     explicit_model_name = data.get('model_name')
+    auto_model_name = None if explicit_model_name else _auto_detect_model(task_description)
     model_name = _normalize_model_name(explicit_model_name) if explicit_model_name else auto_model_name
 
+    current_span().set_attributes(**{
+        "model.explicit": bool(explicit_model_name),
+        "model.name": model_name,
+        "task.length": len(task_description),
+    })
     if explicit_model_name:
-        print(
-            f"[API] /api/update 使用显式模型: explicit={explicit_model_name} -> normalized={model_name}",
-            flush=True,
-        )
+        logger.info("/api/update 使用显式模型: explicit=%s -> normalized=%s", explicit_model_name, model_name)
     else:
-        print(
-            f"[API] /api/update 使用自动分类模型: auto={auto_model_name}",
-            flush=True,
-        )
+        logger.info("/api/update 使用自动分类模型: auto=%s", auto_model_name)
 
     base_blueprint = get_model_blueprint(model_name)
     behavior_tree, final_blueprint = build_behavior_tree(
-        base_blueprint, task_description, model_name
+        base_blueprint, task_description, model_name, progress
     )
     default_node_id = final_blueprint.get('default_focus', behavior_tree.get('id'))
     node_insight = extract_node_insight(
         model_name, default_node_id, final_blueprint, task_description
     )
 
-    return jsonify({
+    # 保存最终蓝图，后续 /api/node_insight 携带 blueprint_id 即可直接查表
+    session_blueprint = {
+        'default_focus': default_node_id,
+        'behavior_tree': behavior_tree,
+        'node_insights': final_blueprint.get('node_insights', {}),
+    }
+    blueprint_id = store.put(session_blueprint)
+
+    response = {
         'model_name': model_name,
         'task_description': task_description,
         'behavior_tree': behavior_tree,
         'node_insights': final_blueprint.get('node_insights', {}),
         'insight': node_insight,
-        'default_node_id': default_node_id
-    })
+        'default_node_id': default_node_id,
+        'blueprint_id': blueprint_id
+    }
+
+    # 精简模式：不下发全部节点洞察，只给出带知识图谱（可点击）的节点 id，按需通过 /api/node_insights 获取
+    if data.get('lean'):
+        insights = response.pop('node_insights')
+        response['graph_node_ids'] = [
+            node_id for node_id, info in insights.items()
+            if isinstance(info, dict) and info.get('knowledge_graph')
+        ]
+
+    # 增量模式：客户端携带已有蓝图的 base_blueprint_id 时，补丁更小则只返回补丁
+    base_blueprint_id = data.get('base_blueprint_id')
+    if base_blueprint_id:
+        base_blueprint = get_stored_blueprint(base_blueprint_id)
+        if base_blueprint is not None:
+            _use_patch_if_smaller(response, base_blueprint_id, base_blueprint, session_blueprint)
+
+    # 多主机部署：配置 BLUEPRINT_TOKEN_KEY 后额外返回签名令牌，任意主机均可解码
+    key = token_key()
+    if key:
+        response['blueprint_token'] = encode_token(session_blueprint, key, ttl=token_ttl())
+
+    return response
+
+
+@app.route('/api/update', methods=['POST'])
+def update():
+    """
+    根据任务描述生成行为树与策略依据。
+
+    请求体带 "lean": true 时为精简模式，见 _build_update_payload。
+    ?async=1 时把请求写入持久化任务队列并立即返回 202 与 job_id，
+    客户端轮询 /api/jobs/<job_id> 获取进度与结果。
+    """
+    data = request.json or {}
+    if request.args.get('async', '').lower() in {'1', 'true', 'yes'}:
+        queue = get_job_queue()
+        job_id, reused = queue.submit(data)
+        _ensure_job_workers().notify()
+        logger.info("/api/update 异步任务: job_id=%s reused=%s", job_id, reused)
+        job = queue.get(job_id) or {'status': 'queued'}
+        response = jsonify({'job_id': job_id, 'status': job['status'], 'reused': reused})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
+
+    # 校验器在构建之前计算：重新验证命中时直接返回 304，不再构建响应体
+    validator = _update_validator(data)
+    if validator is not None:
+        etag, canned = validator
+        not_modified = _not_modified(etag, 'private, no-cache')
+        if not_modified is not None:
+            return not_modified
+
+    payload = _build_update_payload(data)
+    if validator is not None:
+        # 只有预置内容走预压缩缓存；其余确定性响应仍带 ETag，但按动态级别压缩
+        return _conditional_json(payload, etag, 'private, no-cache', precompress=canned)
+
+    with stage_timer("serialize"):
+        response = jsonify(payload)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+_job_workers: Optional[JobWorkers] = None
+_job_workers_lock = threading.Lock()
+
+
+def _run_update_job(data: dict, progress: Callable[[str], None]) -> Tuple[dict, Optional[str]]:
+    """
+    异步任务处理函数，返回 (响应体, 降级原因)。
+
+    客户端选择异步就是为了等待大模型结果，因此使用 batch 优先级（排队时限更长）；
+    仍发生回退（被准入控制拒绝、生成失败等）时结果照常返回，但标记为降级、不参与复用。
+    """
+    token = _job_fallbacks.set([])
+    try:
+        with llm_priority("batch"):
+            payload = _build_update_payload(data, progress)
+        reasons = _job_fallbacks.get() or []
+    finally:
+        _job_fallbacks.reset(token)
+    return payload, (f"fallback: {', '.join(dict.fromkeys(reasons))}" if reasons else None)
+
+
+def _ensure_job_workers() -> JobWorkers:
+    """
+    启动异步任务工作线程（JOB_WORKERS，缺省 2），重复调用只启动一次。
+
+    启动后会先接手队列中遗留的排队任务与租约过期任务；见 _resume_pending_jobs。
+    """
+    global _job_workers
+    with _job_workers_lock:
+        if _job_workers is None:
+            queue = get_job_queue()
+            queue.purge_expired()
+            _job_workers = JobWorkers(queue, _run_update_job, workers=int(_env_number('JOB_WORKERS', 2)))
+            _job_workers.start()
+    return _job_workers
+
+
+def _resume_pending_jobs() -> None:
+    """进程启动时队列中有遗留任务则立即启动工作线程，进程重启后未完成的任务无需等待客户端访问即可继续执行。"""
+    try:
+        pending = get_job_queue().pending()
+    except sqlite3.Error as e:
+        logger.warning("读取任务队列失败，暂不启动工作线程: %s", e)
+        return
+    if pending:
+        logger.info("任务队列中有 %d 个未完成任务，启动工作线程", pending)
+        _ensure_job_workers()
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询异步任务的状态、阶段进度（classify/match/generate/validate）与结果"""
+    _ensure_job_workers()
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'job not found or expired'}), 404
+    return jsonify(job)
+
+
+# 批量接口共享的有界线程池：吞吐受上游并发限制，而非请求往返次数
+BATCH_WORKERS = int(_env_number('BATCH_WORKERS', 8))
+BATCH_ITEM_TIMEOUT = _env_number('BATCH_ITEM_TIMEOUT', 300)
+BATCH_MAX_ITEMS = int(_env_number('BATCH_MAX_ITEMS', 1000))
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+
+
+def _iter_batch_results(items: List[dict], timeout: float) -> Iterator[dict]:
+    """
+    在共享线程池上处理批量条目，按完成顺序产出 {"index", "status", ...}。
+
+    - 相同 (model_name, task_description, lean, base_blueprint_id) 的条目只计算一次，结果分发给所有下标；
+    - 会话蓝图写入独立的 batch_blueprint_store，不挤占交互会话；
+    - 超时从条目开始执行时计时，排队等待不计入；超时条目返回 status=timeout
+      （工作线程无法强制终止，会在后台跑完并照常写入各级缓存）；
+    - 大模型调用使用 batch 优先级，与在线 /api/update 争用时让出名额。
+    """
+    groups: Dict[tuple, List[int]] = {}
+    for index, item in enumerate(items):
+        key = (
+            item.get('model_name') or None,
+            (item.get('task_description') or '').strip(),
+            bool(item.get('lean')),
+            item.get('base_blueprint_id') or None,
+        )
+        groups.setdefault(key, []).append(index)
+
+    started_at: Dict[int, float] = {}
+    lock = threading.Lock()
+
+    def _run(slot: int, item: dict) -> dict:
+        with lock:
+            started_at[slot] = time.monotonic()
+        with span("batch_item", **{"batch.slot": slot}), llm_priority("batch"):
+            return _build_update_payload(item, store=batch_blueprint_store)
+
+    pending = {}
+    for slot, indexes in enumerate(groups.values()):
+        future = _batch_executor.submit(wrap_context(_run), slot, items[indexes[0]])
+        pending[future] = (slot, indexes)
+
+    while pending:
+        done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+        finished = []
+        for future in done:
+            slot, indexes = pending[future]
+            try:
+                outcome = {'status': 'ok', 'result': future.result()}
+            except Exception as e:
+                outcome = {'status': 'error', 'error': str(e)}
+            finished.append((future, indexes, outcome))
+
+        now = time.monotonic()
+        with lock:
+            for future, (slot, indexes) in pending.items():
+                if future not in done and slot in started_at and now - started_at[slot] > timeout:
+                    outcome = {'status': 'timeout', 'error': f'超过单条超时 {timeout:g}s'}
+                    finished.append((future, indexes, outcome))
+
+        for future, indexes, outcome in finished:
+            del pending[future]
+            for index in indexes:
+                yield dict(outcome, index=index)
+
+
+@app.route('/api/update/batch', methods=['POST'])
+def update_batch():
+    """
+    批量生成行为树。
+
+    请求体为条目数组，或 {"items": [...], "stream": bool, "timeout": 秒}。
+    缺省按输入顺序一次性返回 {"results": [...]}；stream 为真（或 ?stream=1）时
+    以 NDJSON 按完成顺序逐条返回，每行带 index。
+    """
+    data = request.json
+    options = data if isinstance(data, dict) else {}
+    items = data if isinstance(data, list) else options.get('items')
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'items must be a list of objects'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'too many items (max {BATCH_MAX_ITEMS})'}), 400
+
+    try:
+        timeout = min(float(options.get('timeout', BATCH_ITEM_TIMEOUT)), BATCH_ITEM_TIMEOUT)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'timeout must be a number'}), 400
+    if not timeout > 0:
+        return jsonify({'error': 'timeout must be greater than 0'}), 400
+
+    stream = options.get('stream') or request.args.get('stream', '').lower() in {'1', 'true', 'yes'}
+    logger.info("/api/update/batch items=%d stream=%s", len(items), bool(stream))
+
+    results = _iter_batch_results(items, timeout)
+    if stream:
+        lines = (json.dumps(result, ensure_ascii=False) + '\n' for result in results)
+        return Response(lines, mimetype='application/x-ndjson')
+
+    ordered = sorted(results, key=lambda result: result['index'])
+    return jsonify({'results': ordered})
+
+
+def _lookup_session_blueprint(data: dict) -> Optional[dict]:
+    """
+    按 blueprint_token / blueprint_id 取回 /api/update 生成的蓝图，均未命中时返回 None。
+    """
+    token = data.get('blueprint_token')
+    key = token_key()
+    if token and key:
+        try:
+            return decode_token(token, key)
+        except InvalidBlueprintToken as e:
+            logger.warning("/api/node_insight 蓝图令牌无效: %s", e)
+
+    blueprint_id = data.get('blueprint_id')
+    if not blueprint_id:
+        return None
+    blueprint = get_stored_blueprint(blueprint_id)
+    if blueprint is None:
+        logger.info("/api/node_insight 蓝图 %s 已淘汰或不存在，重新生成", blueprint_id)
+    return blueprint
 
 
 @app.route('/api/node_insight', methods=['POST'])
@@ -224,7 +893,134 @@ def node_insight():
     if not node_id:
         return jsonify({'error': 'node_id is required'}), 400
 
-    return jsonify(extract_node_insight(model_name, node_id, task_description=task_description))
+    blueprint = _lookup_session_blueprint(data)
+
+    return jsonify(
+        extract_node_insight(model_name, node_id, blueprint, task_description=task_description)
+    )
+
+
+NODE_INSIGHTS_MAX_IDS = 200
+
+
+@app.route('/api/node_insights', methods=['POST'])
+def node_insights():
+    """
+    批量返回节点洞察，配合精简模式按需加载与预取。
+
+    请求体：{"node_ids": [...], "blueprint_id"/"blueprint_token", "model_name", "task_description"}；
+    会话蓝图已淘汰时按任务描述重新构建一次蓝图，再逐个提取。
+    """
+    data = request.json or {}
+    node_ids = data.get('node_ids')
+    if not isinstance(node_ids, list) or not all(isinstance(node_id, str) for node_id in node_ids):
+        return jsonify({'error': 'node_ids must be a list of strings'}), 400
+    if len(node_ids) > NODE_INSIGHTS_MAX_IDS:
+        return jsonify({'error': f'too many node_ids (max {NODE_INSIGHTS_MAX_IDS})'}), 400
+
+    model_name = _normalize_model_name(data.get('model_name', SUPPORT_MODELS[0]))
+    task_description = data.get('task_description', '')
+    blueprint = _lookup_session_blueprint(data)
+    if blueprint is None:
+        blueprint = _rebuild_blueprint(model_name, task_description)
+
+    return jsonify({
+        'node_insights': {
+            node_id: extract_node_insight(model_name, node_id, blueprint)
+            for node_id in dict.fromkeys(node_ids)
+        }
+    })
+
+
+_MEMORY_CACHES = (
+    ('blueprint_store', blueprint_store),
+    ('batch_blueprint_store', batch_blueprint_store),
+    ('precompressed', precompressed_cache),
+)
+
+
+def _memory_cache_operations() -> Dict[tuple, float]:
+    return {
+        (name, key): value
+        for name, cache in _MEMORY_CACHES
+        for key, value in cache.stats().items()
+        if key != 'entries'
+    }
+
+
+def _memory_cache_entries() -> Dict[tuple, float]:
+    return {(name,): cache.stats()['entries'] for name, cache in _MEMORY_CACHES}
+
+
+# 内存缓存自行维护的统计只在抓取时读取，请求路径上不增加任何开销
+REGISTRY.register(CallbackMetric(
+    "supportmodel_memory_cache_operations_total",
+    "In-process cache operations (blueprint store, precompressed responses).",
+    ["cache", "result"],
+    _memory_cache_operations,
+    kind="counter",
+))
+REGISTRY.register(CallbackMetric(
+    "supportmodel_memory_cache_entries",
+    "Entries currently held by in-process caches.",
+    ["cache"],
+    _memory_cache_entries,
+))
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 文本格式的运行时指标。"""
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """就绪探针：预热完成前返回 503；?verbose=1 附带逐项耗时。"""
+    report = warmup.report(verbose=request.args.get('verbose', '').lower() in {'1', 'true', 'yes'})
+    response = jsonify(report)
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 200 if warmup.ready else 503
+
+
+def _warm_request(method: str, path: str, body: Optional[dict] = None) -> None:
+    """以未压缩与每种可用编码各请求一次，填充 ETag 对应的预压缩缓存；请求带 WARMUP_ENVIRON 标记。"""
+    client = app.test_client()
+    for encoding in ('',) + available_encodings():
+        headers = {'Accept-Encoding': encoding} if encoding else {}
+        response = client.open(
+            path, method=method, json=body, headers=headers, environ_overrides={WARMUP_ENVIRON: True}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"{method} {path} 返回 {response.status_code}")
+
+
+def _warm_update(body: dict) -> None:
+    for lean in (True, False):
+        _warm_request('POST', '/api/update', dict(body, lean=lean))
+
+
+def _warmup_steps() -> Iterator[WarmupStep]:
+    """
+    静态蓝图与 example_output 的构建/校验，以及可缓存的 /api/update 响应。
+
+    只预热结果确定的请求（空任务的静态蓝图、显式模型 + 场景 example_input），
+    不会触发自动分类或大模型调用；响应进入会话蓝图存储与预压缩缓存。
+    """
+    yield from blueprint_steps()
+    yield from scenario_steps()
+    yield 'response', '/api/models', functools.partial(_warm_request, 'GET', '/api/models')
+    for model_name in SUPPORT_MODELS:
+        body = {'model_name': model_name, 'task_description': ''}
+        yield 'response', f'{model_name}:static', functools.partial(_warm_update, body)
+    for scenario in load_scenarios():
+        if scenario.example_output and _is_canned_update(scenario.model_name, scenario.example_input, True):
+            body = {'model_name': scenario.model_name, 'task_description': scenario.example_input}
+            yield 'response', scenario.id, functools.partial(_warm_update, body)
+
+
+_resume_pending_jobs()
+warmup.start(_warmup_steps)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,63 @@
+"""
+无状态蓝图令牌的体积与编解码延迟。
+
+取内置场景中 JSON 体积最大的 example_output，对比原始 JSON、不同压缩级别下的
+令牌长度，以及编码（压缩 + 签名）/ 解码（验签 + 解压 + 解析）的耗时。
+
+用法：
+    python bench/blueprint_token.py --iterations 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support_models.blueprint_token import decode_token, encode_token  # noqa: E402
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+KEY = b"bench-key"
+
+
+def _timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    scenario = max(
+        (s for s in SCENARIOS if s.example_output),
+        key=lambda s: len(json.dumps(s.example_output, ensure_ascii=False)),
+    )
+    blueprint = scenario.example_output
+    raw = json.dumps(blueprint, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    print(f"largest example_output: {scenario.id} ({scenario.name})")
+    print(f"raw JSON: {len(raw)} bytes, {len(blueprint.get('node_insights', {}))} node_insights")
+    print()
+    print(f"{'level':>5} {'token bytes':>12} {'ratio':>7} {'encode p50/p95 ms':>18} {'decode p50/p95 ms':>18}")
+
+    for level in (1, 6, 9):
+        token = encode_token(blueprint, KEY, level=level)
+        assert decode_token(token, KEY) == blueprint
+        enc = _timed(lambda: encode_token(blueprint, KEY, level=level), args.iterations)
+        dec = _timed(lambda: decode_token(token, KEY), args.iterations)
+        print(
+            f"{level:>5} {len(token):>12} {len(token) / len(raw):>7.2%} "
+            f"{enc[0]:>8.3f}/{enc[1]:<9.3f} {dec[0]:>8.3f}/{dec[1]:<9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+响应压缩的压缩率与 CPU 开销。
+
+对每个静态模型蓝图与 JSON 体积最大的若干 example_output，按 /api/update 的响应形态
+序列化后，分别测量 gzip / brotli 在动态级别与预压缩级别下的体积、压缩率与单次压缩耗时，
+并给出预压缩缓存命中时的耗时。
+
+用法：
+    python bench/compression.py --iterations 20 --top 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support_models import SUPPORT_MODELS, get_model_blueprint  # noqa: E402
+from support_models.compression import (  # noqa: E402
+    PrecompressedCache,
+    available_encodings,
+    compress,
+)
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+
+def _response_body(model_name, blueprint):
+    """与 /api/update 响应相同结构的 JSON 字节（jsonify 缺省不转义中文）。"""
+    focus = blueprint.get("default_focus")
+    payload = {
+        "model_name": model_name,
+        "task_description": "",
+        "behavior_tree": blueprint.get("behavior_tree", {}),
+        "node_insights": blueprint.get("node_insights", {}),
+        "insight": blueprint.get("node_insights", {}).get(focus, {}),
+        "default_node_id": focus,
+    }
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def _median_ms(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--top", type=int, default=5, help="取体积最大的 example_output 数量")
+    args = parser.parse_args()
+
+    bodies = [(f"static:{name}", _response_body(name, get_model_blueprint(name))) for name in SUPPORT_MODELS]
+    canned = sorted(
+        (s for s in SCENARIOS if s.example_output),
+        key=lambda s: len(json.dumps(s.example_output, ensure_ascii=False)),
+        reverse=True,
+    )[: args.top]
+    bodies += [(f"example:{s.id}", _response_body(s.model_name, s.example_output)) for s in canned]
+
+    variants = [(encoding, profile) for encoding in available_encodings() for profile in ("dynamic", "static")]
+    header = f"{'payload':<40} {'raw KB':>8}" + "".join(f" {e + '/' + p[:3]:>18}" for e, p in variants)
+    print(header)
+    print(" " * 49 + "".join(f" {'ratio  ms':>18}" for _ in variants))
+
+    totals = {variant: [] for variant in variants}
+    for label, body in bodies:
+        row = f"{label[:40]:<40} {len(body) / 1024:>8.1f}"
+        for encoding, profile in variants:
+            size = len(compress(body, encoding, profile))
+            cost = _median_ms(lambda: compress(body, encoding, profile), args.iterations)
+            totals[(encoding, profile)].append((size / len(body), cost))
+            row += f" {size / len(body):>9.1%} {cost:>7.2f}"
+        print(row)
+
+    print()
+    for (encoding, profile), values in totals.items():
+        ratio = statistics.mean(v[0] for v in values)
+        cost = statistics.mean(v[1] for v in values)
+        print(f"{encoding:>5} {profile:<8} mean ratio {ratio:.1%}, mean CPU {cost:.2f} ms/response")
+
+    cache = PrecompressedCache()
+    label, body = max(bodies, key=lambda item: len(item[1]))
+    encoding = available_encodings()[0]
+    cache.get_or_compress(label, encoding, body)
+    hit = _median_ms(lambda: cache.get_or_compress(label, encoding, body), args.iterations * 10)
+    print(f"precompressed cache hit ({encoding}, {label}): {hit * 1000:.1f} µs/response")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+本地 OpenAI 兼容的大模型替身服务（/v1/chat/completions），压测与基准不消耗真实配额。
+
+回复内容：
+- 分类请求：按任务描述与各场景 example_input 的相似度返回 model_name；
+- 蓝图请求：回放提示词中匹配场景的 example_output（两阶段生成时按阶段截取行为树或指定节点的洞察）；
+- --recorded 指定录制文件（JSONL，兼容 support_models/cassette.py 的录制格式）时，
+  优先按 (model, messages) 精确匹配录制的回复。
+
+延迟与故障：
+- --ttft 首 token 延迟，--token-delay 单 token 解码延迟（中文按 2 字符 / token 估算）；
+- --error-rate 按比例返回 --error-status（缺省 500），--timeout-rate 按比例挂起 --hang 秒不响应；
+- 请求体带 "stream": true 时以 SSE 逐 token 推送 chat.completion.chunk。
+
+独立运行后把 BASE_URL 指向它即可：
+    python bench/fake_llm.py --port 8001 --ttft 0.4 --token-delay 0.02 --error-rate 0.02
+    export BASE_URL=http://127.0.0.1:8001/v1 API_KEY=fake USE_LLM_BLUEPRINT=1
+
+基准脚本中用 start_server(FakeLLM(...)) 在随机端口上启动。
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support_models.cassette import request_key  # noqa: E402
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+# 中文内容粗略按 2 字符 / token 估算
+CHARS_PER_TOKEN = 2.0
+
+_SCENARIO_RE = re.compile(r"匹配到的测试任务场景：(\S+) - ")
+_NODE_IDS_RE = re.compile(r"本次需要输出洞察的节点 id：(.*)")
+_CLASSIFY_TASK_RE = re.compile(r"现在有一个新的任务描述：(.*)。", re.S)
+
+
+@dataclass
+class FakeLLMConfig:
+    ttft: float = 0.0
+    token_delay: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    timeout_rate: float = 0.0
+    hang: float = 600.0
+    seed: Optional[int] = None
+
+
+def load_recorded(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    读取录制文件：每行一个 JSON 对象，含 content，以及 key 或 (model, messages)。
+
+    可选字段 finish_reason、usage 原样回放；LLM_CASSETTE=record 录制的文件可直接使用。
+    """
+    recorded: Dict[str, Dict[str, Any]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            key = entry.get("key") or request_key(entry["model"], entry["messages"])
+            recorded[key] = entry
+    return recorded
+
+
+def _text(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def _classification_reply(text: str) -> Dict[str, Any]:
+    match = _CLASSIFY_TASK_RE.search(text)
+    task = match.group(1) if match else text
+    best = max(SCENARIOS, key=lambda s: SequenceMatcher(None, task, s.example_input).ratio())
+    return {"model_name": best.model_name, "reason": f"与测试项目「{best.name}」最相近"}
+
+
+def _scenario_reply(text: str) -> Dict[str, Any]:
+    """根据提示词中的匹配场景从 example_output 中截取对应阶段的回复。"""
+    match = _SCENARIO_RE.search(text)
+    scenario = next((s for s in SCENARIOS if match and s.id == match.group(1) and s.example_output), None)
+    if scenario is None:
+        scenario = max(
+            (s for s in SCENARIOS if s.example_output),
+            key=lambda s: SequenceMatcher(None, text[-500:], s.example_input).ratio(),
+        )
+    output = scenario.example_output or {}
+
+    ids_match = _NODE_IDS_RE.search(text)
+    if ids_match:
+        wanted = [i.strip() for i in ids_match.group(1).split(",")]
+        insights = output.get("node_insights", {})
+        return {"node_insights": {i: insights[i] for i in wanted if i in insights}}
+    if "两阶段生成的第一阶段" in text:
+        return {
+            "default_focus": output.get("default_focus"),
+            "behavior_tree": output.get("behavior_tree"),
+        }
+    return output
+
+
+class FakeLLM:
+    """决定每个请求的回复内容与注入的故障；content 非空时总是返回该固定内容。"""
+
+    def __init__(
+        self,
+        config: Optional[FakeLLMConfig] = None,
+        recorded: Optional[Dict[str, Dict[str, Any]]] = None,
+        content: Optional[str] = None,
+    ):
+        self.config = config or FakeLLMConfig()
+        self.recorded = recorded or {}
+        self.content = content
+        self.stats: Counter = Counter()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+
+    def fault(self) -> Optional[str]:
+        """按配置的比例返回 "error"、"timeout" 或 None。"""
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._random.random()
+        if roll < self.config.error_rate:
+            outcome = "error"
+        elif roll < self.config.error_rate + self.config.timeout_rate:
+            outcome = "timeout"
+        else:
+            return None
+        with self._lock:
+            self.stats[outcome] += 1
+        return outcome
+
+    def reply(self, body: Dict[str, Any]) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        """返回 (content, finish_reason, 录制的 usage 或 None)。"""
+        if self.content is not None:
+            return self.content, "stop", None
+        messages = body.get("messages", [])
+        entry = self.recorded.get(request_key(body.get("model", ""), messages))
+        if entry is not None:
+            with self._lock:
+                self.stats["recorded"] += 1
+            return entry["content"], entry.get("finish_reason") or "stop", entry.get("usage")
+        text = _text(messages)
+        if "路由助手" in text:
+            reply = _classification_reply(text)
+        else:
+            reply = _scenario_reply(text)
+        return json.dumps(reply, ensure_ascii=False), "stop", None
+
+
+def _tokens(content: str) -> List[str]:
+    step = int(CHARS_PER_TOKEN)
+    return [content[i:i + step] for i in range(0, len(content), step)] or [""]
+
+
+def make_handler(fake: FakeLLM):
+    config = fake.config
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "fake"}]})
+            else:
+                self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                return
+
+            fault = fake.fault()
+            if fault == "timeout":
+                time.sleep(config.hang)
+                return
+            if fault == "error":
+                self._send_json(config.error_status, {"error": {"message": "injected error", "type": "server_error"}})
+                return
+
+            content, finish_reason, usage = fake.reply(body)
+            tokens = _tokens(content)
+            if usage is None:
+                usage = {
+                    "prompt_tokens": int(len(_text(body.get("messages", []))) / CHARS_PER_TOKEN),
+                    "completion_tokens": len(tokens),
+                }
+            usage = dict(usage, total_tokens=usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0))
+            base = {"id": f"fake-{random.getrandbits(32):08x}", "created": int(time.time()), "model": body.get("model", "fake")}
+
+            if body.get("stream"):
+                self._stream(base, tokens, finish_reason, usage, bool((body.get("stream_options") or {}).get("include_usage")))
+                return
+            time.sleep(config.ttft + len(tokens) * config.token_delay)
+            self._send_json(200, dict(
+                base,
+                object="chat.completion",
+                choices=[{"index": 0, "finish_reason": finish_reason, "message": {"role": "assistant", "content": content}}],
+                usage=usage,
+            ))
+
+        def _stream(self, base, tokens, finish_reason, usage, include_usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+            def _event(choices, **extra):
+                chunk = dict(base, object="chat.completion.chunk", choices=choices, **extra)
+                self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+
+            started = time.perf_counter() + config.ttft
+            time.sleep(config.ttft)
+            _event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            for index, token in enumerate(tokens, 1):
+                # 按绝对时间表推进，避免逐次 sleep 的误差累积
+                delay = started + index * config.token_delay - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                _event([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+            _event([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+            if include_usage:
+                _event([], usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_server(fake: FakeLLM, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """在后台线程中启动服务；base_url 为 http://<host>:<server.server_port>/v1。"""
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft", type=float, default=0.4, help="首 token 延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="单 token 解码延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误状态码的请求比例")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="挂起不响应的请求比例")
+    parser.add_argument("--hang", type=float, default=600.0, help="超时注入时挂起的秒数")
+    parser.add_argument("--recorded", help="录制回复文件（JSONL）")
+    parser.add_argument("--seed", type=int, help="故障注入的随机种子")
+    args = parser.parse_args()
+
+    fake = FakeLLM(
+        FakeLLMConfig(
+            ttft=args.ttft,
+            token_delay=args.token_delay,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            timeout_rate=args.timeout_rate,
+            hang=args.hang,
+            seed=args.seed,
+        ),
+        recorded=load_recorded(args.recorded) if args.recorded else None,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fake))
+    server.daemon_threads = True
+    print(f"fake LLM listening on {base_url(server)} (BASE_URL)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"stats: {dict(fake.stats)}")
+
+
+if __name__ == "__main__":
+    main()
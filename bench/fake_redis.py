@@ -0,0 +1,205 @@
+"""
+本地 Redis 协议（RESP2）替身服务，用于在没有真实 Redis 的环境中测试 CACHE_BACKEND=redis。
+
+支持 support_models/cache_backends.RedisBackend 用到的命令：PING、AUTH、SELECT、GET、SET（EX / PX / NX）、
+DEL、EXISTS、PTTL、SCAN（MATCH / COUNT）、DBSIZE、FLUSHDB；过期在访问时惰性删除，不做容量淘汰。
+
+独立运行后把 CACHE_REDIS_URL 指向它即可：
+    python bench/fake_redis.py --port 6390
+    export CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6390/0
+
+测试脚本中用 start_server(FakeRedis()) 在随机端口上启动。
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CommandError(Exception):
+    pass
+
+
+class FakeRedis:
+    """按 db 编号分区的内存键空间；password 非空时要求先 AUTH。"""
+
+    def __init__(self, password: Optional[str] = None):
+        self.password = password
+        self.stats: Counter = Counter()
+        self._dbs: Dict[int, Dict[bytes, Tuple[bytes, Optional[float]]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, db: int, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        space = self._dbs.setdefault(db, {})
+        entry = space.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del space[key]
+            return None
+        return entry
+
+    def execute(self, session: Dict[str, Any], args: List[bytes]) -> Any:
+        if not args:
+            raise CommandError("ERR empty command")
+        name = args[0].decode("utf-8").upper()
+        self.stats[name] += 1
+        if name == "AUTH":
+            if self.password is None or args[-1].decode("utf-8") != self.password:
+                raise CommandError("WRONGPASS invalid username-password pair")
+            session["authenticated"] = True
+            return "OK"
+        if self.password is not None and not session.get("authenticated"):
+            raise CommandError("NOAUTH Authentication required.")
+        if name == "PING":
+            return args[1] if len(args) > 1 else "PONG"
+        if name == "SELECT":
+            session["db"] = int(args[1])
+            return "OK"
+
+        db = session.get("db", 0)
+        with self._lock:
+            space = self._dbs.setdefault(db, {})
+            if name == "GET":
+                entry = self._live(db, args[1])
+                return entry[0] if entry else None
+            if name == "SET":
+                return self._set(db, args[1:])
+            if name == "DEL":
+                return sum(1 for key in args[1:] if self._live(db, key) and space.pop(key, None))
+            if name == "EXISTS":
+                return sum(1 for key in args[1:] if self._live(db, key))
+            if name == "PTTL":
+                entry = self._live(db, args[1])
+                if entry is None:
+                    return -2
+                return -1 if entry[1] is None else int((entry[1] - time.time()) * 1000)
+            if name == "SCAN":
+                return self._scan(db, args[1:])
+            if name == "DBSIZE":
+                return sum(1 for key in list(space) if self._live(db, key))
+            if name == "FLUSHDB":
+                space.clear()
+                return "OK"
+        raise CommandError(f"ERR unknown command '{name}'")
+
+    def _set(self, db: int, args: List[bytes]) -> Any:
+        key, value, options = args[0], args[1], [a.decode("utf-8").upper() for a in args[2:]]
+        expires_at = None
+        index = 0
+        while index < len(options):
+            option = options[index]
+            if option in {"EX", "PX"}:
+                amount = float(options[index + 1])
+                expires_at = time.time() + (amount if option == "EX" else amount / 1000)
+                index += 2
+            elif option == "NX":
+                if self._live(db, key) is not None:
+                    return None
+                index += 1
+            else:
+                raise CommandError("ERR syntax error")
+        self._dbs[db][key] = (value, expires_at)
+        return "OK"
+
+    def _scan(self, db: int, args: List[bytes]) -> List[Any]:
+        cursor = int(args[0])
+        pattern, count = "*", 10
+        for option, value in zip(args[1::2], args[2::2]):
+            if option.upper() == b"MATCH":
+                pattern = value.decode("utf-8")
+            elif option.upper() == b"COUNT":
+                count = int(value)
+        keys = sorted(key for key in list(self._dbs[db]) if self._live(db, key))
+        page = keys[cursor:cursor + count]
+        next_cursor = cursor + count if cursor + count < len(keys) else 0
+        return [str(next_cursor).encode("utf-8"), [k for k in page if fnmatch.fnmatchcase(k.decode("utf-8"), pattern)]]
+
+
+def _encode(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, CommandError):
+        return b"-" + str(reply).encode("utf-8") + b"\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode("utf-8") + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+
+
+def _read_command(rfile) -> Optional[List[bytes]]:
+    line = rfile.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # 内联命令（如 redis-cli 或 telnet 手动输入）
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int(rfile.readline()[1:-2])
+        args.append(rfile.read(length + 2)[:-2])
+    return args
+
+
+def make_handler(fake: FakeRedis):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            session: Dict[str, Any] = {}
+            while True:
+                args = _read_command(self.rfile)
+                if args is None:
+                    return
+                try:
+                    reply = fake.execute(session, args)
+                except CommandError as e:
+                    reply = e
+                except (IndexError, ValueError):
+                    reply = CommandError("ERR syntax error")
+                self.wfile.write(_encode(reply))
+
+    return Handler
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_server(fake: FakeRedis, host: str = "127.0.0.1", port: int = 0) -> socketserver.ThreadingTCPServer:
+    """在后台线程中启动服务；地址为 redis://<host>:<server.server_address[1]>/0。"""
+    server = _Server((host, port), make_handler(fake))
+    threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True).start()
+    return server
+
+
+def redis_url(server: socketserver.ThreadingTCPServer, db: int = 0, password: Optional[str] = None) -> str:
+    host, port = server.server_address[:2]
+    auth = f":{password}@" if password else ""
+    return f"redis://{auth}{host}:{port}/{db}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--password")
+    args = parser.parse_args()
+
+    fake = FakeRedis(password=args.password)
+    server = _Server((args.host, args.port), make_handler(fake))
+    print(f"fake redis listening on {redis_url(server, password=args.password)} (CACHE_REDIS_URL)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"stats: {dict(fake.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+两阶段（行为树 + 并发洞察）与单次生成的延迟对比。
+
+在本地启动 OpenAI 兼容的假服务（bench/fake_llm.py），按 example_output 回放内容，
+并按「首 token 延迟 + token 数 × 单 token 延迟」模拟顺序解码耗时。
+
+用法：
+    python bench/fanout_latency.py --token-delay 0.02 --scale 0.05 --parallelism 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm import FakeLLM, FakeLLMConfig, base_url, start_server  # noqa: E402
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ttft", type=float, default=0.4, help="首 token 延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="单 token 解码延迟（秒）")
+    parser.add_argument("--scale", type=float, default=0.05, help="整体时间缩放，便于快速运行")
+    parser.add_argument("--parallelism", type=int, default=4)
+    args = parser.parse_args()
+
+    server = start_server(FakeLLM(FakeLLMConfig(ttft=args.ttft * args.scale, token_delay=args.token_delay * args.scale)))
+    os.environ["BASE_URL"] = base_url(server)
+    os.environ["API_KEY"] = "fake"
+    os.environ["LLM_FANOUT_PARALLELISM"] = str(args.parallelism)
+
+    from support_models import llm_client
+
+    rows = []
+    for scenario in SCENARIOS:
+        if not scenario.example_output:
+            continue
+        task = scenario.example_input
+        t0 = time.perf_counter()
+        llm_client._generate_single_shot(scenario.model_name, task, scenario)
+        single = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        blueprint, _, _ = llm_client._generate_two_phase(scenario.model_name, task, scenario)
+        fanout = time.perf_counter() - t0
+        groups = 1 + len(blueprint["behavior_tree"].get("children") or [])
+        rows.append((scenario.id, groups, single, fanout))
+        print(
+            f"{scenario.id:<40} groups={groups:<3} single={single:7.3f}s "
+            f"fanout={fanout:7.3f}s speedup={single / fanout:5.2f}x",
+            flush=True,
+        )
+
+    server.shutdown()
+    speedups = [r[2] / r[3] for r in rows]
+    print(
+        f"\nscenarios={len(rows)} parallelism={args.parallelism} "
+        f"median speedup={statistics.median(speedups):.2f}x "
+        f"total single={sum(r[2] for r in rows):.2f}s fanout={sum(r[3] for r in rows):.2f}s"
+    )
+    print(f"usage by stage: {llm_client.get_usage_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""
+端到端压测：按真实的操作员行为混合请求 /api/update 与 /api/node_insight，输出吞吐与尾延迟报告。
+
+每个“会话”模拟一次推理：请求 /api/update，再按泊松分布点击若干个行为树节点（/api/node_insight，携带 blueprint_id）。
+请求混合：
+- --explicit-ratio：显式指定 model_name 的比例，其余走自动分类；
+- --canned-ratio：直接使用场景 example_input 的比例（启用大模型时命中预置 example_output），
+  其余为改写后的新任务（数字随机化、子句重排并追加约束）；
+- --clicks：每次推理后的平均节点点击数，--think-time 为点击间隔。
+
+负载模型：
+- --concurrency N：闭环，N 个操作员各自循环执行会话；
+- --rate R：开环，会话按泊松过程以每秒 R 个到达（--max-inflight 限制并发），
+  报告中的 start_lag 为会话实际开始相对计划到达的滞后，滞后持续增大说明压测端或服务端已饱和。
+
+服务端以 SERVER_TIMING=1 启动时，按响应的 Server-Timing 头统计各阶段耗时；多 worker 部署同样适用。
+结果写入 JSON 文件（--out），可用 --compare 与历史结果对比，或用 --diff 对比两个已有结果。
+
+用法：
+    python bench/fake_llm.py --port 8001 --ttft 0.4 --token-delay 0.005 &
+    SERVER_TIMING=1 USE_LLM_BLUEPRINT=1 BASE_URL=http://127.0.0.1:8001/v1 API_KEY=fake \\
+        gunicorn -w 4 --threads 8 -b 127.0.0.1:5000 app:app &
+    python bench/load_test.py --url http://127.0.0.1:5000 --concurrency 16 --duration 60
+    python bench/load_test.py --url http://127.0.0.1:5000 --rate 5 --duration 60 --compare bench/results/baseline.json
+"""
+import argparse
+import datetime
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+_EXTRA_CLAUSES = [
+    "途中可能遭遇降雨与道路损毁",
+    "通信链路间歇中断，需按预案自主决策",
+    "夜间行动，需低可见度条件下导航",
+    "指挥所要求每15分钟回报一次进度",
+    "沿途存在疑似敌方侦察活动",
+    "需与友邻分队协同并避免路线冲突",
+]
+_SERVER_TIMING_RE = re.compile(r"\s*([\w.-]+)(?:;[^,]*?dur=([\d.]+))?[^,]*")
+
+
+def novel_task(rng: random.Random, task: str) -> str:
+    """改写场景示例：数字随机化，首句之外的子句重排，并追加一条约束。"""
+    task = re.sub(r"\d+", lambda _: str(rng.randint(1, 400)), task)
+    clauses = [c for c in re.split(r"[，。；]", task) if c.strip()]
+    head, rest = clauses[:1], clauses[1:]
+    rng.shuffle(rest)
+    return "，".join(head + rest + [rng.choice(_EXTRA_CLAUSES)]) + "。"
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    if mean <= 0:
+        return 0
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+def _tree_ids(node: Optional[Dict[str, Any]]) -> List[str]:
+    if not isinstance(node, dict):
+        return []
+    ids = [node["id"]] if node.get("id") else []
+    for child in node.get("children") or []:
+        ids.extend(_tree_ids(child))
+    return ids
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """解析 Server-Timing 头，返回 {阶段: 毫秒}（不含 total）。"""
+    stages: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        match = _SERVER_TIMING_RE.match(part)
+        if match and match.group(2) and match.group(1) != "total":
+            stages[match.group(1)] = float(match.group(2))
+    return stages
+
+
+class Sample:
+    __slots__ = ("endpoint", "mix", "started", "latency", "status", "error", "stages")
+
+    def __init__(self, endpoint, mix, started, latency, status, error, stages):
+        self.endpoint = endpoint
+        self.mix = mix
+        self.started = started
+        self.latency = latency
+        self.status = status
+        self.error = error
+        self.stages = stages
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        split = urlsplit(args.url)
+        self.host = split.hostname or "127.0.0.1"
+        self.port = split.port or (443 if split.scheme == "https" else 80)
+        self.https = split.scheme == "https"
+        self.samples: List[Sample] = []
+        self.start_lags: List[float] = []
+        self.sessions = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._seed = random.Random(args.seed)
+        self.deadline = 0.0
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.args.timeout)
+        return conn
+
+    def _rng(self) -> random.Random:
+        rng = getattr(self._local, "rng", None)
+        if rng is None:
+            with self._lock:
+                seed = self._seed.random()
+            rng = self._local.rng = random.Random(seed)
+        return rng
+
+    def request(self, endpoint: str, body: Dict[str, Any], mix: str = "") -> Optional[Dict[str, Any]]:
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        started = time.perf_counter()
+        status, error, data, stages = 0, None, None, {}
+        try:
+            conn = self._connection()
+            conn.request("POST", endpoint, payload, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            raw = response.read()
+            status = response.status
+            stages = parse_server_timing(response.getheader("Server-Timing"))
+            if status >= 400:
+                error = f"status_{status}"
+            else:
+                data = json.loads(raw)
+        except Exception as e:
+            error = type(e).__name__
+            self._local.conn = None
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.samples.append(Sample(endpoint, mix, started, latency, status, error, stages))
+        return data
+
+    def session(self) -> None:
+        args, rng = self.args, self._rng()
+        scenario = rng.choice(SCENARIOS)
+        canned = rng.random() < args.canned_ratio
+        explicit = rng.random() < args.explicit_ratio
+        body: Dict[str, Any] = {"task_description": scenario.example_input if canned else novel_task(rng, scenario.example_input)}
+        if explicit:
+            body["model_name"] = scenario.model_name
+        mix = f"{'explicit' if explicit else 'auto'}/{'canned' if canned else 'novel'}"
+        data = self.request("/api/update", body, mix)
+        with self._lock:
+            self.sessions += 1
+        if not data:
+            return
+        node_ids = _tree_ids(data.get("behavior_tree"))
+        for _ in range(_poisson(rng, args.clicks) if node_ids else 0):
+            if args.think_time > 0:
+                time.sleep(rng.expovariate(1.0 / args.think_time))
+            if time.perf_counter() >= self.deadline:
+                return
+            self.request("/api/node_insight", {
+                "model_name": data.get("model_name"),
+                "node_id": rng.choice(node_ids),
+                "blueprint_id": data.get("blueprint_id"),
+                "task_description": data.get("task_description", ""),
+            })
+
+    def run_closed(self) -> None:
+        def _operator():
+            while time.perf_counter() < self.deadline:
+                self.session()
+
+        threads = [threading.Thread(target=_operator, daemon=True) for _ in range(self.args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_open(self) -> None:
+        arrivals = random.Random(self._seed.random())
+
+        def _arrive(scheduled: float) -> None:
+            with self._lock:
+                self.start_lags.append(time.perf_counter() - scheduled)
+            self.session()
+
+        with ThreadPoolExecutor(max_workers=self.args.max_inflight) as pool:
+            scheduled = time.perf_counter()
+            while True:
+                scheduled += arrivals.expovariate(self.args.rate)
+                if scheduled >= self.deadline:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(_arrive, scheduled)
+
+    def run(self) -> Tuple[float, float]:
+        """返回 (统计窗口起点, 终点)；预热期内开始的请求不计入统计。"""
+        started = time.perf_counter()
+        self.deadline = started + self.args.warmup + self.args.duration
+        if self.args.rate:
+            self.run_open()
+        else:
+            self.run_closed()
+        return started + self.args.warmup, time.perf_counter()
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def _at(q):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+        "p50_ms": round(_at(0.50), 2),
+        "p95_ms": round(_at(0.95), 2),
+        "p99_ms": round(_at(0.99), 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def _group(samples: List[Sample], window: float) -> Dict[str, Any]:
+    errors: Dict[str, int] = {}
+    for sample in samples:
+        if sample.error:
+            errors[sample.error] = errors.get(sample.error, 0) + 1
+    ok = [s.latency for s in samples if not s.error]
+    return dict(
+        _percentiles(ok),
+        requests=len(samples),
+        throughput_rps=round(len(samples) / window, 3) if window > 0 else 0.0,
+        error_rate=round(sum(errors.values()) / len(samples), 4) if samples else 0.0,
+        errors=errors,
+    )
+
+
+def _stage_breakdown(samples: List[Sample]) -> Dict[str, Any]:
+    """各阶段在出现该阶段的请求中的耗时分布，以及占全部成功请求总耗时的比例。"""
+    total_ms = sum(s.latency for s in samples if not s.error) * 1000
+    durations: Dict[str, List[float]] = {}
+    for sample in samples:
+        if sample.error:
+            continue
+        for stage, ms in sample.stages.items():
+            durations.setdefault(stage, []).append(ms / 1000)
+    return {
+        stage: dict(_percentiles(values), share=round(sum(values) * 1000 / total_ms, 4) if total_ms else 0.0)
+        for stage, values in sorted(durations.items(), key=lambda item: -sum(item[1]))
+    }
+
+
+def build_report(test: LoadTest, window_start: float, window_end: float) -> Dict[str, Any]:
+    args = test.args
+    samples = [s for s in test.samples if window_start <= s.started < window_end]
+    window = window_end - window_start
+    endpoints = sorted({s.endpoint for s in samples})
+    mixes = sorted({s.mix for s in samples if s.mix})
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "config": {
+            "url": args.url,
+            "mode": "open" if args.rate else "closed",
+            "rate": args.rate,
+            "concurrency": None if args.rate else args.concurrency,
+            "max_inflight": args.max_inflight if args.rate else None,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "explicit_ratio": args.explicit_ratio,
+            "canned_ratio": args.canned_ratio,
+            "clicks": args.clicks,
+            "think_time": args.think_time,
+            "seed": args.seed,
+            "label": args.label,
+        },
+        "window_seconds": round(window, 3),
+        "sessions": test.sessions,
+        "total": _group(samples, window),
+        "endpoints": {endpoint: _group([s for s in samples if s.endpoint == endpoint], window) for endpoint in endpoints},
+        "update_mix": {mix: _group([s for s in samples if s.mix == mix], window) for mix in mixes},
+        "stages": _stage_breakdown(samples),
+        "start_lag": _percentiles(test.start_lags) if args.rate else None,
+    }
+
+
+def compare(base: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """逐项对比吞吐、错误率与各接口 p50 / p95 / p99（正值表示变慢或变多）。"""
+    lines = [f"{'metric':<40} {'base':>10} {'current':>10} {'change':>9}"]
+
+    def _row(name, old, new):
+        if old is None or new is None:
+            return
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        lines.append(f"{name:<40} {old:>10.2f} {new:>10.2f} {change:>9}")
+
+    _row("throughput_rps", base["total"].get("throughput_rps"), current["total"].get("throughput_rps"))
+    _row("error_rate", base["total"].get("error_rate"), current["total"].get("error_rate"))
+    for endpoint in sorted(set(base["endpoints"]) | set(current["endpoints"])):
+        old, new = base["endpoints"].get(endpoint, {}), current["endpoints"].get(endpoint, {})
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            _row(f"{endpoint} {key}", old.get(key), new.get(key))
+    return "\n".join(lines)
+
+
+def _summary(report: Dict[str, Any]) -> str:
+    lines = [
+        f"window {report['window_seconds']:.1f}s  sessions {report['sessions']}  "
+        f"throughput {report['total']['throughput_rps']:.2f} req/s  error rate {report['total']['error_rate']:.2%}"
+    ]
+    for title, groups in (("endpoint", report["endpoints"]), ("update mix", report["update_mix"])):
+        for name, group in groups.items():
+            if group.get("count"):
+                lines.append(
+                    f"{title:<10} {name:<20} n={group['requests']:<6} p50 {group['p50_ms']:8.1f}  "
+                    f"p95 {group['p95_ms']:8.1f}  p99 {group['p99_ms']:8.1f} ms  errors {group['error_rate']:.2%}"
+                )
+    for stage, group in report["stages"].items():
+        lines.append(
+            f"stage      {stage:<20} n={group['count']:<6} p50 {group['p50_ms']:8.1f}  "
+            f"p95 {group['p95_ms']:8.1f}  p99 {group['p99_ms']:8.1f} ms  share {group['share']:.1%}"
+        )
+    if report["start_lag"]:
+        lag = report["start_lag"]
+        lines.append(f"start lag  p50 {lag['p50_ms']:.1f}  p99 {lag['p99_ms']:.1f}  max {lag['max_ms']:.1f} ms")
+    return "\n".join(lines)
+
+
+def _wait_ready(args) -> None:
+    """服务端提供 /readyz 时等待预热完成。"""
+    split = urlsplit(args.url)
+    deadline = time.perf_counter() + args.ready_timeout
+    while True:
+        try:
+            conn = http.client.HTTPConnection(split.hostname, split.port or 80, timeout=5)
+            conn.request("GET", "/readyz")
+            status = conn.getresponse().status
+            conn.close()
+            if status != 503:
+                return
+        except OSError:
+            pass
+        if time.perf_counter() >= deadline:
+            raise SystemExit(f"{args.url} 在 {args.ready_timeout:.0f}s 内未就绪")
+        time.sleep(0.5)
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=8, help="闭环：并发操作员数")
+    load.add_argument("--rate", type=float, help="开环：每秒到达的会话数")
+    parser.add_argument("--max-inflight", type=int, default=256, help="开环模式的最大并发会话数")
+    parser.add_argument("--duration", type=float, default=60.0, help="统计窗口（秒）")
+    parser.add_argument("--warmup", type=float, default=5.0, help="不计入统计的预热时长（秒）")
+    parser.add_argument("--explicit-ratio", type=float, default=0.5)
+    parser.add_argument("--canned-ratio", type=float, default=0.5)
+    parser.add_argument("--clicks", type=float, default=3.0, help="每次推理后的平均节点点击数")
+    parser.add_argument("--think-time", type=float, default=0.0, help="点击间隔均值（秒）")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求超时（秒）")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="写入结果的自由标注，如 worker 配置")
+    parser.add_argument("--out", help="结果文件，缺省 bench/results/load-<时间>.json")
+    parser.add_argument("--compare", metavar="BASE", help="与已有结果文件对比")
+    parser.add_argument("--diff", nargs=2, metavar=("BASE", "CURRENT"), help="只对比两个已有结果文件，不发起压测")
+    args = parser.parse_args()
+
+    if args.diff:
+        print(compare(_load(args.diff[0]), _load(args.diff[1])))
+        return
+
+    _wait_ready(args)
+    test = LoadTest(args)
+    window_start, window_end = test.run()
+    report = build_report(test, window_start, window_end)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(_summary(report))
+    print(f"report written to {out}")
+    if args.compare:
+        print(compare(_load(args.compare), report))
+
+
+if __name__ == "__main__":
+    main()
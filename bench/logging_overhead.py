@@ -0,0 +1,128 @@
+"""
+日志密集的失败场景下 /api/update 的请求延迟。
+
+本地假服务（bench/fake_llm.py）固定返回两类“坏”内容，让每个请求都产生大量日志：
+- missing_fields：结构正确但每个节点洞察只有 title，逐节点输出“缺少字段”警告；
+- parse_failure：无法解析的长文本，触发 JSON 修复后仍失败，输出原始内容转储并回退到规则蓝图。
+
+stdout / stderr 都重定向到日志文件（--log-file），结果写到原 stdout，对比不同日志配置下的 p50 / p95 / 平均延迟。
+--sink-kbps 大于 0 时经由限速读取的管道写入，模拟容器日志驱动等慢速消费方的背压。例如：
+    python bench/logging_overhead.py                                   # 缺省：队列 + 限流 + 采样
+    LOG_ASYNC=0 LOG_RATE_LIMIT=0 LOG_RAW_SAMPLE_RATE=1 python bench/logging_overhead.py   # 同步、全量
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm import FakeLLM, base_url, start_server  # noqa: E402
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+
+def _missing_fields_reply():
+    scenario = max(
+        (s for s in SCENARIOS if s.example_output),
+        key=lambda s: len(s.example_output.get("node_insights", {})),
+    )
+    output = scenario.example_output
+    return json.dumps({
+        "default_focus": output.get("default_focus"),
+        "behavior_tree": output["behavior_tree"],
+        "node_insights": {
+            node_id: {"title": info.get("title", node_id)}
+            for node_id, info in output.get("node_insights", {}).items()
+        },
+    }, ensure_ascii=False)
+
+
+def _parse_failure_reply():
+    return "以下是根据任务生成的行为树说明（非 JSON）：" + "节点说明与推理依据。" * 400
+
+
+def _start_slow_sink(read_fd, log_file, bytes_per_second):
+    """以限定速率从管道读取并写入日志文件；管道缓冲写满后写入方阻塞。"""
+    chunk = 4096
+
+    def _drain():
+        while True:
+            data = os.read(read_fd, chunk)
+            if not data:
+                return
+            log_file.write(data)
+            log_file.flush()
+            time.sleep(len(data) / bytes_per_second)
+
+    threading.Thread(target=_drain, daemon=True).start()
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--log-file", default="/tmp/supportmodel_logging_bench.log", help="stdout / stderr 重定向目标")
+    parser.add_argument("--sink-kbps", type=float, default=0, help="日志消费速率上限（KB/s），0 为直接写文件")
+    args = parser.parse_args()
+
+    report = os.fdopen(os.dup(1), "w", buffering=1)
+    log_file = open(args.log_file, "ab")
+    if args.sink_kbps > 0:
+        read_fd, write_fd = os.pipe()
+        _start_slow_sink(read_fd, log_file, args.sink_kbps * 1024)
+        target = write_fd
+    else:
+        target = log_file.fileno()
+    os.dup2(target, 1)
+    os.dup2(target, 2)
+
+    os.environ.update({
+        "API_KEY": "fake",
+        "USE_LLM_BLUEPRINT": "1",
+        "BLUEPRINT_CACHE": "0",
+        "LLM_SEMANTIC_CACHE": "0",
+        "LLM_REPAIR_ATTEMPTS": "1",
+    })
+    os.environ.pop("LLM_FANOUT", None)
+
+    replies = {"missing_fields": _missing_fields_reply(), "parse_failure": _parse_failure_reply()}
+    servers = {name: start_server(FakeLLM(content=content)) for name, content in replies.items()}
+
+    from app import app  # noqa: E402
+    from support_models import llm_client  # noqa: E402
+
+    config = {key: os.environ.get(key, "(default)") for key in ("LOG_ASYNC", "LOG_RATE_LIMIT", "LOG_RAW_SAMPLE_RATE")}
+    print(f"log config: {config}", file=report)
+    body = {"model_name": "越野物流", "task_description": "向位置X（190,100）运输2车冷链物资，要求2小时内送达。"}
+
+    for name, server in servers.items():
+        os.environ["BASE_URL"] = base_url(server)
+        llm_client._client = None
+        client = app.test_client()
+        client.post("/api/update", json=body)
+
+        def _one(_):
+            started = time.perf_counter()
+            client.post("/api/update", json=body)
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            latencies = list(pool.map(_one, range(args.requests)))
+        print(
+            f"{name:<15} p50 {statistics.median(latencies):7.2f} ms  p95 {_percentile(latencies, 0.95):7.2f} ms  "
+            f"mean {statistics.mean(latencies):7.2f} ms",
+            file=report,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+热点函数微基准与基线对比。
+
+覆盖场景匹配、任务解析、规则蓝图生成、静态蓝图深拷贝、行为树构建、节点洞察提取、
+JSON 提取（小 / 大输入与各回退路径）以及各静态蓝图与 example_output 的 JSON 序列化（与 jsonify 相同的编码器）。
+每项先自动确定循环次数（单轮不少于 --min-time 秒），再重复 --repeat 轮，取单次调用耗时的最小值作为结果。
+
+基线保存在 bench/baseline/micro.json（与机器相关，更换运行环境后应重新保存）：
+    python bench/micro.py                        # 运行并打印
+    python bench/micro.py --save-baseline        # 运行并覆盖基线
+    python bench/micro.py --compare              # 运行并与基线对比，变慢超过 --threshold（缺省 15%）时退出码为 1
+    python bench/micro.py --compare --normalize  # 先按校准项折算机器速度差异再对比
+    python bench/micro.py --filter extract_json --compare
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+# 度量函数本身；场景匹配等结果缓存（support_models/cache_backends.py）的命中不计入
+os.environ["CACHE_BACKEND"] = "none"
+
+from app import app, build_behavior_tree, extract_node_insight  # noqa: E402
+from support_models import SUPPORT_MODELS, get_model_blueprint  # noqa: E402
+from support_models.llm_client import _extract_json  # noqa: E402
+from support_models.offroad_logistics import generate_dynamic_blueprint, parse_task_description  # noqa: E402
+from support_models.scenarios import SCENARIOS, find_best_scenario  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline", "micro.json")
+CALIBRATION = "calibration/python_loop"
+
+SMALL_TASK = "向位置X（190,100）运输2车冷链物资，要求2小时内送达。"
+LARGE_TASK = (
+    "向位置X（190,100）运输2车冷链物资与3车弹药，要求2小时内送达；途经B区山地与C区河谷，"
+    "沿途存在疑似敌方侦察活动，通信链路间歇中断，需按预案自主决策并每15分钟回报一次进度。"
+) * 8
+
+
+def _largest(predicate) -> dict:
+    return max(
+        (s.example_output for s in SCENARIOS if s.example_output and predicate(s)),
+        key=lambda output: len(json.dumps(output, ensure_ascii=False)),
+    )
+
+
+def _calibration() -> int:
+    total = 0
+    for i in range(1000):
+        total += i * i
+    return total
+
+
+def cases() -> List[Tuple[str, Callable[[], object]]]:
+    """(名称, 无参可调用对象)；输入在这里一次性准备好，不计入耗时。"""
+    offroad = next(s for s in SCENARIOS if s.model_name == "越野物流")
+    novel = re.sub(r"\d+", "7", offroad.example_input) + "，途中可能遭遇降雨与道路损毁。"
+    largest = _largest(lambda s: True)
+    offroad_static = get_model_blueprint("越野物流")
+    focus = offroad_static.get("default_focus") or offroad_static["behavior_tree"]["id"]
+
+    small_json = json.dumps({"model_name": "越野物流", "reason": "运输任务"}, ensure_ascii=False)
+    large_json = json.dumps(largest, ensure_ascii=False)
+    fenced_json = "以下是生成的蓝图：\n```json\n" + large_json + "\n```\n如需调整请告知。"
+    prose_json = "根据任务分析，蓝图如下（注意：这是完整结构）" + large_json + "以上。"
+
+    result: List[Tuple[str, Callable[[], object]]] = [
+        (CALIBRATION, _calibration),
+        ("find_best_scenario/canned", lambda: find_best_scenario(offroad.model_name, offroad.example_input)),
+        ("find_best_scenario/novel", lambda: find_best_scenario(offroad.model_name, novel)),
+        ("parse_task_description/small", lambda: parse_task_description(SMALL_TASK)),
+        ("parse_task_description/large", lambda: parse_task_description(LARGE_TASK)),
+        ("generate_dynamic_blueprint/small", lambda: generate_dynamic_blueprint(SMALL_TASK)),
+        ("generate_dynamic_blueprint/large", lambda: generate_dynamic_blueprint(LARGE_TASK)),
+        ("get_model_blueprint/越野物流", lambda: get_model_blueprint("越野物流")),
+        ("get_model_blueprint/default", lambda: get_model_blueprint("未知模型")),
+        ("build_behavior_tree/static", lambda: build_behavior_tree(get_model_blueprint("伤员救助"), "", "伤员救助")),
+        ("build_behavior_tree/rule", lambda: build_behavior_tree(offroad_static, SMALL_TASK, "越野物流")),
+        ("build_behavior_tree/example_output", lambda: build_behavior_tree(largest, offroad.example_input, "")),
+        ("extract_node_insight/provided", lambda: extract_node_insight("越野物流", focus, offroad_static)),
+        ("extract_node_insight/rebuild", lambda: extract_node_insight("越野物流", focus, None, SMALL_TASK)),
+        ("extract_json/small", lambda: _extract_json(small_json)),
+        ("extract_json/large", lambda: _extract_json(large_json)),
+        ("extract_json/large_fenced", lambda: _extract_json(fenced_json)),
+        ("extract_json/large_prose", lambda: _extract_json(prose_json)),
+    ]
+    for model_name in SUPPORT_MODELS:
+        blueprint = get_model_blueprint(model_name)
+        result.append((f"serialize/static/{model_name}", lambda blueprint=blueprint: app.json.dumps(blueprint)))
+    outputs = [s.example_output for s in SCENARIOS if s.example_output]
+    result.append(("serialize/example_output/largest", lambda: app.json.dumps(largest)))
+    result.append((f"serialize/example_output/all_{len(outputs)}", lambda: [app.json.dumps(o) for o in outputs]))
+    return result
+
+
+def measure(fn: Callable[[], object], min_time: float, repeat: int) -> Dict[str, float]:
+    """返回单次调用耗时（微秒）：最小值、中位数与循环次数。"""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {"us": round(min(runs), 3), "median_us": round(statistics.median(runs), 3), "loops": number}
+
+
+def run(pattern: str, min_time: float, repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, fn in cases():
+        if name != CALIBRATION and pattern and not re.search(pattern, name):
+            continue
+        fn()  # 预热：惰性导入、首次编译正则等不计入
+        results[name] = measure(fn, min_time, repeat)
+        print(f"{name:<45} {results[name]['us']:>12.2f} us  (median {results[name]['median_us']:.2f}, loops {results[name]['loops']})", flush=True)
+    return results
+
+
+def compare(
+    baseline: Dict[str, Dict[str, float]],
+    current: Dict[str, Dict[str, float]],
+    threshold: float,
+    normalize: bool,
+    report_missing: bool = True,
+) -> List[str]:
+    """打印逐项对比，返回超过阈值的回归项名称。"""
+    scale = 1.0
+    if normalize and CALIBRATION in baseline and CALIBRATION in current:
+        scale = current[CALIBRATION]["us"] / baseline[CALIBRATION]["us"]
+        print(f"machine speed factor (current / baseline calibration): {scale:.3f}")
+    regressions = []
+    print(f"\n{'benchmark':<45} {'baseline us':>12} {'current us':>12} {'change':>9}")
+    for name, result in current.items():
+        if name == CALIBRATION or name not in baseline:
+            continue
+        expected = baseline[name]["us"] * scale
+        change = result["us"] / expected - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<45} {expected:>12.2f} {result['us']:>12.2f} {change:>+8.1%}{flag}")
+    missing = sorted(set(baseline) - set(current) - {CALIBRATION})
+    if missing and report_missing:
+        print(f"\nnot run (in baseline): {', '.join(missing)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="只运行名称匹配该正则的项")
+    parser.add_argument("--min-time", type=float, default=0.1, help="每轮最少耗时（秒）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="把本次结果写入 JSON 文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写入基线文件")
+    parser.add_argument("--compare", action="store_true", help="与基线对比，存在回归时退出码为 1")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.15, help="判定为回归的相对变慢比例")
+    parser.add_argument("--normalize", action="store_true", help="按校准项折算机器速度差异")
+    args = parser.parse_args()
+
+    results = run(args.filter, args.min_time, args.repeat)
+    document = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "min_time": args.min_time,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    for path in filter(None, (args.out, args.baseline if args.save_baseline else None)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"results written to {path}")
+
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline["results"], results, args.threshold, args.normalize, report_missing=not args.filter)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
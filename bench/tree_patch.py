@@ -0,0 +1,135 @@
+"""
+增量补丁响应的体积收益。
+
+两组数据：
+1. 接口层：对每个内置场景的 example_input 做小幅编辑（改数字、补一句、换地点代号），
+   先请求原任务，再携带 base_blueprint_id 请求编辑后的任务，对比完整响应与补丁响应的字节数；
+2. 蓝图层：对 example_output 施加典型的局部变化（改节点摘要、删子树、插入节点、调整子节点顺序、
+   改节点洞察），对比完整内容与补丁的字节数及补丁生成耗时。
+
+用法：
+    python bench/tree_patch.py
+"""
+import copy
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+os.environ.pop("BLUEPRINT_TOKEN_KEY", None)
+os.environ["BLUEPRINT_CACHE"] = "0"
+
+from app import app  # noqa: E402
+from support_models.json_patch import apply_patch, diff  # noqa: E402
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+
+def _size(value):
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def _edits(task):
+    """对任务描述做几种典型的小幅编辑。"""
+    edited = []
+    bumped = re.sub(r"\d+", lambda m: str(int(m.group(0)) + 1), task, count=1)
+    if bumped != task:
+        edited.append(("number", bumped))
+    edited.append(("append", task.rstrip("。") + "，注意夜间行动。"))
+    renamed = re.sub(r"[XYZ]", "W", task, count=1)
+    if renamed != task:
+        edited.append(("rename", renamed))
+    return edited
+
+
+def bench_api():
+    client = app.test_client()
+    headers = {"Accept-Encoding": "identity"}
+    rows = {False: [], True: []}
+    for scenario in SCENARIOS:
+        for lean in (False, True):
+            body = {"model_name": scenario.model_name, "task_description": scenario.example_input, "lean": lean}
+            base = client.post("/api/update", json=body, headers=headers).get_json()
+            for _, task in _edits(scenario.example_input):
+                edited = dict(body, task_description=task)
+                full = client.post("/api/update", json=edited, headers=headers)
+                patched = client.post(
+                    "/api/update", json=dict(edited, base_blueprint_id=base["blueprint_id"]), headers=headers
+                )
+                rows[lean].append((len(full.data), len(patched.data), "patch" in patched.get_json()))
+
+    for lean, values in rows.items():
+        full = sum(v[0] for v in values)
+        patched = sum(v[1] for v in values)
+        used = sum(1 for v in values if v[2])
+        print(
+            f"api {'lean' if lean else 'full'}: {len(values)} edits, patch used {used}, "
+            f"{full / 1024:.1f} KB -> {patched / 1024:.1f} KB ({1 - patched / full:.1%} smaller), "
+            f"median per edit {statistics.median(v[1] / v[0] for v in values):.1%} of full"
+        )
+
+
+def _nodes(node, acc):
+    acc.append(node)
+    for child in node.get("children", []):
+        _nodes(child, acc)
+    return acc
+
+
+def _mutate(blueprint, kind, rng):
+    edited = copy.deepcopy(blueprint)
+    nodes = _nodes(edited["behavior_tree"], [])
+    parents = [node for node in nodes if node.get("children")]
+    if kind == "summary":
+        node = rng.choice(nodes)
+        node["summary"] = node.get("summary", "") + "（已根据最新任务调整）"
+    elif kind == "remove_subtree" and parents:
+        parent = rng.choice(parents)
+        parent["children"].pop(rng.randrange(len(parent["children"])))
+    elif kind == "insert_node":
+        parent = rng.choice(nodes)
+        parent.setdefault("children", []).insert(
+            0, {"id": "inserted_node", "label": "新增节点", "status": "pending", "summary": "新增", "children": []}
+        )
+    elif kind == "reorder" and parents:
+        parent = rng.choice(parents)
+        parent["children"].reverse()
+    elif kind == "insight":
+        insight = edited["node_insights"][rng.choice(list(edited["node_insights"]))]
+        insight["summary"] = insight.get("summary", "") + "（已更新）"
+    return edited
+
+
+def bench_blueprints():
+    rng = random.Random(7)
+    kinds = ("summary", "remove_subtree", "insert_node", "reorder", "insight")
+    print()
+    print(f"{'edit':<16} {'cases':>6} {'full KB':>9} {'patch KB':>9} {'ratio':>7} {'diff ms':>8}")
+    for kind in kinds:
+        full_total, patch_total, costs, cases = 0, 0, [], 0
+        for scenario in SCENARIOS:
+            if not scenario.example_output:
+                continue
+            base = scenario.example_output
+            edited = _mutate(base, kind, rng)
+            started = time.perf_counter()
+            patch = diff(base, edited)
+            costs.append((time.perf_counter() - started) * 1000)
+            assert apply_patch(base, patch) == edited
+            full_total += _size(edited)
+            patch_total += _size(patch)
+            cases += 1
+        print(
+            f"{kind:<16} {cases:>6} {full_total / 1024:>9.1f} {patch_total / 1024:>9.1f} "
+            f"{patch_total / full_total:>7.1%} {statistics.median(costs):>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    bench_api()
+    bench_blueprints()
@@ -1,9 +1,18 @@
 // 全局状态
 let currentState = {
     task_description: '',
-    node_insights: {}  // 缓存后端一次性返回的所有节点洞察
+    node_insights: {},      // 已加载的节点洞察（精简模式下按需加载并缓存）
+    graph_node_ids: null,   // 带知识图谱（可点击）的节点 id 集合
+    behavior_tree: null
 };
 
+// 精简模式：/api/update 不下发全部节点洞察，点击或预取时通过 /api/node_insights 获取
+const LEAN_MODE = true;
+let pendingInsights = new Map(); // node_id -> 进行中的请求
+
+// 上一次 /api/update 的 ETag 与响应，重复推理同一任务时服务端返回 304 直接复用
+let lastUpdate = { key: null, etag: null, data: null };
+
 let selectedNodeId = null;
 let currentTreeScale = 1;
 let graphObj = null; // G6图实例
@@ -181,33 +190,158 @@ function updateStatus(isRunning) {
     }
 }
 
-function updateDisplay() {
+// RFC 6902 JSON Patch（add / remove / replace / move），作用于 doc 的副本
+function applyJsonPatch(doc, patch) {
+    const result = JSON.parse(JSON.stringify(doc));
+    const resolve = (root, pointer) => {
+        const tokens = pointer.split('/').slice(1).map(t => t.replace(/~1/g, '/').replace(/~0/g, '~'));
+        let parent = root;
+        for (const token of tokens.slice(0, -1)) {
+            parent = parent[Array.isArray(parent) ? Number(token) : token];
+        }
+        const last = tokens[tokens.length - 1];
+        if (!Array.isArray(parent)) return [parent, last];
+        return [parent, last === '-' ? parent.length : Number(last)];
+    };
+    for (const op of patch) {
+        let value = op.value;
+        let kind = op.op;
+        if (kind === 'move') {
+            const [source, key] = resolve(result, op.from);
+            value = Array.isArray(source) ? source.splice(key, 1)[0] : source[key];
+            if (!Array.isArray(source)) delete source[key];
+            kind = 'add';
+        }
+        const [parent, key] = resolve(result, op.path);
+        if (kind === 'add') {
+            if (Array.isArray(parent)) parent.splice(key, 0, value);
+            else parent[key] = value;
+        } else if (kind === 'remove') {
+            if (Array.isArray(parent)) parent.splice(key, 1);
+            else delete parent[key];
+        } else if (kind === 'replace') {
+            parent[key] = value;
+        } else {
+            throw new Error('unsupported patch op: ' + kind);
+        }
+    }
+    return result;
+}
+
+// 只修改节点 label / summary / status 的补丁可以原地更新图元，无需重建整棵树
+const COSMETIC_PATCH_PATH = /^\/behavior_tree(\/children\/\d+)*\/(label|summary|status)$/;
+
+function isCosmeticTreePatch(patch) {
+    return patch.every(op => op.op === 'replace' && (op.path === '/default_focus' || COSMETIC_PATCH_PATH.test(op.path)));
+}
+
+// 把增量响应还原为完整响应结构
+function materializePatchedUpdate(data) {
+    const base = {
+        default_focus: currentState.default_node_id,
+        behavior_tree: currentState.behavior_tree
+    };
+    if (!currentState.graph_node_ids) {
+        base.node_insights = currentState.node_insights;
+    }
+    let patched;
+    try {
+        patched = applyJsonPatch(base, data.patch);
+    } catch (err) {
+        err.patchFailed = true;
+        throw err;
+    }
+    const full = Object.assign({}, data, {
+        behavior_tree: patched.behavior_tree,
+        default_node_id: patched.default_focus || data.default_node_id
+    });
+    if (patched.node_insights) full.node_insights = patched.node_insights;
+    delete full.patch;
+    delete full.base_blueprint_id;
+    return { data: full, cosmetic: isCosmeticTreePatch(data.patch) };
+}
+
+function updateTreeItemsInPlace(treeData) {
+    const visit = node => {
+        const item = graphObj.findById(node.id);
+        if (item) {
+            graphObj.updateItem(item, { label: node.label || node.id, summary: node.summary || '', status: node.status || 'pending' });
+        }
+        (node.children || []).forEach(visit);
+    };
+    visit(treeData);
+}
+
+function updateDisplay(allowPatch = true) {
+    const requestKey = JSON.stringify([currentState.model_name || null, currentState.task_description]);
+    const headers = { 'Content-Type': 'application/json' };
+    if (lastUpdate.key === requestKey && lastUpdate.etag) {
+        headers['If-None-Match'] = lastUpdate.etag;
+    }
+
     fetch('/api/update', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(currentState)
+        headers: headers,
+        body: JSON.stringify({
+            model_name: currentState.model_name,
+            task_description: currentState.task_description,
+            lean: LEAN_MODE,
+            // 增量模式：携带已有蓝图的 id，服务端在补丁更小时只返回 RFC 6902 补丁
+            base_blueprint_id: allowPatch && currentState.behavior_tree ? currentState.blueprint_id : null
+        })
     })
-        .then(res => res.json())
-        .then(data => {
+        .then(res => {
+            if (res.status === 304) {
+                return { data: lastUpdate.data, cosmetic: false };
+            }
+            return res.json().then(raw => {
+                const result = raw.patch ? materializePatchedUpdate(raw) : { data: raw, cosmetic: false };
+                const etag = res.headers.get('ETag');
+                lastUpdate = etag ? { key: requestKey, etag: etag, data: result.data } : { key: null, etag: null, data: null };
+                return result;
+            });
+        })
+        .then(({ data, cosmetic }) => {
             // ===== 调试输出：后端返回的整体数据 =====
             console.log('[updateDisplay] response data:', data);
 
             // 缓存节点洞察，后续点击节点时不再请求后端
-            currentState.node_insights = data.node_insights || {};
+            currentState.node_insights = Object.assign({}, data.node_insights || {});
+            if (data.default_node_id && data.insight && !currentState.node_insights[data.default_node_id]) {
+                currentState.node_insights[data.default_node_id] = data.insight;
+            }
+            currentState.graph_node_ids = data.graph_node_ids ? new Set(data.graph_node_ids) : null;
+            currentState.behavior_tree = data.behavior_tree;
+            currentState.resolved_model_name = data.model_name;
+            pendingInsights = new Map();
+            // 服务端蓝图会话 id，后续 /api/node_insight 携带即可直接查表
+            currentState.blueprint_id = data.blueprint_id || null;
+            currentState.blueprint_token = data.blueprint_token || null;
 
             // ===== 调试输出：行为树与节点洞察 =====
             console.log('[updateDisplay] behavior_tree:', data.behavior_tree);
             console.log('[updateDisplay] node_insights:', currentState.node_insights);
 
-            renderBehaviorTree(data.behavior_tree);
+            currentState.default_node_id = data.default_node_id;
+            if (cosmetic && graphObj) {
+                updateTreeItemsInPlace(data.behavior_tree);
+            } else {
+                renderBehaviorTree(data.behavior_tree);
+            }
             selectedNodeId = data.default_node_id;
             updateInsightPanel(data.insight);
             highlightSelectedNode(selectedNodeId);
             autoScaleTree(data.behavior_tree);
             updateStatus(false);
+            prefetchNeighbourInsights(selectedNodeId);
         })
         .catch(err => {
             console.error('update error:', err);
+            if (allowPatch && err.patchFailed) {
+                // 补丁无法应用时退回完整响应
+                updateDisplay(false);
+                return;
+            }
             updateStatus(false);
         });
 }
@@ -438,8 +572,7 @@ function renderBehaviorTree(treeData) {
 // 数据转换：将现有格式转换为G6格式
 function convertToG6Format(node) {
     const nodeId = node.id;
-    const insight = (currentState.node_insights || {})[nodeId];
-    const hasKnowledgeGraph = !!(insight && insight.knowledge_graph);
+    const hasKnowledgeGraph = nodeHasKnowledgeGraph(nodeId);
 
     return {
         id: nodeId,
@@ -484,16 +617,94 @@ function getNodeColor(status) {
     return colors[status] || { background: '#FAFAFA', border: '#E0E0E0' };
 }
 
-// 使用本地缓存的节点洞察展示策略依据与知识图谱
+function nodeHasKnowledgeGraph(nodeId) {
+    if (currentState.graph_node_ids) {
+        return currentState.graph_node_ids.has(nodeId);
+    }
+    const insight = (currentState.node_insights || {})[nodeId];
+    return !!(insight && insight.knowledge_graph);
+}
+
+// 批量获取尚未缓存的节点洞察，返回合并后的缓存
+function fetchNodeInsights(nodeIds) {
+    const inFlight = nodeIds.filter(id => pendingInsights.has(id)).map(id => pendingInsights.get(id));
+    const missing = nodeIds.filter(id => !currentState.node_insights[id] && !pendingInsights.has(id));
+    if (missing.length === 0) {
+        return Promise.all(inFlight).then(() => currentState.node_insights);
+    }
+    const treeAtRequest = currentState.behavior_tree;
+    const pending = pendingInsights;
+
+    const request = fetch('/api/node_insights', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            node_ids: missing,
+            blueprint_id: currentState.blueprint_id,
+            blueprint_token: currentState.blueprint_token,
+            model_name: currentState.resolved_model_name,
+            task_description: currentState.task_description
+        })
+    })
+        .then(res => res.json())
+        .then(data => {
+            // 期间重新推理过则丢弃旧结果
+            if (currentState.behavior_tree === treeAtRequest) {
+                Object.assign(currentState.node_insights, data.node_insights || {});
+            }
+        })
+        .finally(() => missing.forEach(id => pending.delete(id)));
+    missing.forEach(id => pending.set(id, request));
+    return Promise.all(inFlight.concat([request])).then(() => currentState.node_insights);
+}
+
+function findNodeWithParent(node, nodeId, parent) {
+    if (!node) return null;
+    if (node.id === nodeId) return { node: node, parent: parent || null };
+    for (const child of node.children || []) {
+        const found = findNodeWithParent(child, nodeId, node);
+        if (found) return found;
+    }
+    return null;
+}
+
+// 后台预取聚焦节点的兄弟与子节点中带知识图谱的洞察，用户下一次点击时直接命中缓存
+function prefetchNeighbourInsights(nodeId) {
+    if (!currentState.graph_node_ids) return;
+    const found = findNodeWithParent(currentState.behavior_tree, nodeId);
+    if (!found) return;
+    const siblings = found.parent ? found.parent.children || [] : [];
+    const candidates = siblings.concat(found.node.children || [])
+        .map(child => child.id)
+        .filter(id => id !== nodeId && currentState.graph_node_ids.has(id));
+    if (candidates.length > 0) {
+        fetchNodeInsights(candidates).catch(err => console.warn('prefetch node insights error:', err));
+    }
+}
+
+// 使用本地缓存的节点洞察展示策略依据与知识图谱（精简模式下未缓存时按需获取）
 function showNodeInsightFromCache(nodeId) {
     if (!nodeId) return;
-    const insight = (currentState.node_insights || {})[nodeId];
-    if (!insight || !insight.knowledge_graph) {
+    if (!nodeHasKnowledgeGraph(nodeId)) {
         return; // 没有知识图谱则不响应点击
     }
     selectedNodeId = nodeId;
     highlightSelectedNode(nodeId);
-    updateInsightPanel(insight);
+
+    const insight = (currentState.node_insights || {})[nodeId];
+    if (insight) {
+        updateInsightPanel(insight);
+        prefetchNeighbourInsights(nodeId);
+        return;
+    }
+    fetchNodeInsights([nodeId])
+        .then(insights => {
+            if (selectedNodeId === nodeId && insights[nodeId]) {
+                updateInsightPanel(insights[nodeId]);
+            }
+            prefetchNeighbourInsights(nodeId);
+        })
+        .catch(err => console.error('node insights error:', err));
 }
 
 function highlightSelectedNode(nodeId) {
@@ -1,4 +1,7 @@
 import copy
+import hashlib
+import json
+from functools import lru_cache
 
 from .base import DEFAULT_BLUEPRINT, DEFAULT_NODE_INSIGHT
 from .offroad_logistics import BLUEPRINT as OFFROAD_LOGISTICS_BLUEPRINT
@@ -35,9 +38,21 @@ def get_model_blueprint(model_name: str):
     return copy.deepcopy(blueprint)
 
 
+@lru_cache(maxsize=1)
+def registry_version() -> str:
+    """模型注册表版本：模型列表与全部静态蓝图的内容哈希，进程内只计算一次。"""
+    content = json.dumps(
+        {"models": SUPPORT_MODELS, "blueprints": _BLUEPRINTS, "default": DEFAULT_BLUEPRINT},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
 __all__ = [
     "SUPPORT_MODELS",
     "get_model_blueprint",
+    "registry_version",
     "DEFAULT_NODE_INSIGHT"
 ]
 
@@ -0,0 +1,261 @@
+"""
+大模型调用的准入控制。
+
+所有 chat.completions 调用（含录制回放）在发出前都要经过同一个准入控制器：
+- 并发上限（信号量）：LLM_MAX_CONCURRENCY（缺省 8，0 表示不限）；
+- 令牌桶限速：LLM_RATE 次/秒（缺省 0 表示不限），突发容量 LLM_BURST（缺省等于 LLM_RATE，至少 1）；
+- 两个优先级：interactive（/api/update 等在线请求，缺省）与 batch（/api/update/batch、离线预计算），
+  空出的名额总是先分给 interactive，且 batch 最多占用 上限 - LLM_INTERACTIVE_RESERVED（缺省 1）个名额；
+- 排队时限：单次调用的排队时间上限 LLM_QUEUE_BUDGET_INTERACTIVE（缺省 3 秒）/ LLM_QUEUE_BUDGET_BATCH（缺省 120 秒）。
+  到达时按前方排队数与近期平均占用时长估算等待时间，超过时限直接拒绝（AdmissionRejected），
+  排队超时同样拒绝；上层据此回退到规则/静态蓝图，不再等待上游。
+
+配置在首次调用时读取，进程内只创建一个控制器。
+"""
+import collections
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+from .metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "batch")
+
+_priority: "contextvars.ContextVar[str]" = contextvars.ContextVar("supportmodel_llm_priority", default="interactive")
+
+
+class AdmissionRejected(RuntimeError):
+    """预计或实际排队时间超过时限，调用未发出。"""
+
+    def __init__(self, priority: str, reason: str, waited: float):
+        super().__init__(f"大模型调用被准入控制拒绝: priority={priority}, reason={reason}, waited={waited:.3f}s")
+        self.priority = priority
+        self.reason = reason
+        self.waited = waited
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """在该上下文内发起的大模型调用使用指定优先级（线程池任务需经 wrap_context 继承）。"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"未知的优先级: {priority}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class _Waiter:
+    __slots__ = ("granted",)
+
+    def __init__(self) -> None:
+        self.granted = False
+
+
+class AdmissionController:
+    """
+    信号量 + 令牌桶，按优先级 FIFO 排队。
+
+    max_concurrency 为 0 表示不限并发，rate 为 0 表示不限速。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        rate: float = 0.0,
+        burst: Optional[float] = None,
+        interactive_reserved: int = 1,
+        budgets: Optional[Dict[str, float]] = None,
+    ):
+        self.max_concurrency = max(0, max_concurrency)
+        self.rate = max(0.0, rate)
+        self.burst = max(1.0, burst if burst is not None else self.rate)
+        # 只有一个名额时不再为 interactive 预留，否则 batch 永远无法执行
+        self.interactive_reserved = min(max(0, interactive_reserved), max(0, self.max_concurrency - 1))
+        self.budgets = {"interactive": 3.0, "batch": 120.0}
+        self.budgets.update(budgets or {})
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[_Waiter]] = {p: collections.deque() for p in PRIORITIES}
+        self._in_use = 0
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        # 单次调用占用名额时长的指数滑动平均，0 表示尚无样本
+        self._avg_hold = 0.0
+
+    # 以下方法均在持有 self._cond 时调用
+    def _refill(self, now: float) -> None:
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _limit(self, priority: str) -> int:
+        if priority == "batch":
+            return self.max_concurrency - self.interactive_reserved
+        return self.max_concurrency
+
+    def _can_take(self, priority: str) -> bool:
+        if self.max_concurrency and self._in_use >= self._limit(priority):
+            return False
+        return not self.rate or self._tokens >= 1.0
+
+    def _take(self) -> None:
+        self._in_use += 1
+        if self.rate:
+            self._tokens -= 1.0
+
+    def _dispatch(self) -> None:
+        """按优先级把空出的名额与令牌分给队首的等待者。"""
+        granted = False
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._can_take(priority):
+                queue.popleft().granted = True
+                LLM_QUEUE_DEPTH.dec(priority=priority)
+                self._take()
+                granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _ahead(self, priority: str) -> int:
+        if priority == "batch":
+            return sum(len(queue) for queue in self._queues.values())
+        return len(self._queues["interactive"])
+
+    def _estimate_wait(self, priority: str) -> float:
+        """排在最后时的预计等待秒数（粗略估算，仅用于到达时的提前拒绝）。"""
+        position = self._ahead(priority) + 1
+        estimate = 0.0
+        if self.max_concurrency and self._avg_hold:
+            free = max(0, self._limit(priority) - self._in_use)
+            if position > free:
+                estimate = (position - free) / max(1, self._limit(priority)) * self._avg_hold
+        if self.rate:
+            estimate = max(estimate, (position - self._tokens) / self.rate)
+        return estimate
+
+    def _token_wait(self) -> Optional[float]:
+        if self.rate and self._tokens < 1.0:
+            return (1.0 - self._tokens) / self.rate
+        return None
+
+    def acquire(self, priority: str, budget: Optional[float] = None) -> float:
+        """占用一个名额，返回排队秒数；超过时限抛出 AdmissionRejected。"""
+        budget = self.budgets[priority] if budget is None else budget
+        started = time.monotonic()
+        with self._cond:
+            self._refill(started)
+            if self._ahead(priority) == 0 and self._can_take(priority):
+                self._take()
+                LLM_QUEUE_WAIT_SECONDS.observe(0.0, priority=priority, outcome="admitted")
+                return 0.0
+            estimate = self._estimate_wait(priority)
+            if estimate > budget:
+                LLM_QUEUE_WAIT_SECONDS.observe(0.0, priority=priority, outcome="shed")
+                raise AdmissionRejected(priority, f"预计排队 {estimate:.2f}s 超过时限 {budget:g}s", 0.0)
+
+            waiter = _Waiter()
+            self._queues[priority].append(waiter)
+            LLM_QUEUE_DEPTH.inc(priority=priority)
+            deadline = started + budget
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                self._dispatch()
+                if waiter.granted:
+                    waited = now - started
+                    LLM_QUEUE_WAIT_SECONDS.observe(waited, priority=priority, outcome="admitted")
+                    return waited
+                if now >= deadline:
+                    self._queues[priority].remove(waiter)
+                    LLM_QUEUE_DEPTH.dec(priority=priority)
+                    waited = now - started
+                    LLM_QUEUE_WAIT_SECONDS.observe(waited, priority=priority, outcome="timeout")
+                    raise AdmissionRejected(priority, f"排队超过时限 {budget:g}s", waited)
+                timeout = deadline - now
+                token_wait = self._token_wait()
+                if token_wait is not None:
+                    timeout = min(timeout, token_wait)
+                self._cond.wait(timeout)
+
+    def release(self, held: float) -> None:
+        with self._cond:
+            self._in_use -= 1
+            self._avg_hold = held if not self._avg_hold else 0.8 * self._avg_hold + 0.2 * held
+            self._refill(time.monotonic())
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, priority: Optional[str] = None) -> Iterator[float]:
+        """with controller.admit() as waited: 发起调用；priority 缺省取 llm_priority() 设置的值。"""
+        waited = self.acquire(priority or current_priority())
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            self._refill(time.monotonic())
+            stats: Dict[str, float] = {"in_use": self._in_use, "avg_hold_seconds": round(self._avg_hold, 4)}
+            stats.update({f"queued_{p}": len(q) for p, q in self._queues.items()})
+            if self.rate:
+                stats["tokens"] = round(self._tokens, 3)
+            return stats
+
+
+def _env_number(name: str, cast, default):
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.warning("环境变量 %s=%r 无法解析，使用缺省值 %r", name, value, default)
+        return default
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """按 LLM_MAX_CONCURRENCY / LLM_RATE / LLM_BURST / LLM_INTERACTIVE_RESERVED / LLM_QUEUE_BUDGET_* 创建的共享控制器。"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                rate = _env_number("LLM_RATE", float, 0.0)
+                _controller = AdmissionController(
+                    max_concurrency=_env_number("LLM_MAX_CONCURRENCY", int, 8),
+                    rate=rate,
+                    burst=_env_number("LLM_BURST", float, rate),
+                    interactive_reserved=_env_number("LLM_INTERACTIVE_RESERVED", int, 1),
+                    budgets={
+                        "interactive": _env_number("LLM_QUEUE_BUDGET_INTERACTIVE", float, 3.0),
+                        "batch": _env_number("LLM_QUEUE_BUDGET_BATCH", float, 120.0),
+                    },
+                )
+    return _controller
+
+
+__all__ = [
+    "PRIORITIES",
+    "AdmissionController",
+    "AdmissionRejected",
+    "current_priority",
+    "get_admission_controller",
+    "llm_priority",
+]
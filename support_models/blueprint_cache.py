@@ -0,0 +1,108 @@
+"""
+持久化蓝图缓存。
+
+以 (支援模型, 任务描述) 为键保存经过校验的蓝图和分类结果，供离线预计算
+（support_models.precompute）写入、在线请求命中，使演练当天的首次请求也只有
+缓存命中的延迟。存储在共享缓存后端（support_models.cache_backends）中：
+缺省为单个 SQLite 文件，同机多进程共享；多主机部署可改用 Redis。
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .cache_backends import SharedCache, get_shared_cache
+
+BLUEPRINT_NAMESPACE = "blueprint"
+CLASSIFICATION_NAMESPACE = "classification"
+
+
+def task_key(model_name: str, task_description: str) -> str:
+    """蓝图缓存键：支援模型 + 去除首尾空白的任务描述。"""
+    raw = f"{model_name}\x00{(task_description or '').strip()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _classification_key(task_description: str) -> str:
+    return hashlib.sha256((task_description or "").strip().encode("utf-8")).hexdigest()
+
+
+class BlueprintCache:
+    """
+    蓝图与分类结果两个命名空间；读写失败时抛出 cache_backends.CacheError。
+    """
+
+    def __init__(self, cache: SharedCache):
+        self.cache = cache
+
+    def get_blueprint(self, model_name: str, task_description: str) -> Optional[Dict[str, Any]]:
+        entry = self.cache.get(BLUEPRINT_NAMESPACE, task_key(model_name, task_description))
+        return entry["blueprint"] if entry else None
+
+    def has_blueprint(self, model_name: str, task_description: str) -> bool:
+        return self.get_blueprint(model_name, task_description) is not None
+
+    def put_blueprint(
+        self,
+        model_name: str,
+        task_description: str,
+        blueprint: Dict[str, Any],
+        scenario_id: Optional[str] = None,
+    ) -> None:
+        self.cache.set(
+            BLUEPRINT_NAMESPACE,
+            task_key(model_name, task_description),
+            {
+                "model_name": model_name,
+                "task_description": (task_description or "").strip(),
+                "blueprint": blueprint,
+                "scenario_id": scenario_id,
+                "created_at": time.time(),
+            },
+        )
+
+    def get_classification(self, task_description: str) -> Optional[Tuple[str, str]]:
+        entry = self.cache.get(CLASSIFICATION_NAMESPACE, _classification_key(task_description))
+        return (entry["model_name"], entry["reason"]) if entry else None
+
+    def put_classification(self, task_description: str, model_name: str, reason: str) -> None:
+        self.cache.set(
+            CLASSIFICATION_NAMESPACE,
+            _classification_key(task_description),
+            {
+                "task_description": (task_description or "").strip(),
+                "model_name": model_name,
+                "reason": reason,
+                "created_at": time.time(),
+            },
+        )
+
+    def count(self) -> int:
+        return self.cache.count(BLUEPRINT_NAMESPACE)
+
+
+_cache: Optional[BlueprintCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_blueprint_cache() -> Optional[BlueprintCache]:
+    """
+    返回进程内共享的持久化缓存；BLUEPRINT_CACHE=0 或 CACHE_BACKEND=none 时返回 None。
+
+    后端与路径见 support_models.cache_backends（CACHE_BACKEND / CACHE_PATH / CACHE_REDIS_URL）。
+    """
+    global _cache
+    if os.environ.get("BLUEPRINT_CACHE", "1").lower() in {"0", "false", "no"}:
+        return None
+    shared = get_shared_cache()
+    if shared is None:
+        return None
+    if _cache is None or _cache.cache is not shared:
+        with _cache_lock:
+            if _cache is None or _cache.cache is not shared:
+                _cache = BlueprintCache(shared)
+    return _cache
+
+
+__all__ = ["BlueprintCache", "get_blueprint_cache", "task_key"]
@@ -0,0 +1,106 @@
+"""
+服务端蓝图会话存储。
+
+/api/update 生成的最终蓝图按内容哈希（blueprint_id）保存在进程内的有界存储中，
+后续 /api/node_insight 携带该 id 即可直接取出节点洞察，不必重新解析任务或调用大模型。
+淘汰策略为 LRU + TTL，条目被淘汰后由调用方回退到重新生成。批量接口的结果存放在
+独立的 batch_blueprint_store 中，不与交互会话争用容量。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def blueprint_id(blueprint: Dict[str, Any]) -> str:
+    """蓝图内容哈希：相同内容得到相同 id，与键顺序无关。"""
+    canonical = json.dumps(blueprint, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class BlueprintStore:
+    """
+    以 blueprint_id 为键的 LRU + TTL 蓝图存储。
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+
+    def put(self, blueprint: Dict[str, Any]) -> str:
+        """保存蓝图并返回其 blueprint_id；调用方之后不应再修改该蓝图。"""
+        key = blueprint_id(blueprint)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, blueprint)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return key
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """命中返回蓝图（共享对象，只读），未命中或已过期返回 None。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, blueprint = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return blueprint
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return max(1.0, float(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+blueprint_store = BlueprintStore(
+    max_entries=int(_env_number("BLUEPRINT_STORE_SIZE", 256)),
+    ttl=_env_number("BLUEPRINT_STORE_TTL", 3600.0),
+)
+
+# /api/update/batch 的结果单独存放：一次上千条的批量请求不会把交互会话挤出 blueprint_store
+batch_blueprint_store = BlueprintStore(
+    max_entries=int(_env_number("BATCH_BLUEPRINT_STORE_SIZE", 1024)),
+    ttl=_env_number("BLUEPRINT_STORE_TTL", 3600.0),
+)
+
+
+def get_stored_blueprint(key: str) -> Optional[Dict[str, Any]]:
+    """先查交互会话存储，再查批量结果存储。"""
+    blueprint = blueprint_store.get(key)
+    if blueprint is None:
+        blueprint = batch_blueprint_store.get(key)
+    return blueprint
+
+
+__all__ = [
+    "BlueprintStore",
+    "batch_blueprint_store",
+    "blueprint_id",
+    "blueprint_store",
+    "get_stored_blueprint",
+]
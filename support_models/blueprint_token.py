@@ -0,0 +1,96 @@
+"""
+无状态蓝图令牌。
+
+多台应用主机部署在负载均衡之后、且没有会话粘滞时，进程内的 blueprint_store
+在其他主机上无法命中。此时 /api/update 可以把最终蓝图压缩并用 HMAC 签名后作为
+blueprint_token 返回，任意主机用同一密钥校验并解码即可回答 /api/node_insight。
+
+令牌格式：v1.<base64url(zlib(JSON))>.<base64url(HMAC-SHA256)>，
+JSON 为 {"exp": 过期时间戳, "bp": 蓝图}。先校验签名再解压，解压有长度上限。
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+_VERSION = "v1"
+_MAX_DECOMPRESSED = 8 * 1024 * 1024
+
+
+class InvalidBlueprintToken(ValueError):
+    """令牌格式错误、签名不符、已过期或无法解码。"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(key: bytes, message: bytes) -> bytes:
+    return hmac.new(key, message, hashlib.sha256).digest()
+
+
+def encode_token(
+    blueprint: Dict[str, Any], key: bytes, ttl: float = 86400.0, level: int = 6
+) -> str:
+    """压缩并签名蓝图，返回可放入 JSON 响应的令牌字符串。"""
+    payload = json.dumps(
+        {"exp": int(time.time() + ttl), "bp": blueprint},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    body = f"{_VERSION}.{_b64encode(zlib.compress(payload, level))}"
+    return f"{body}.{_b64encode(_sign(key, body.encode('ascii')))}"
+
+
+def decode_token(token: str, key: bytes) -> Dict[str, Any]:
+    """校验签名与有效期并返回蓝图；任何异常都抛出 InvalidBlueprintToken。"""
+    try:
+        version, data, signature = token.split(".")
+    except (AttributeError, ValueError):
+        raise InvalidBlueprintToken("令牌格式错误") from None
+    if version != _VERSION:
+        raise InvalidBlueprintToken(f"不支持的令牌版本: {version}")
+
+    try:
+        expected = _sign(key, f"{version}.{data}".encode("ascii"))
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            raise InvalidBlueprintToken("签名校验失败")
+        decompressor = zlib.decompressobj()
+        payload = decompressor.decompress(_b64decode(data), _MAX_DECOMPRESSED)
+        if decompressor.unconsumed_tail:
+            raise InvalidBlueprintToken("令牌解压后超出长度上限")
+        content = json.loads(payload)
+    except InvalidBlueprintToken:
+        raise
+    except (ValueError, zlib.error, UnicodeError) as e:
+        raise InvalidBlueprintToken(f"令牌解码失败: {e}") from e
+
+    if not isinstance(content, dict) or not isinstance(content.get("bp"), dict):
+        raise InvalidBlueprintToken("令牌内容不是蓝图")
+    if content.get("exp", 0) < time.time():
+        raise InvalidBlueprintToken("令牌已过期")
+    return content["bp"]
+
+
+def token_key() -> Optional[bytes]:
+    """环境变量 BLUEPRINT_TOKEN_KEY 配置签名密钥；未配置时不启用令牌。"""
+    key = os.environ.get("BLUEPRINT_TOKEN_KEY", "")
+    return key.encode("utf-8") if key else None
+
+
+def token_ttl() -> float:
+    try:
+        return max(1.0, float(os.environ.get("BLUEPRINT_TOKEN_TTL", "86400")))
+    except ValueError:
+        return 86400.0
+
+
+__all__ = ["InvalidBlueprintToken", "decode_token", "encode_token", "token_key", "token_ttl"]
@@ -0,0 +1,547 @@
+"""
+可替换的共享缓存后端。
+
+蓝图、分类与场景匹配三层缓存都经由 SharedCache 读写，后端由 CACHE_BACKEND 选择：
+- memory：进程内 LRU，每个 worker 各自一份，重启即失效；
+- sqlite（缺省）：单个 SQLite 文件（WAL 模式），同机多个 worker 与离线预计算共享，重启后仍可命中；
+- redis：Redis 协议客户端（RESP2，仅用标准库），多主机共享；本地可用 bench/fake_redis.py 代替真实 Redis；
+- none：关闭全部共享缓存。
+
+值以紧凑 JSON 序列化，超过 CACHE_COMPRESS_MIN_BYTES（缺省 1024）字节时用 zlib 压缩，首字节标记编码。
+过期时间按命名空间配置：CACHE_TTL_<NAMESPACE>（秒，如 CACHE_TTL_SCENARIO），缺省取 CACHE_TTL，0 表示不过期。
+memory / sqlite 按 CACHE_MAX_BYTES 以最近最少使用淘汰（缺省分别为 64 MiB / 1 GiB）；
+redis 的容量淘汰交给服务端的 maxmemory 与 maxmemory-policy（建议 allkeys-lru）。
+
+- CACHE_PATH：SQLite 文件（缺省 cache/cache.sqlite3，兼容旧的 BLUEPRINT_CACHE_PATH）；
+- CACHE_REDIS_URL：redis://[:password@]host:port/db（缺省 redis://127.0.0.1:6379/0）；
+- CACHE_PREFIX：键前缀（缺省 supportmodel），多套部署共用一个 Redis 时区分。
+"""
+import abc
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("memory", "sqlite", "redis")
+
+_DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "cache.sqlite3"
+)
+_DEFAULT_MAX_BYTES = {"memory": 64 * 1024 * 1024, "sqlite": 1024 * 1024 * 1024}
+
+
+class CacheError(Exception):
+    """后端读写失败（SQLite 错误、连接失败、Redis 错误回复等）；调用方记录后按未命中处理。"""
+
+
+class Codec:
+    """JSON 序列化 + 可选 zlib 压缩；首字节 j 表示原始 JSON，z 表示压缩后的 JSON。"""
+
+    _RAW = b"j"
+    _ZLIB = b"z"
+
+    def __init__(self, compress_min_bytes: int = 1024, level: int = 6):
+        self.compress_min_bytes = compress_min_bytes
+        self.level = level
+
+    def encode(self, value: Any) -> bytes:
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(data) >= self.compress_min_bytes:
+            compressed = zlib.compress(data, self.level)
+            if len(compressed) < len(data):
+                return self._ZLIB + compressed
+        return self._RAW + data
+
+    def decode(self, data: bytes) -> Any:
+        tag, body = data[:1], data[1:]
+        if tag == self._ZLIB:
+            body = zlib.decompress(body)
+        elif tag != self._RAW:
+            raise CacheError(f"未知的缓存值编码: {tag!r}")
+        return json.loads(body)
+
+
+class CacheBackend(abc.ABC):
+    """字节级键值存储；ttl 为 None 或 0 时不过期。子类须实现全部方法，否则构造时即报错。"""
+
+    name = ""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def count(self, prefix: str = "") -> int:
+        """以 prefix 开头的未过期键数。"""
+
+    @abc.abstractmethod
+    def clear(self, prefix: str = "") -> int:
+        """删除以 prefix 开头的键，返回删除数。"""
+
+
+def _expires_at(ttl: Optional[float]) -> Optional[float]:
+    return time.time() + ttl if ttl else None
+
+
+class MemoryBackend(CacheBackend):
+    """进程内 LRU，按条目总字节数淘汰，过期条目在读取时删除。"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = _DEFAULT_MAX_BYTES["memory"]):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, _expires_at(ttl))
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def count(self, prefix: str = "") -> int:
+        now = time.time()
+        with self._lock:
+            return sum(
+                1 for key, (_, expires_at) in self._entries.items()
+                if key.startswith(prefix) and (expires_at is None or expires_at >= now)
+            )
+
+    def clear(self, prefix: str = "") -> int:
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                self._pop(key)
+        return len(keys)
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    单文件 SQLite（WAL 模式），每个线程使用独立连接，同机多进程可共享。
+
+    命中时按分钟粒度刷新访问时间（避免每次读取都写库）；每写入 _EVICT_EVERY 次检查一次总大小，
+    超过 max_bytes 时先删除过期条目，再按访问时间从旧到新删除到 90% 以下。
+    """
+
+    name = "sqlite"
+    _EVICT_EVERY = 32
+    _TOUCH_INTERVAL = 60.0
+
+    def __init__(self, path: str, max_bytes: int = _DEFAULT_MAX_BYTES["sqlite"]):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._writes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(
+                        """
+                        CREATE TABLE IF NOT EXISTS cache_entries (
+                            key TEXT PRIMARY KEY,
+                            value BLOB NOT NULL,
+                            size INTEGER NOT NULL,
+                            expires_at REAL,
+                            accessed_at REAL NOT NULL
+                        );
+                        CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed_at);
+                        """
+                    )
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, expires_at, accessed_at FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            if expires_at is not None and expires_at < now:
+                conn.execute("DELETE FROM cache_entries WHERE key = ? AND expires_at < ?", (key, now))
+                return None
+            if now - accessed_at > self._TOUCH_INTERVAL:
+                conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+            return bytes(value)
+        except sqlite3.Error as e:
+            raise CacheError(f"SQLite 缓存读取失败: {e}") from e
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), _expires_at(ttl), now),
+            )
+            # 后端在请求线程间共享，写入计数需加锁
+            with self._init_lock:
+                self._writes += 1
+                due = self._writes % self._EVICT_EVERY == 1
+            if due:
+                self.evict()
+        except sqlite3.Error as e:
+            raise CacheError(f"SQLite 缓存写入失败: {e}") from e
+
+    def evict(self) -> int:
+        """删除过期条目，总大小超过上限时再按访问时间淘汰，返回删除数。"""
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return removed
+        target = self.max_bytes * 0.9
+        while total > target:
+            rows = conn.execute("SELECT key, size FROM cache_entries ORDER BY accessed_at LIMIT 256").fetchall()
+            if not rows:
+                break
+            victims: List[str] = []
+            for key, size in rows:
+                victims.append(key)
+                total -= size
+                if total <= target:
+                    break
+            conn.executemany("DELETE FROM cache_entries WHERE key = ?", [(key,) for key in victims])
+            removed += len(victims)
+        return removed
+
+    def delete(self, key: str) -> None:
+        try:
+            self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            raise CacheError(f"SQLite 缓存删除失败: {e}") from e
+
+    def count(self, prefix: str = "") -> int:
+        try:
+            return self._conn().execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE substr(key, 1, ?) = ?"
+                " AND (expires_at IS NULL OR expires_at >= ?)",
+                (len(prefix), prefix, time.time()),
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            raise CacheError(f"SQLite 缓存统计失败: {e}") from e
+
+    def clear(self, prefix: str = "") -> int:
+        try:
+            return self._conn().execute(
+                "DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            ).rowcount
+        except sqlite3.Error as e:
+            raise CacheError(f"SQLite 缓存清理失败: {e}") from e
+
+
+def _glob_escape(text: str) -> str:
+    return "".join("\\" + ch if ch in "*?[]\\" else ch for ch in text)
+
+
+class RedisBackend(CacheBackend):
+    """
+    最小的 Redis 协议（RESP2）客户端，只用到 GET / SET PX / DEL / SCAN，每个线程一条连接。
+
+    连接失败后 retry_after 秒内直接抛出 CacheError，不再逐个请求等待连接超时。
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", timeout: float = 1.0, retry_after: float = 5.0):
+        parts = urlsplit(url)
+        if parts.scheme != "redis":
+            raise ValueError(f"不支持的 Redis 地址: {url}")
+        self.url = url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile("rb"))
+        if self.password:
+            self._roundtrip(conn, ("AUTH", self.password))
+        if self.db:
+            self._roundtrip(conn, ("SELECT", str(self.db)))
+        return conn
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    def _read(self, rfile) -> Any:
+        line = rfile.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis 连接被关闭")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise CacheError(f"Redis 错误: {rest.decode('utf-8', 'replace')}")
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = rfile.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Redis 连接被关闭")
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read(rfile) for _ in range(length)]
+        raise ConnectionError(f"无法解析的 Redis 回复: {line[:32]!r}")
+
+    def _roundtrip(self, conn, args) -> Any:
+        sock, rfile = conn
+        sock.sendall(self._encode(args))
+        return self._read(rfile)
+
+    def _close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn[1].close()
+                conn[0].close()
+            except OSError:
+                pass
+
+    def execute(self, *args) -> Any:
+        """发送一条命令并返回回复；连接断开时重连重试一次（本类只发送幂等命令）。"""
+        for attempt in (0, 1):
+            if time.monotonic() < self._down_until:
+                raise CacheError(f"Redis {self.host}:{self.port} 暂不可用")
+            try:
+                conn = getattr(self._local, "conn", None)
+                if conn is None:
+                    conn = self._local.conn = self._connect()
+                return self._roundtrip(conn, args)
+            except CacheError:
+                raise
+            except (OSError, ValueError) as e:
+                self._close()
+                if attempt:
+                    self._down_until = time.monotonic() + self.retry_after
+                    raise CacheError(f"Redis {self.host}:{self.port} 请求失败: {e}") from e
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if ttl:
+            self.execute("SET", key, value, "PX", max(1, int(ttl * 1000)))
+        else:
+            self.execute("SET", key, value)
+
+    def delete(self, key: str) -> None:
+        self.execute("DEL", key)
+
+    def _scan(self, prefix: str):
+        cursor = "0"
+        while True:
+            cursor, keys = self.execute("SCAN", cursor, "MATCH", _glob_escape(prefix) + "*", "COUNT", 500)
+            cursor = cursor.decode("utf-8")
+            yield keys
+            if cursor == "0":
+                return
+
+    def count(self, prefix: str = "") -> int:
+        return sum(len(keys) for keys in self._scan(prefix))
+
+    def clear(self, prefix: str = "") -> int:
+        removed = 0
+        for keys in self._scan(prefix):
+            if keys:
+                removed += self.execute("DEL", *keys)
+        return removed
+
+
+def _env_number(name: str, cast, default):
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.warning("环境变量 %s=%r 无法解析，使用缺省值 %r", name, value, default)
+        return default
+
+
+class SharedCache:
+    """
+    按命名空间读写 JSON 值：键为 <prefix>:<namespace>:<key>，值经 Codec 序列化/压缩。
+
+    ttl 未显式传入时按 CACHE_TTL_<NAMESPACE> / CACHE_TTL 读取（每次读取环境变量，便于运行期调整）。
+    """
+
+    def __init__(self, backend: CacheBackend, codec: Optional[Codec] = None, prefix: str = "supportmodel"):
+        self.backend = backend
+        self.codec = codec or Codec()
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    @staticmethod
+    def ttl(namespace: str) -> Optional[float]:
+        ttl = _env_number(f"CACHE_TTL_{namespace.upper()}", float, None)
+        if ttl is None:
+            ttl = _env_number("CACHE_TTL", float, 0.0)
+        return ttl if ttl > 0 else None
+
+    def get(self, namespace: str, key: str) -> Any:
+        data = self.backend.get(self._key(namespace, key))
+        if data is None:
+            return None
+        try:
+            return self.codec.decode(data)
+        except (ValueError, zlib.error) as e:
+            raise CacheError(f"缓存值无法解码: {e}") from e
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.backend.set(
+            self._key(namespace, key),
+            self.codec.encode(value),
+            ttl if ttl is not None else self.ttl(namespace),
+        )
+
+    def delete(self, namespace: str, key: str) -> None:
+        self.backend.delete(self._key(namespace, key))
+
+    def count(self, namespace: str) -> int:
+        return self.backend.count(self._key(namespace, ""))
+
+    def clear(self, namespace: str = "") -> int:
+        return self.backend.clear(self._key(namespace, "") if namespace else f"{self.prefix}:")
+
+
+def _create_backend(name: str, target: str) -> CacheBackend:
+    max_bytes = _env_number("CACHE_MAX_BYTES", int, _DEFAULT_MAX_BYTES.get(name, 0))
+    if name == "memory":
+        return MemoryBackend(max_bytes)
+    if name == "redis":
+        return RedisBackend(target, timeout=_env_number("CACHE_REDIS_TIMEOUT", float, 1.0))
+    return SQLiteBackend(target, max_bytes)
+
+
+_shared: Optional[SharedCache] = None
+_shared_config: Optional[Tuple[str, ...]] = None
+_shared_lock = threading.Lock()
+
+
+def _config() -> Tuple[str, ...]:
+    name = os.environ.get("CACHE_BACKEND", "sqlite").lower()
+    if name == "redis":
+        target = os.environ.get("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+    else:
+        target = os.environ.get("CACHE_PATH") or os.environ.get("BLUEPRINT_CACHE_PATH") or _DEFAULT_PATH
+    return (
+        name,
+        target,
+        os.environ.get("CACHE_PREFIX", "supportmodel"),
+        os.environ.get("CACHE_MAX_BYTES", ""),
+        os.environ.get("CACHE_COMPRESS_MIN_BYTES", ""),
+    )
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """按 CACHE_BACKEND 等环境变量返回进程内共享的缓存；CACHE_BACKEND=none 时返回 None。"""
+    global _shared, _shared_config
+    config = _config()
+    name = config[0]
+    if name in {"none", "0", "false", "no", "off"}:
+        return None
+    if _shared is None or _shared_config != config:
+        with _shared_lock:
+            if _shared is None or _shared_config != config:
+                name, target, prefix = config[:3]
+                if name not in BACKENDS:
+                    logger.warning("未知的缓存后端 CACHE_BACKEND=%r，使用 sqlite", name)
+                    name = "sqlite"
+                logger.info("使用共享缓存: backend=%s, target=%s", name, "-" if name == "memory" else target)
+                _shared = SharedCache(
+                    _create_backend(name, target),
+                    Codec(_env_number("CACHE_COMPRESS_MIN_BYTES", int, 1024)),
+                    prefix,
+                )
+                _shared_config = config
+    return _shared
+
+
+__all__ = [
+    "BACKENDS",
+    "CacheBackend",
+    "CacheError",
+    "Codec",
+    "MemoryBackend",
+    "RedisBackend",
+    "SQLiteBackend",
+    "SharedCache",
+    "get_shared_cache",
+]
@@ -0,0 +1,139 @@
+"""
+大模型调用的录制 / 回放（cassette）。
+
+录制模式下每次 chat.completions 调用的回复按「模型名 + messages」的内容哈希追加写入 JSONL 文件；
+回放模式下按同一键直接返回录制的回复，不发起网络请求，可按录制时的耗时或零延迟返回。
+分类与蓝图生成都经由 llm_client._chat，在那里统一接入。
+
+- LLM_CASSETTE：record 或 replay，未设置时关闭；
+- LLM_CASSETTE_PATH：录制文件（缺省 cassettes/llm.jsonl）；
+- LLM_CASSETTE_LATENCY：recorded（缺省，按录制耗时等待）或 zero。
+
+录制文件每行为 {"key", "model", "stage", "content", "finish_reason", "usage", "latency"}，
+不保存提示词本身；bench/fake_llm.py --recorded 可直接回放同一文件。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = ("record", "replay")
+LATENCIES = ("recorded", "zero")
+
+
+class CassetteMiss(LookupError):
+    """回放模式下录制文件中没有对应的回复。"""
+
+
+def request_key(model: str, messages: List[Dict[str, Any]]) -> str:
+    """模型名与消息（role + content）的内容哈希，与键顺序无关。"""
+    canonical = json.dumps(
+        {"model": model, "messages": [{"role": m.get("role"), "content": m.get("content")} for m in messages]},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """单个录制文件；同一键多次录制时以最后一次为准。"""
+
+    def __init__(self, path: str, mode: str, latency: str = "recorded"):
+        if mode not in MODES:
+            raise ValueError(f"未知的 cassette 模式: {mode}")
+        if latency not in LATENCIES:
+            raise ValueError(f"未知的回放延迟: {latency}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            entries: Dict[str, Dict[str, Any]] = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            entries[entry["key"]] = entry
+            self._entries = entries
+        return self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def replay(self, model: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """返回录制的条目（按 LLM_CASSETTE_LATENCY 等待录制耗时），未录制时抛出 CassetteMiss。"""
+        key = request_key(model, messages)
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is None:
+            raise CassetteMiss(f"cassette {self.path} 中没有 model={model} key={key[:12]} 的录制回复")
+        if self.latency == "recorded" and entry.get("latency"):
+            time.sleep(float(entry["latency"]))
+        return entry
+
+    def record(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        stage: str,
+        content: str,
+        finish_reason: Optional[str],
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency: float,
+    ) -> None:
+        entry = {
+            "key": request_key(model, messages),
+            "model": model,
+            "stage": stage,
+            "content": content,
+            "finish_reason": finish_reason,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+            "latency": round(latency, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                logger.warning("写入 cassette 失败: %s", e)
+                return
+            self._load()[entry["key"]] = entry
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """按 LLM_CASSETTE / LLM_CASSETTE_PATH / LLM_CASSETTE_LATENCY 返回当前 cassette，关闭时返回 None。"""
+    global _cassette
+    mode = os.environ.get("LLM_CASSETTE", "").lower()
+    if mode not in MODES:
+        return None
+    path = os.environ.get("LLM_CASSETTE_PATH", os.path.join("cassettes", "llm.jsonl"))
+    latency = os.environ.get("LLM_CASSETTE_LATENCY", "recorded").lower()
+    if latency not in LATENCIES:
+        latency = "recorded"
+    with _cassette_lock:
+        if _cassette is None or (_cassette.path, _cassette.mode, _cassette.latency) != (path, mode, latency):
+            _cassette = Cassette(path, mode, latency)
+        return _cassette
+
+
+__all__ = ["Cassette", "CassetteMiss", "get_cassette", "request_key"]
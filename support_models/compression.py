@@ -0,0 +1,112 @@
+"""
+响应压缩。
+
+完整的 /api/update 响应包含全部 node_insights 长文本，大场景蓝图未压缩时可达数百 KB。
+这里提供按 Accept-Encoding 协商的 gzip / brotli 压缩（brotli 为可选依赖，未安装时只用 gzip），
+并为 /api/models、空任务静态蓝图与预置 example_output 这类固定且反复请求的响应缓存预压缩结果，
+避免每次请求重复消耗压缩 CPU。其余响应即使内容确定也大多不会重复，按动态级别直接压缩。
+"""
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+# 动态响应用较快的级别；预压缩结果只对预置内容计算一次，用最高级别
+_LEVELS = {
+    "gzip": {"dynamic": 6, "static": 9},
+    "br": {"dynamic": 5, "static": 11},
+}
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """服务端支持的编码，按优先级排列。"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body: bytes, encoding: str, profile: str = "dynamic") -> bytes:
+    level = _LEVELS[encoding][profile]
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    # mtime=0 保证相同输入得到相同字节
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class PrecompressedCache:
+    """
+    以 (内容键, 编码) 为键的 LRU 预压缩响应体缓存。
+
+    内容键必须唯一确定响应体（如强 ETag）。
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    def get_or_compress(self, key: str, encoding: str, body: bytes) -> bytes:
+        with self._lock:
+            data = self._entries.get((key, encoding))
+            if data is not None:
+                self._entries.move_to_end((key, encoding))
+                self._stats["hits"] += 1
+                return data
+            self._stats["misses"] += 1
+
+        data = compress(body, encoding, profile="static")
+        with self._lock:
+            self._entries[(key, encoding)] = data
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+def compression_enabled() -> bool:
+    """环境变量 COMPRESS 为 0/false/no 时关闭，缺省开启。"""
+    return os.environ.get("COMPRESS", "1").lower() not in {"0", "false", "no"}
+
+
+def compression_threshold() -> int:
+    """小于该字节数的响应不压缩（COMPRESS_MIN_BYTES，缺省 1024）。"""
+    try:
+        return max(0, int(os.environ.get("COMPRESS_MIN_BYTES", "1024")))
+    except ValueError:
+        return 1024
+
+
+def _cache_size() -> int:
+    try:
+        return max(1, int(os.environ.get("COMPRESS_CACHE_SIZE", "256")))
+    except ValueError:
+        return 256
+
+
+precompressed_cache = PrecompressedCache(max_entries=_cache_size())
+
+
+def negotiate(accept_encoding: Optional[object]) -> Optional[str]:
+    """根据 werkzeug 的 Accept-Encoding 解析结果选择编码，无可用编码时返回 None。"""
+    if accept_encoding is None:
+        return None
+    return accept_encoding.best_match(available_encodings())  # type: ignore[attr-defined]
+
+
+__all__ = [
+    "PrecompressedCache",
+    "available_encodings",
+    "compress",
+    "compression_enabled",
+    "compression_threshold",
+    "negotiate",
+    "precompressed_cache",
+]
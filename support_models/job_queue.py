@@ -0,0 +1,340 @@
+"""
+异步生成任务队列。
+
+耗时较长的大模型生成不再占用浏览器的 HTTP 请求：/api/update?async=1 把请求写入
+SQLite 持久化队列并立即返回任务 id，进程内的工作线程领取执行，客户端轮询
+/api/jobs/<id> 获取阶段进度（classify / match / generate / validate）与最终结果。
+
+- 领取任务时写入租约（lease），工作进程重启或崩溃后，租约过期的任务会被重新领取；
+  领取次数达到上限（反复导致工作进程崩溃）的任务标记为失败，不再领取；
+- 完成的结果按 TTL 保留，期间相同请求（含 lean、base_blueprint_id 等全部字段）的提交直接复用；
+  回退生成的降级结果（如大模型被准入控制拒绝后改用规则蓝图）照常返回给轮询方，但不参与复用；
+- 排队中/执行中的重复提交合并到同一任务。
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "jobs.sqlite3"
+)
+
+STAGES = ("classify", "match", "generate", "validate")
+
+ProgressCallback = Callable[[str], None]
+# 处理函数返回 (结果, 降级原因)；降级原因非空时结果不参与复用
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Tuple[Dict[str, Any], Optional[str]]]
+
+
+def request_key(data: Dict[str, Any]) -> str:
+    """
+    去重键：规范化后的完整请求。
+
+    任务描述去除首尾空白，值为空（None / "" / False）的字段视同未提供，
+    其余字段（model_name、lean、base_blueprint_id 等）都参与哈希，保证复用的结果形态一致。
+    """
+    normalized = {key: value for key, value in data.items() if value not in (None, "", False)}
+    task = (data.get("task_description") or "").strip()
+    if task:
+        normalized["task_description"] = task
+    else:
+        normalized.pop("task_description", None)
+    raw = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class JobQueue:
+    """
+    SQLite 持久化任务队列，每个线程使用独立连接，同机多进程可共享同一文件。
+    """
+
+    def __init__(self, path: str, result_ttl: float = 3600.0, lease: float = 600.0, max_attempts: int = 3):
+        self.path = path
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(
+                        """
+                        CREATE TABLE IF NOT EXISTS jobs (
+                            id TEXT PRIMARY KEY,
+                            request_key TEXT NOT NULL,
+                            request TEXT NOT NULL,
+                            status TEXT NOT NULL,
+                            progress TEXT NOT NULL,
+                            result TEXT,
+                            error TEXT,
+                            attempts INTEGER NOT NULL DEFAULT 0,
+                            lease_until REAL,
+                            created_at REAL NOT NULL,
+                            updated_at REAL NOT NULL,
+                            expires_at REAL
+                        );
+                        CREATE INDEX IF NOT EXISTS jobs_request_key ON jobs (request_key);
+                        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+                        """
+                    )
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def purge_expired(self) -> int:
+        cursor = self._conn().execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+    def submit(self, data: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        提交任务，返回 (job_id, reused)。
+
+        存在未过期且未降级的完成结果，或相同请求仍在排队/执行时，直接返回已有任务。
+        """
+        key = request_key(data)
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                """
+                SELECT id FROM jobs
+                WHERE request_key = ?
+                  AND (status IN ('queued', 'running') OR (status = 'done' AND error IS NULL))
+                  AND (expires_at IS NULL OR expires_at >= ?)
+                ORDER BY created_at DESC LIMIT 1
+                """,
+                (key, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return row["id"], True
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, request_key, request, status, progress, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', '[]', ?, ?)",
+                (job_id, key, json.dumps(data, ensure_ascii=False), now, now),
+            )
+            conn.execute("COMMIT")
+            return job_id, False
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def pending(self) -> int:
+        """排队中与执行中（含租约已过期）的任务数；队列文件不存在时为 0，不会创建文件。"""
+        if not os.path.exists(self.path):
+            return 0
+        row = self._conn().execute(
+            "SELECT COUNT(*) AS n FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()
+        return row["n"]
+
+    def claim(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        领取一个排队中或租约已过期的任务，返回 (job_id, request)。
+
+        租约过期且已领取 max_attempts 次的任务直接标记为失败，避免反复拖垮工作进程。
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exhausted = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ?, expires_at = ?"
+                " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (
+                    f"执行 {self.max_attempts} 次均未完成（工作进程中断或超出租约）",
+                    now,
+                    now + self.result_ttl,
+                    now,
+                    self.max_attempts,
+                ),
+            ).rowcount
+            if exhausted:
+                logger.warning("%d 个任务达到最大执行次数，已标记为失败", exhausted)
+            row = conn.execute(
+                """
+                SELECT id, request FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+                ORDER BY created_at LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', progress = '[]', attempts = attempts + 1,"
+                " lease_until = ?, updated_at = ? WHERE id = ?",
+                (now + self.lease, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return row["id"], json.loads(row["request"])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def set_stage(self, job_id: str, stage: str) -> None:
+        """记录阶段进度并续租。"""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return
+        progress: List[Dict[str, Any]] = json.loads(row["progress"])
+        progress.append({"stage": stage, "started_at": now})
+        conn.execute(
+            "UPDATE jobs SET progress = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(progress), now + self.lease, now, job_id),
+        )
+
+    def complete(self, job_id: str, result: Dict[str, Any], degraded: Optional[str] = None) -> None:
+        """写入结果；degraded 非空时记录在 error 字段，该结果不会被后续提交复用。"""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = ?, lease_until = NULL,"
+            " updated_at = ?, expires_at = ? WHERE id = ?",
+            (json.dumps(result, ensure_ascii=False), degraded, now, now + self.result_ttl, job_id),
+        )
+
+    def fail(self, job_id: str, error: str) -> None:
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL,"
+            " updated_at = ?, expires_at = ? WHERE id = ?",
+            (error, now, now + self.result_ttl, job_id),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row["expires_at"] is not None and row["expires_at"] < time.time()):
+            return None
+        progress = json.loads(row["progress"])
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "stage": progress[-1]["stage"] if progress else None,
+            "progress": progress,
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "expires_at": row["expires_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+
+
+class JobWorkers:
+    """
+    进程内工作线程：领取队列中的任务，调用 handler 执行并写回结果。
+
+    提交任务时通过 notify() 立即唤醒；其余时间按 poll_interval 轮询，
+    以便接手其他进程提交的任务或租约过期的任务。
+    """
+
+    def __init__(self, queue: JobQueue, handler: JobHandler, workers: int = 2, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            for index in range(self.workers):
+                threading.Thread(target=self._loop, name=f"job-worker-{index}", daemon=True).start()
+            self._started = True
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                claimed = self.queue.claim()
+            except sqlite3.Error as e:
+                logger.warning("领取任务失败: %s", e)
+                claimed = None
+            if claimed is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                self.run_one(*claimed)
+            except Exception:
+                # 写回结果失败（如 database is locked）不能让工作线程退出；任务保持 running，租约过期后重新领取
+                logger.exception("任务 %s 结果写回失败，等待租约过期后重试", claimed[0])
+
+    def run_one(self, job_id: str, data: Dict[str, Any]) -> None:
+        try:
+            result, degraded = self.handler(data, lambda stage: self.queue.set_stage(job_id, stage))
+        except Exception as e:
+            logger.warning("任务 %s 失败: %s", job_id, e)
+            self.queue.fail(job_id, str(e))
+            return
+        if degraded:
+            logger.warning("任务 %s 结果已降级，不参与复用: %s", job_id, degraded)
+        self.queue.complete(job_id, result, degraded)
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return max(1.0, float(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    返回进程内共享的任务队列。
+
+    路径由 JOB_QUEUE_PATH 指定，缺省为仓库下 cache/jobs.sqlite3；
+    结果保留时长 JOB_RESULT_TTL（秒，缺省 3600），租约时长 JOB_LEASE（秒，缺省 600），
+    单个任务最多执行 JOB_MAX_ATTEMPTS 次（缺省 3）。
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                path = os.environ.get("JOB_QUEUE_PATH") or _DEFAULT_PATH
+                _queue = JobQueue(
+                    path,
+                    result_ttl=_env_number("JOB_RESULT_TTL", 3600.0),
+                    lease=_env_number("JOB_LEASE", 600.0),
+                    max_attempts=int(_env_number("JOB_MAX_ATTEMPTS", 3)),
+                )
+    return _queue
+
+
+__all__ = ["STAGES", "JobQueue", "JobWorkers", "get_job_queue", "request_key"]
@@ -0,0 +1,137 @@
+"""
+蓝图增量补丁（RFC 6902 JSON Patch）。
+
+操作员反复微调任务描述再提交时，新旧蓝图往往只差根节点摘要或少数节点。
+diff() 针对行为树形态生成补丁：带 id 的对象数组（children）按 id 匹配，
+新增/删除/移动节点分别生成 add / remove / move，其余节点递归比较；
+普通数组等长时逐项比较，否则整体替换。apply_patch() 用于校验与测试。
+"""
+import copy
+from typing import Any, Dict, List
+
+Patch = List[Dict[str, Any]]
+
+
+def _escape(token: str) -> str:
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _is_id_list(value: Any) -> bool:
+    return bool(value) and all(isinstance(item, dict) and "id" in item for item in value)
+
+
+def _diff(old: Any, new: Any, path: str, ops: Patch) -> None:
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key in old:
+                _diff(old[key], value, child, ops)
+            else:
+                ops.append({"op": "add", "path": child, "value": value})
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        if _is_id_list(old) and _is_id_list(new):
+            _diff_id_list(old, new, path, ops)
+            return
+        if len(old) == len(new):
+            for index, (a, b) in enumerate(zip(old, new)):
+                _diff(a, b, f"{path}/{index}", ops)
+            return
+    ops.append({"op": "replace", "path": path, "value": new})
+
+
+def _diff_id_list(old: List[dict], new: List[dict], path: str, ops: Patch) -> None:
+    """按 id 匹配子节点：先删除消失的节点，再按新顺序移动/插入，最后递归比较。"""
+    new_ids = {item["id"] for item in new}
+    if len(new_ids) != len(new) or len({item["id"] for item in old}) != len(old):
+        # id 不唯一时无法可靠匹配，整体替换
+        ops.append({"op": "replace", "path": path, "value": new})
+        return
+
+    current = list(old)
+    for index in range(len(current) - 1, -1, -1):
+        if current[index]["id"] not in new_ids:
+            ops.append({"op": "remove", "path": f"{path}/{index}"})
+            del current[index]
+
+    for index, item in enumerate(new):
+        if index < len(current) and current[index]["id"] == item["id"]:
+            _diff(current[index], item, f"{path}/{index}", ops)
+            continue
+        at = next((j for j in range(index + 1, len(current)) if current[j]["id"] == item["id"]), None)
+        if at is None:
+            ops.append({"op": "add", "path": f"{path}/{index}", "value": item})
+            current.insert(index, item)
+            continue
+        ops.append({"op": "move", "from": f"{path}/{at}", "path": f"{path}/{index}"})
+        current.insert(index, current.pop(at))
+        _diff(current[index], item, f"{path}/{index}", ops)
+
+
+def diff(old: Any, new: Any) -> Patch:
+    """生成把 old 变换为 new 的 RFC 6902 补丁（不修改输入）。"""
+    ops: Patch = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+def _resolve(doc: Any, pointer: str):
+    """返回 (父容器, 最后一级键/下标)。"""
+    tokens = [_unescape(token) for token in pointer.split("/")[1:]]
+    parent = doc
+    for token in tokens[:-1]:
+        parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+    last = tokens[-1]
+    if isinstance(parent, list):
+        return parent, len(parent) if last == "-" else int(last)
+    return parent, last
+
+
+def apply_patch(doc: Any, patch: Patch) -> Any:
+    """把补丁应用到 doc 的副本上并返回结果，支持 add / remove / replace / move / copy / test。"""
+    doc = copy.deepcopy(doc)
+    for op in patch:
+        kind, path = op["op"], op["path"]
+        if path == "":
+            if kind in ("add", "replace"):
+                doc = copy.deepcopy(op["value"])
+                continue
+            if kind == "test":
+                if doc != op["value"]:
+                    raise ValueError("test 操作失败: /")
+                continue
+            raise ValueError(f"不支持对根路径执行 {kind}")
+
+        if kind in ("move", "copy"):
+            source, key = _resolve(doc, op["from"])
+            value = source.pop(key) if kind == "move" else copy.deepcopy(source[key])
+            kind, op = "add", {"path": path, "value": value}
+        parent, key = _resolve(doc, path)
+        if kind == "add":
+            value = copy.deepcopy(op["value"])
+            if isinstance(parent, list):
+                parent.insert(key, value)
+            else:
+                parent[key] = value
+        elif kind == "remove":
+            del parent[key]
+        elif kind == "replace":
+            parent[key] = copy.deepcopy(op["value"])
+        elif kind == "test":
+            if parent[key] != op["value"]:
+                raise ValueError(f"test 操作失败: {path}")
+        else:
+            raise ValueError(f"未知的补丁操作: {kind}")
+    return doc
+
+
+__all__ = ["Patch", "apply_patch", "diff"]
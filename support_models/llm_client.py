@@ -1,22 +1,44 @@
 import json
+import logging
 import os
 import re
-import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from openai import OpenAI
-
-from .scenarios import Scenario, find_best_scenario
+from .admission import get_admission_controller
+from .blueprint_cache import get_blueprint_cache
+from .cache_backends import CacheError
+from .cassette import CassetteMiss, get_cassette
+from .logging_config import log_raw_content
+from .metrics import (
+    CACHE_EVENTS,
+    FALLBACKS,
+    LLM_CALL_SECONDS,
+    LLM_INFLIGHT,
+    LLM_TOKENS,
+    stage_timer,
+)
+from .scenarios import Scenario, find_best_scenario, load_scenarios
+from .tracing import current_span, span, traced, wrap_context
+from .semantic_cache import semantic_cache, semantic_cache_enabled
 from . import SUPPORT_MODELS
 
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+logger = logging.getLogger(__name__)
 
-_client: Optional[OpenAI] = None
+_client: Optional["OpenAI"] = None
 
 
-def _get_client() -> OpenAI:
+def _get_client() -> "OpenAI":
     """
     懒加载 OpenAI/GLM 客户端，避免在未配置环境变量时过早报错。
+
+    openai 包导入耗时数百毫秒，推迟到首次调用大模型时才导入，未启用大模型的部署启动时不会加载。
     """
     global _client
     if _client is None:
@@ -29,10 +51,13 @@ def _get_client() -> OpenAI:
             raise RuntimeError(
                 "GLM_BASE_URL 或 GLM_API_KEY 未配置，无法调用大模型生成蓝图。"
             )
-        print(
-            f"[LLM] 初始化 OpenAI 客户端 base_url={base_url!r}, model={os.environ.get('MODEL_NAME', 'glm-4-flash')!r}",
-            file=sys.stderr,
+        logger.info(
+            "初始化 OpenAI 客户端 base_url=%r, models=%r",
+            base_url,
+            {stage: get_stage_config(stage).model for stage in STAGES},
         )
+        from openai import OpenAI
+
         _client = OpenAI(base_url=base_url, api_key=api_key)
     return _client
 
@@ -59,19 +84,248 @@ class ClassificationResult:
     raw_content: str
 
 
-def _build_prompt(
-    model_name: str, task_description: str, scenario: Optional[Scenario]
-) -> List[Dict[str, Any]]:
+@dataclass(frozen=True)
+class StageConfig:
     """
-    构造用于大模型生成蓝图的对话消息。
+    单个调用阶段的模型参数。
 
-    这里遵循现有 README/base.py 中定义的 BLUEPRINT 结构：
-    - default_focus: str
-    - behavior_tree: dict
-    - node_insights: dict
+    None 表示不向服务端传该参数，沿用服务端缺省值。
+    """
+
+    model: str
+    max_tokens: Optional[int]
+    temperature: Optional[float]
+    timeout: Optional[float]
+
+
+# 各阶段缺省值：分类只需极短的 JSON 输出，蓝图生成/续写保持服务端缺省以免影响质量。
+_STAGE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "classify": {"max_tokens": 256, "temperature": 0.0, "timeout": 20.0},
+    "generate": {"max_tokens": None, "temperature": None, "timeout": 300.0},
+    "repair": {"max_tokens": None, "temperature": 0.0, "timeout": 120.0},
+    "continuation": {"max_tokens": None, "temperature": None, "timeout": 300.0},
+}
+
+STAGES = tuple(_STAGE_DEFAULTS)
+
+
+def _env_number(name: str, cast, default):
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.warning("环境变量 %s=%r 无法解析，使用缺省值 %r", name, value, default)
+        return default
+
+
+def get_stage_config(stage: str) -> StageConfig:
+    """
+    读取某一阶段的模型配置。
+
+    环境变量 LLM_<STAGE>_MODEL / _MAX_TOKENS / _TEMPERATURE / _TIMEOUT 按阶段覆盖，
+    模型缺省回退到全局 MODEL_NAME。每次调用都重新读取，便于运行期调整。
+    """
+    defaults = _STAGE_DEFAULTS[stage]
+    prefix = f"LLM_{stage.upper()}_"
+    return StageConfig(
+        model=os.environ.get(prefix + "MODEL") or os.environ.get("MODEL_NAME", "glm-4-flash"),
+        max_tokens=_env_number(prefix + "MAX_TOKENS", int, defaults["max_tokens"]),
+        temperature=_env_number(prefix + "TEMPERATURE", float, defaults["temperature"]),
+        timeout=_env_number(prefix + "TIMEOUT", float, defaults["timeout"]),
+    )
+
+
+@dataclass
+class _Completion:
+    """归一化后的单次补全结果。"""
+
+    content: str
+    finish_reason: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+
+
+_usage_lock = threading.Lock()
+_usage: Dict[str, Dict[str, float]] = {}
+
+
+def _record_usage(stage: str, completion: _Completion, elapsed: float) -> None:
+    with _usage_lock:
+        stats = _usage.setdefault(
+            stage,
+            {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_seconds": 0.0},
+        )
+        stats["calls"] += 1
+        stats["prompt_tokens"] += completion.prompt_tokens
+        stats["completion_tokens"] += completion.completion_tokens
+        stats["latency_seconds"] += elapsed
+
+
+def get_usage_stats() -> Dict[str, Dict[str, float]]:
+    """返回按阶段累计的调用次数、token 用量与耗时（副本）。"""
+    with _usage_lock:
+        return {stage: dict(stats) for stage, stats in _usage.items()}
+
+
+def _complete(stage: str, kwargs: Dict[str, Any]) -> Tuple[_Completion, str]:
+    """
+    发起一次 chat.completions 调用，返回 (结果, 来源 api / replay)。
+
+    LLM_CASSETTE 为 replay 时直接返回录制的回复，为 record 时把回复追加到录制文件。
+    """
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        try:
+            entry = cassette.replay(kwargs["model"], kwargs["messages"])
+        except CassetteMiss:
+            CACHE_EVENTS.inc(cache="cassette", result="miss")
+            raise
+        CACHE_EVENTS.inc(cache="cassette", result="hit")
+        usage = entry.get("usage") or {}
+        completion = _Completion(
+            content=entry["content"],
+            finish_reason=entry.get("finish_reason"),
+            prompt_tokens=int(usage.get("prompt_tokens", 0)),
+            completion_tokens=int(usage.get("completion_tokens", 0)),
+        )
+        return completion, "replay"
+
+    started = time.perf_counter()
+    response = _get_client().chat.completions.create(**kwargs)
+    usage = getattr(response, "usage", None)
+    completion = _Completion(
+        content=_response_text(response),
+        finish_reason=getattr(response.choices[0], "finish_reason", None),
+        prompt_tokens=int(getattr(usage, "prompt_tokens", 0) or 0),
+        completion_tokens=int(getattr(usage, "completion_tokens", 0) or 0),
+    )
+    if cassette is not None:
+        cassette.record(
+            kwargs["model"],
+            kwargs["messages"],
+            stage,
+            completion.content,
+            completion.finish_reason,
+            completion.prompt_tokens,
+            completion.completion_tokens,
+            time.perf_counter() - started,
+        )
+    return completion, "api"
+
+
+def _chat(stage: str, messages: List[Dict[str, Any]]) -> _Completion:
     """
-    # JSON Schema 格式说明
-    json_schema_example = """{
+    按阶段配置发起一次 chat.completions 调用，并记录 token 用量。
+
+    调用前先经过准入控制（support_models.admission），排队超过时限时抛出 AdmissionRejected。
+    """
+    config = get_stage_config(stage)
+    kwargs: Dict[str, Any] = {"model": config.model, "messages": messages}
+    if config.max_tokens is not None:
+        kwargs["max_tokens"] = config.max_tokens
+    if config.temperature is not None:
+        kwargs["temperature"] = config.temperature
+    if config.timeout is not None:
+        kwargs["timeout"] = config.timeout
+
+    shared_prefix = _record_prompt_prefix(stage, messages)
+    with span("llm.chat", **{"llm.stage": stage, "llm.model": config.model}) as chat_span:
+        with get_admission_controller().admit() as queue_wait:
+            started = time.perf_counter()
+            with LLM_INFLIGHT.track(stage=stage):
+                try:
+                    completion, source = _complete(stage, kwargs)
+                except Exception:
+                    LLM_CALL_SECONDS.observe(time.perf_counter() - started, stage=stage, outcome="error")
+                    raise
+            elapsed = time.perf_counter() - started
+        LLM_CALL_SECONDS.observe(elapsed, stage=stage, outcome="ok")
+
+        chat_span.set_attributes(**{
+            "llm.source": source,
+            "llm.queue_wait": round(queue_wait, 4),
+            "llm.prompt_tokens": completion.prompt_tokens,
+            "llm.completion_tokens": completion.completion_tokens,
+            "llm.finish_reason": completion.finish_reason,
+            "llm.shared_prefix_bytes": shared_prefix,
+        })
+    _record_usage(stage, completion, elapsed)
+    LLM_TOKENS.inc(completion.prompt_tokens, stage=stage, kind="prompt")
+    LLM_TOKENS.inc(completion.completion_tokens, stage=stage, kind="completion")
+    logger.info(
+        "chat.completions 完成",
+        extra={
+            "stage": stage,
+            "model": config.model,
+            "elapsed": round(elapsed, 3),
+            "queue_wait": round(queue_wait, 3),
+            "prompt_tokens": completion.prompt_tokens,
+            "completion_tokens": completion.completion_tokens,
+            "finish_reason": completion.finish_reason,
+            "source": source,
+        },
+    )
+    return completion
+
+
+def _chat_with_continuation(stage: str, messages: List[Dict[str, Any]]) -> str:
+    """
+    发起调用；若因 max_tokens 截断（finish_reason == "length"），使用 continuation
+    阶段配置续写，最多 LLM_CONTINUATION_ROUNDS 轮（缺省 0，即不续写，需显式开启）。
+    """
+    completion = _chat(stage, messages)
+    content = completion.content
+    rounds = _env_number("LLM_CONTINUATION_ROUNDS", int, 0)
+    while completion.finish_reason == "length" and rounds > 0:
+        rounds -= 1
+        followup = messages + [
+            {"role": "assistant", "content": content},
+            {
+                "role": "user",
+                "content": "输出被截断。请从中断处继续输出剩余内容，不要重复已输出部分，不要添加任何说明。",
+            },
+        ]
+        completion = _chat("continuation", followup)
+        content += completion.content
+    return content
+
+
+def _build_repair_prompt(raw_content: str, error: Exception) -> List[Dict[str, Any]]:
+    return [
+        {
+            "role": "system",
+            "content": "你是 JSON 修复助手。只输出修复后的合法 JSON 对象，保持原有字段与内容，不要添加任何说明或 Markdown 标记。",
+        },
+        {
+            "role": "user",
+            "content": f"以下内容无法被 json.loads() 解析，错误：{error}\n\n{raw_content}",
+        },
+    ]
+
+
+def _chat_json(stage: str, messages: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], str]:
+    """
+    调用并提取 JSON；提取失败时使用 repair 阶段配置请求修复，
+    最多 LLM_REPAIR_ATTEMPTS 次（缺省 0，即不修复，需显式开启）。
+    """
+    raw_content = _chat_with_continuation(stage, messages)
+    attempts = _env_number("LLM_REPAIR_ATTEMPTS", int, 0)
+    while True:
+        try:
+            with stage_timer("json_extract"):
+                return _extract_json(raw_content), raw_content
+        except (ValueError, json.JSONDecodeError) as e:
+            if attempts <= 0:
+                raise
+            attempts -= 1
+            logger.warning("JSON 提取失败，请求修复: %s", e)
+            raw_content = _chat("repair", _build_repair_prompt(raw_content, e)).content
+
+
+# JSON Schema 格式说明
+_JSON_SCHEMA_EXAMPLE = """{
   "default_focus": "priority_plan",
   "behavior_tree": {
     "id": "task_parse",
@@ -123,188 +377,368 @@ def _build_prompt(
   }
 }"""
 
-    # 通用说明
-    base_system_content = (
-        "你是一个支援模型推理可视化系统的后端推理助手，需要根据任务描述生成行为树蓝图。\n\n"
-        "📋 输出格式要求（严格遵循）：\n"
-        "1. 必须输出有效的 JSON 对象，不要包含任何 Markdown 代码块标记（如 ```json 或 ```）。\n"
-        "2. JSON 结构必须包含以下三个顶级字段：\n"
-        "   - default_focus: string，默认聚焦的节点 ID（必须是 behavior_tree 中存在的节点 id）\n"
-        "   - behavior_tree: object，行为树根节点，包含以下字段：\n"
-        "     * id: string（唯一标识符）\n"
-        "     * label: string（简体中文显示名称，必须包含具体数值结果）\n"
-        "     * status: string（只能是 'pending'、'active'、'completed' 之一）\n"
-        "     * summary: string（节点简要描述，简体中文，必须包含具体数值而非空泛描述）\n"
-        "     * children: array（子节点数组，每个子节点结构相同，递归定义）\n"
-        "   - node_insights: object，节点洞察字典，key 为节点 id，value 为对象，包含：\n"
-        "     * title: string（洞察标题，简体中文）\n"
-        "     * summary: string（详细描述，简体中文，必须包含具体数值而非空泛描述）\n"
-        "     * key_points: array<string>（关键要点列表，3-5 条，简体中文，每条必须包含具体数值或计算过程）\n"
-        "     * knowledge_trace: string（推理过程说明，简体中文，使用箭头（→）连接各个推理步骤）\n"
-        "     * knowledge_graph: object（可选，仅关键决策节点需要，包含 nodes 和 edges）\n"
-        "       - nodes: array<{id: string, label: string, type: string}>\n"
-        "       - edges: array<{source: string, target: string}>\n\n"
-        "3. 所有文本字段（label、summary、title、key_points、knowledge_trace、knowledge_graph.nodes[].label）必须使用简体中文。\n"
-        "4. status 字段只能是：'pending'、'active'、'completed' 三种之一。\n"
-        "5. knowledge_graph 中节点的 type 字段只能是：'input'、'process'、'decision'、'output' 之一。\n"
-        "6. knowledge_graph 的 nodes[].label 必须包含具体参数信息，格式：\"节点名称(具体参数1, 具体参数2, ...)\"\n"
-        "7. knowledge_graph 的 nodes 和 edges 必须形成有向无环图，能够清晰体现从任务解析 → 方案设计 → 结果输出的推理链条。\n\n"
-        "🌳 行为树结构要求（必须遵循）：\n"
-        "1. 行为树必须至少包含两层结构：\n"
-        "   - 根节点必须有子节点（第一层）\n"
-        "   - 至少有一个子节点还有子节点（第二层）\n"
-        "   - 这样可以确保行为树有足够的层级深度，体现完整的推理过程\n"
-        "2. 节点 label 必须包含具体数值结果，不能使用空泛描述。\n"
-        "   示例：\"✅ 车队编成结果：2辆中型越野无人车\"、\"✅ 数量计算：2辆\"、\"📦 物资属性解析：医疗物资X，50箱，2.5m³\"\n"
-        "3. 节点 summary 必须包含具体数值、时间、比例等量化信息，不能使用\"合适的\"、\"一定的\"、\"若干\"等模糊词汇。\n"
-        "   正确示例：\"在2小时时限与道路损毁风险约束下，选择2辆中型越野无人车运输资源Y，其中车辆1装载60%，车辆2装载40%作为冗余备份。\"\n"
-        "   错误示例：\"选择合适的车辆进行运输\"（过于空泛，缺少具体数值）\n\n"
-        "📊 node_insights 内容要求（必须遵循）：\n"
-        "1. 为 behavior_tree 中出现的每一个节点（包括所有子节点）提供详细的 node_insights。\n"
-        "2. summary 必须包含：\n"
-        "   - 具体数值（如：2小时、2辆、60%、50kg、120箱、115箱等）\n"
-        "   - 具体对象（如：位置X、资源Y、中型越野无人车、医疗物资X等）\n"
-        "   - 具体约束条件（如：道路损毁风险、20%冗余、有效期至2025年12月等）\n"
-        "   - 不能使用\"合适的\"、\"一定的\"、\"若干\"等模糊词汇\n"
-        "3. key_points 每条必须：\n"
-        "   - 包含具体数值或计算过程\n"
-        "   - 对于计算类/分析类节点，必须包含：计算假设、计算公式或推理步骤、具体结果、验证条件\n"
-        "   - 每条 key_point 应该是一个完整的、可独立理解的句子，避免过于简短的短语\n"
-        "4. knowledge_trace 必须：\n"
-        "   - 使用箭头（→）连接各个推理步骤\n"
-        "   - 包含具体的输入、处理过程、输出结果\n"
-        "   - 体现完整的推理链条，格式示例：\"任务文本解析 → 目的地/货物/时间/路况要素抽取 → 形成可供后续节点复用的标准任务描述。\"\n"
-        "5. 至少有一个 node_insights 内的节点包含 knowledge_graph 字段：\n"
-        "   - 通常为核心决策节点（如最终方案、优先级排序、资源匹配、车队编成、仓位推荐等）\n"
-        "   - knowledge_graph 必须体现完整因果链路，从输入到输出的推理过程\n"
-        "   - nodes 的 label 必须包含具体参数信息，格式：\"节点名称(具体参数1, 具体参数2, ...)\"\n"
-        "   示例：\"任务解析(位置X, 资源Y, 2小时, 道路损毁风险)\"、\"数量计算(2辆, 含20%冗余)\"、\"装载方案(1车60%,1车40%)\"\n\n"
-        f"📝 参考格式示例：\n{json_schema_example}\n\n"
-        "⚠️ 输出质量检查清单（生成内容后，请确保）：\n"
-        "□ 行为树至少包含两层结构（根节点有子节点，且至少一个子节点有子节点）\n"
-        "□ 至少有一个 node_insights 内的节点包含 knowledge_graph\n"
-        "□ 所有 label 包含具体数值\n"
-        "□ 所有 summary 包含具体数值而非空泛描述\n"
-        "□ 所有 key_points 包含分析过程或具体参数\n"
-        "□ 所有 knowledge_trace 使用箭头连接且包含具体步骤\n"
-        "□ knowledge_graph 的 nodes label 包含参数信息\n"
-        "□ 输出必须是纯 JSON，不要包含任何解释文字、Markdown 标记或代码块\n"
-        "□ 确保所有节点 id 在 behavior_tree 和 node_insights 中保持一致\n"
-        "□ node_insights 中必须为 behavior_tree 中的每个节点提供对应的洞察信息"
-    )
+# 全局说明层：与模型、场景、任务均无关，所有蓝图生成请求共享
+_GLOBAL_INSTRUCTIONS = (
+    "你是一个支援模型推理可视化系统的后端推理助手，需要根据任务描述生成行为树蓝图。\n\n"
+    "📋 输出格式要求（严格遵循）：\n"
+    "1. 必须输出有效的 JSON 对象，不要包含任何 Markdown 代码块标记（如 ```json 或 ```）。\n"
+    "2. JSON 结构必须包含以下三个顶级字段：\n"
+    "   - default_focus: string，默认聚焦的节点 ID（必须是 behavior_tree 中存在的节点 id）\n"
+    "   - behavior_tree: object，行为树根节点，包含以下字段：\n"
+    "     * id: string（唯一标识符）\n"
+    "     * label: string（简体中文显示名称，必须包含具体数值结果）\n"
+    "     * status: string（只能是 'pending'、'active'、'completed' 之一）\n"
+    "     * summary: string（节点简要描述，简体中文，必须包含具体数值而非空泛描述）\n"
+    "     * children: array（子节点数组，每个子节点结构相同，递归定义）\n"
+    "   - node_insights: object，节点洞察字典，key 为节点 id，value 为对象，包含：\n"
+    "     * title: string（洞察标题，简体中文）\n"
+    "     * summary: string（详细描述，简体中文，必须包含具体数值而非空泛描述）\n"
+    "     * key_points: array<string>（关键要点列表，3-5 条，简体中文，每条必须包含具体数值或计算过程）\n"
+    "     * knowledge_trace: string（推理过程说明，简体中文，使用箭头（→）连接各个推理步骤）\n"
+    "     * knowledge_graph: object（可选，仅关键决策节点需要，包含 nodes 和 edges）\n"
+    "       - nodes: array<{id: string, label: string, type: string}>\n"
+    "       - edges: array<{source: string, target: string}>\n\n"
+    "3. 所有文本字段（label、summary、title、key_points、knowledge_trace、knowledge_graph.nodes[].label）必须使用简体中文。\n"
+    "4. status 字段只能是：'pending'、'active'、'completed' 三种之一。\n"
+    "5. knowledge_graph 中节点的 type 字段只能是：'input'、'process'、'decision'、'output' 之一。\n"
+    "6. knowledge_graph 的 nodes[].label 必须包含具体参数信息，格式：\"节点名称(具体参数1, 具体参数2, ...)\"\n"
+    "7. knowledge_graph 的 nodes 和 edges 必须形成有向无环图，能够清晰体现从任务解析 → 方案设计 → 结果输出的推理链条。\n\n"
+    "🌳 行为树结构要求（必须遵循）：\n"
+    "1. 行为树必须至少包含两层结构：\n"
+    "   - 根节点必须有子节点（第一层）\n"
+    "   - 至少有一个子节点还有子节点（第二层）\n"
+    "   - 这样可以确保行为树有足够的层级深度，体现完整的推理过程\n"
+    "2. 节点 label 必须包含具体数值结果，不能使用空泛描述。\n"
+    "   示例：\"✅ 车队编成结果：2辆中型越野无人车\"、\"✅ 数量计算：2辆\"、\"📦 物资属性解析：医疗物资X，50箱，2.5m³\"\n"
+    "3. 节点 summary 必须包含具体数值、时间、比例等量化信息，不能使用\"合适的\"、\"一定的\"、\"若干\"等模糊词汇。\n"
+    "   正确示例：\"在2小时时限与道路损毁风险约束下，选择2辆中型越野无人车运输资源Y，其中车辆1装载60%，车辆2装载40%作为冗余备份。\"\n"
+    "   错误示例：\"选择合适的车辆进行运输\"（过于空泛，缺少具体数值）\n\n"
+    "📊 node_insights 内容要求（必须遵循）：\n"
+    "1. 为 behavior_tree 中出现的每一个节点（包括所有子节点）提供详细的 node_insights。\n"
+    "2. summary 必须包含：\n"
+    "   - 具体数值（如：2小时、2辆、60%、50kg、120箱、115箱等）\n"
+    "   - 具体对象（如：位置X、资源Y、中型越野无人车、医疗物资X等）\n"
+    "   - 具体约束条件（如：道路损毁风险、20%冗余、有效期至2025年12月等）\n"
+    "   - 不能使用\"合适的\"、\"一定的\"、\"若干\"等模糊词汇\n"
+    "3. key_points 每条必须：\n"
+    "   - 包含具体数值或计算过程\n"
+    "   - 对于计算类/分析类节点，必须包含：计算假设、计算公式或推理步骤、具体结果、验证条件\n"
+    "   - 每条 key_point 应该是一个完整的、可独立理解的句子，避免过于简短的短语\n"
+    "4. knowledge_trace 必须：\n"
+    "   - 使用箭头（→）连接各个推理步骤\n"
+    "   - 包含具体的输入、处理过程、输出结果\n"
+    "   - 体现完整的推理链条，格式示例：\"任务文本解析 → 目的地/货物/时间/路况要素抽取 → 形成可供后续节点复用的标准任务描述。\"\n"
+    "5. 至少有一个 node_insights 内的节点包含 knowledge_graph 字段：\n"
+    "   - 通常为核心决策节点（如最终方案、优先级排序、资源匹配、车队编成、仓位推荐等）\n"
+    "   - knowledge_graph 必须体现完整因果链路，从输入到输出的推理过程\n"
+    "   - nodes 的 label 必须包含具体参数信息，格式：\"节点名称(具体参数1, 具体参数2, ...)\"\n"
+    "   示例：\"任务解析(位置X, 资源Y, 2小时, 道路损毁风险)\"、\"数量计算(2辆, 含20%冗余)\"、\"装载方案(1车60%,1车40%)\"\n\n"
+    f"📝 参考格式示例：\n{_JSON_SCHEMA_EXAMPLE}\n\n"
+    "⚠️ 输出质量检查清单（生成内容后，请确保）：\n"
+    "□ 行为树至少包含两层结构（根节点有子节点，且至少一个子节点有子节点）\n"
+    "□ 至少有一个 node_insights 内的节点包含 knowledge_graph\n"
+    "□ 所有 label 包含具体数值\n"
+    "□ 所有 summary 包含具体数值而非空泛描述\n"
+    "□ 所有 key_points 包含分析过程或具体参数\n"
+    "□ 所有 knowledge_trace 使用箭头连接且包含具体步骤\n"
+    "□ knowledge_graph 的 nodes label 包含参数信息\n"
+    "□ 输出必须是纯 JSON，不要包含任何解释文字、Markdown 标记或代码块\n"
+    "□ 确保所有节点 id 在 behavior_tree 和 node_insights 中保持一致\n"
+    "□ node_insights 中必须为 behavior_tree 中的每个节点提供对应的洞察信息"
+)
 
-    # 优先使用匹配到的 scenario 的专项提示词，如果没有则使用通用模型提示词
-    extra_model_hint = ""
-    
+
+# ---------------------------------------------------------------------------
+# 提示词分层
+#
+# 服务端对相同前缀的提示词会复用 KV 缓存，因此提示词按「全局说明 → 模型提示 →
+# 场景提示 → 本次任务」由稳定到易变排列。前三层在进程内预先拼好并缓存，
+# 保证同一模型/场景的多次调用前缀逐字节一致；只有最后的任务层随请求变化。
+# ---------------------------------------------------------------------------
+
+_MODEL_HINTS: Dict[str, str] = {
+    "越野物流": (
+        "\n【越野物流通用要求】\n"
+        "1. 行为树结构建议包含如下关键节点，并保持清晰的层级关系：\n"
+        "   - task_analysis：任务分析与规划（解析目的地、货物、时间限制、道路条件等要素）；\n"
+        "   - route_analysis：路线风险评估（根据泥泞、碎石、损毁等路况分析风险）；\n"
+        "   - terrain_scan / risk_assessment：作为 route_analysis 的子节点，分别刻画`地形扫描`和`风险评估`；\n"
+        "   - fleet_formation：车队编成推理结果（包含knowledge_graph字段，包含车辆类型、数量、装载方案等最终决策）；\n"
+        "   - vehicle_selection / quantity_calculation / loading_plan：作为 fleet_formation 的子节点，分别说明车辆选择、数量计算和装载方案；\n"
+        "   - execution_plan / route_optimization / schedule_arrangement：用于描述执行方案、路线优化和调度安排。\n"
+        "2. 在 node_insights 中，请参考上述节点含义，为每个节点写 summary、3 条左右 key_points，以及一段连贯的 knowledge_trace，"
+        "   体现 任务解析 → 路线分析 → 车辆/数量/装载推理 → 执行方案输出的链条。\n"
+        "3. 至少为以下节点补充结构化 knowledge_graph字段：fleet_formation、resource_match。\n"
+        "   例如 fleet_formation 的知识图谱可以包含如下因果链路：\n"
+        "   任务解析(task_parsing) → 车辆匹配(vehicle_matching) → 数量计算(quantity_calc) → 装载方案(loading_scheme) → 最终配置(fleet_config)。\n"
+    ),
+}
+
+_layer_lock = threading.Lock()
+_scenario_layers: Dict[Tuple[str, str], str] = {}
+
+
+def _model_layer(model_name: str, scenario: Optional[Scenario]) -> str:
+    """
+    模型提示层。
+
+    匹配到的场景带有专项提示词时，以专项提示为准（最精准），不再叠加模型通用提示。
+    """
     if scenario is not None and scenario.prompt:
-        # 使用匹配到的 scenario 的专项提示词（最精准）
-        extra_model_hint = (
+        return ""
+    return _MODEL_HINTS.get(model_name, "")
+
+
+def _scenario_layer(model_name: str, scenario: Optional[Scenario]) -> str:
+    """场景层：专项要求 + one-shot 示例 + 推理链条，按 (模型, 场景 id) 缓存。"""
+    if scenario is None:
+        return ""
+    key = (model_name, scenario.id)
+    cached = _scenario_layers.get(key)
+    if cached is not None:
+        return cached
+
+    layer = ""
+    if scenario.prompt:
+        layer += (
             f"\n🎯 【专项场景要求】\n"
             f"{scenario.prompt}\n"
             f"注意：上述要求中的节点必须严格遵循 JSON 格式规范，确保所有字段类型正确。\n"
         )
-    else:
-        # 如果没有 scenario 或 scenario 没有 prompt，则使用通用模型提示词
-        if model_name == "越野物流":
-            extra_model_hint = (
-                "\n【越野物流通用要求】\n"
-                "1. 行为树结构建议包含如下关键节点，并保持清晰的层级关系：\n"
-                "   - task_analysis：任务分析与规划（解析目的地、货物、时间限制、道路条件等要素）；\n"
-                "   - route_analysis：路线风险评估（根据泥泞、碎石、损毁等路况分析风险）；\n"
-                "   - terrain_scan / risk_assessment：作为 route_analysis 的子节点，分别刻画`地形扫描`和`风险评估`；\n"
-                "   - fleet_formation：车队编成推理结果（包含knowledge_graph字段，包含车辆类型、数量、装载方案等最终决策）；\n"
-                "   - vehicle_selection / quantity_calculation / loading_plan：作为 fleet_formation 的子节点，分别说明车辆选择、数量计算和装载方案；\n"
-                "   - execution_plan / route_optimization / schedule_arrangement：用于描述执行方案、路线优化和调度安排。\n"
-                "2. 在 node_insights 中，请参考上述节点含义，为每个节点写 summary、3 条左右 key_points，以及一段连贯的 knowledge_trace，"
-                "   体现 任务解析 → 路线分析 → 车辆/数量/装载推理 → 执行方案输出的链条。\n"
-                "3. 至少为以下节点补充结构化 knowledge_graph字段：fleet_formation、resource_match。\n"
-                "   例如 fleet_formation 的知识图谱可以包含如下因果链路：\n"
-                "   任务解析(task_parsing) → 车辆匹配(vehicle_matching) → 数量计算(quantity_calc) → 装载方案(loading_scheme) → 最终配置(fleet_config)。\n"
-            )
+    layer += (
+        f"\n📎 【匹配场景】\n"
+        f"当前所属支援模型：{model_name}\n"
+        f"匹配到的测试任务场景：{scenario.id} - {scenario.name}\n"
+        f"该场景的任务示例（one-shot 提示）：{scenario.example_input}\n"
+        f"该场景在文档中描述的推理链条：{scenario.reasoning_chain}\n"
+        "请严格遵循上述推理链条的逻辑顺序设计行为树节点，以及节点洞察中的 summary 和 key_points。\n"
+    )
+    with _layer_lock:
+        return _scenario_layers.setdefault(key, layer)
 
-    system_content = base_system_content + extra_model_hint
 
-    scenario_block = ""
-    if scenario is not None:
-        scenario_block = (
-            f"当前所属支援模型：{model_name}\n"
-            f"匹配到的测试任务场景：{scenario.id} - {scenario.name}\n"
-            f"该场景的任务示例（one-shot 提示）：{scenario.example_input}\n"
-            f"该场景在文档中描述的推理链条：{scenario.reasoning_chain}\n"
-            "请严格遵循上述推理链条的逻辑顺序设计行为树节点，以及节点洞察中的 summary 和 key_points。\n"
-        )
+def _build_system_content(model_name: str, scenario: Optional[Scenario]) -> str:
+    """
+    构造蓝图生成的 system 提示词：全局说明 + 模型提示 + 场景提示。
+
+    单次生成与两阶段生成共用同一份 system 内容，仅 user 中的任务层不同。
+    """
+    return _GLOBAL_INSTRUCTIONS + _model_layer(model_name, scenario) + _scenario_layer(model_name, scenario)
 
+
+_FULL_REQUIREMENTS = (
+    "📌 生成要求：\n"
+    "1. 请先进行任务解析（目的地/对象/时间或安全约束等），理解任务的核心需求。\n"
+    "2. 结合 one-shot 示例和推理链条，生成一棵清晰的行为树，确保：\n"
+    "   - 行为树至少包含两层结构（根节点有子节点，且至少一个子节点有子节点）\n"
+    "   - 节点层级合理、逻辑连贯\n"
+    "   - 所有节点的 label 和 summary 包含具体数值而非空泛描述\n"
+    "3. 为 behavior_tree 中的每个节点在 node_insights 中提供对应的洞察信息：\n"
+    "   - summary 必须包含具体数值、对象和约束条件\n"
+    "   - key_points 每条必须包含具体数值或计算过程\n"
+    "   - knowledge_trace 使用箭头（→）连接推理步骤\n"
+    "4. 确保所有节点 id 在 behavior_tree 和 node_insights 中保持一致。\n"
+    "5. 为关键决策节点（如最终方案、优先级排序、资源匹配、车队编成、仓位推荐等）添加 knowledge_graph：\n"
+    "   - 至少有一个节点包含 knowledge_graph\n"
+    "   - knowledge_graph 的 nodes label 必须包含具体参数信息\n"
+    "   - knowledge_graph 必须体现完整的因果推理链路\n\n"
+    "⚠️ 输出要求：\n"
+    "- 最终只输出一个纯 JSON 对象，不要包含任何额外说明、Markdown 代码块标记（```json 或 ```）或解释文字。\n"
+    "- JSON 必须格式正确，可以被 json.loads() 直接解析。\n"
+    "- 确保所有必需字段都存在且类型正确。\n"
+    "- 生成后请对照上述检查清单验证输出质量。\n\n"
+)
+
+_TREE_REQUIREMENTS = (
+    "📌 本次为两阶段生成的第一阶段，只需要生成行为树结构：\n"
+    "1. 请先进行任务解析（目的地/对象/时间或安全约束等），理解任务的核心需求。\n"
+    "2. 结合 one-shot 示例和推理链条，生成一棵清晰的行为树，确保：\n"
+    "   - 行为树至少包含两层结构（根节点有子节点，且至少一个子节点有子节点）\n"
+    "   - 所有节点的 label 和 summary 包含具体数值而非空泛描述\n"
+    "3. 本次不要输出 node_insights 字段，节点洞察将在后续请求中单独生成。\n\n"
+    "⚠️ 输出要求：\n"
+    "- 只输出一个纯 JSON 对象，且只包含 default_focus 与 behavior_tree 两个字段。\n"
+    "- 不要包含任何额外说明、Markdown 代码块标记或解释文字。\n\n"
+)
+
+_INSIGHTS_REQUIREMENTS = (
+    "📌 本次为两阶段生成的第二阶段，只需要生成指定节点的 node_insights：\n"
+    "1. 只为下方列出的节点 id 生成 node_insights，不要输出其它节点。\n"
+    "2. summary 必须包含具体数值、对象和约束条件；key_points 3-5 条，每条包含具体数值或计算过程；"
+    "knowledge_trace 使用箭头（→）连接推理步骤。\n"
+    "3. 若其中包含关键决策节点，请为其补充 knowledge_graph。\n\n"
+    "⚠️ 输出要求：\n"
+    "- 只输出一个纯 JSON 对象，格式为 {\"node_insights\": {节点id: 洞察对象, ...}}。\n"
+    "- 不要包含任何额外说明、Markdown 代码块标记或解释文字。\n\n"
+)
+
+
+def _build_prompt(
+    model_name: str, task_description: str, scenario: Optional[Scenario]
+) -> List[Dict[str, Any]]:
+    """
+    构造用于大模型生成蓝图的对话消息。
+
+    这里遵循现有 README/base.py 中定义的 BLUEPRINT 结构：
+    - default_focus: str
+    - behavior_tree: dict
+    - node_insights: dict
+    """
     user_instruction = (
-        f"{scenario_block}"
-        f"现在的真实任务描述为：{task_description or '（空）'}。\n\n"
-        "📌 生成要求：\n"
-        "1. 请先进行任务解析（目的地/对象/时间或安全约束等），理解任务的核心需求。\n"
-        "2. 结合 one-shot 示例和推理链条，生成一棵清晰的行为树，确保：\n"
-        "   - 行为树至少包含两层结构（根节点有子节点，且至少一个子节点有子节点）\n"
-        "   - 节点层级合理、逻辑连贯\n"
-        "   - 所有节点的 label 和 summary 包含具体数值而非空泛描述\n"
-        "3. 为 behavior_tree 中的每个节点在 node_insights 中提供对应的洞察信息：\n"
-        "   - summary 必须包含具体数值、对象和约束条件\n"
-        "   - key_points 每条必须包含具体数值或计算过程\n"
-        "   - knowledge_trace 使用箭头（→）连接推理步骤\n"
-        "4. 确保所有节点 id 在 behavior_tree 和 node_insights 中保持一致。\n"
-        "5. 为关键决策节点（如最终方案、优先级排序、资源匹配、车队编成、仓位推荐等）添加 knowledge_graph：\n"
-        "   - 至少有一个节点包含 knowledge_graph\n"
-        "   - knowledge_graph 的 nodes label 必须包含具体参数信息\n"
-        "   - knowledge_graph 必须体现完整的因果推理链路\n\n"
-        "⚠️ 输出要求：\n"
-        "- 最终只输出一个纯 JSON 对象，不要包含任何额外说明、Markdown 代码块标记（```json 或 ```）或解释文字。\n"
-        "- JSON 必须格式正确，可以被 json.loads() 直接解析。\n"
-        "- 确保所有必需字段都存在且类型正确。\n"
-        "- 生成后请对照上述检查清单验证输出质量。"
+        _FULL_REQUIREMENTS
+        + f"现在的真实任务描述为：{task_description or '（空）'}。"
     )
 
     messages: List[Dict[str, Any]] = [
-        {"role": "system", "content": system_content},
+        {"role": "system", "content": _build_system_content(model_name, scenario)},
         {"role": "user", "content": user_instruction},
     ]
     return messages
 
 
-def _build_classification_prompt(task_description: str) -> List[Dict[str, Any]]:
+def _build_tree_prompt(
+    model_name: str, task_description: str, scenario: Optional[Scenario]
+) -> List[Dict[str, Any]]:
     """
-    构造用于"根据任务描述自动判断支援模型类型"的提示词。
+    两阶段生成的第一阶段：只要求输出 default_focus 与 behavior_tree。
 
-    - 仅在 SUPPORT_MODELS 中进行选择
-    - 利用 scenarios 中预设的测试任务作为 few-shot 示例
-    """
-    system_content = (
-        "你是一个支援模型测试系统的路由助手，需要根据自然语言任务描述判断应当使用的支援模型类型。\n"
-        "支援模型的备选集合（model_name）为："
-        + "、".join(SUPPORT_MODELS)
-        + "。\n"
-        "请只返回 JSON，格式如下：\n"
-        '{ "model_name": "越野物流", "reason": "你的简要中文推理说明" }\n'
-        "其中 model_name 必须严格为上述候选集合中的一个值。"
+    node_insights 在第二阶段按一级子树并发生成，因此这里显式要求模型不要输出，
+    以缩短单次顺序解码的长度。
+    """
+    user_instruction = (
+        _TREE_REQUIREMENTS
+        + f"现在的真实任务描述为：{task_description or '（空）'}。"
+    )
+
+    return [
+        {"role": "system", "content": _build_system_content(model_name, scenario)},
+        {"role": "user", "content": user_instruction},
+    ]
+
+
+def _build_insights_prompt(
+    model_name: str,
+    task_description: str,
+    scenario: Optional[Scenario],
+    tree: Dict[str, Any],
+    subtree: Dict[str, Any],
+    node_ids: List[str],
+) -> List[Dict[str, Any]]:
+    """
+    两阶段生成的第二阶段：为某一棵一级子树中的节点生成 node_insights。
+
+    完整行为树作为上下文提供，保证各子树洞察之间的推理链条前后一致；
+    同一次生成的各组请求共享「任务 + 完整行为树」前缀，仅末尾的子树部分不同。
+    """
+    user_instruction = (
+        _INSIGHTS_REQUIREMENTS
+        + f"现在的真实任务描述为：{task_description or '（空）'}。\n\n"
+        f"已确定的完整行为树如下：\n{json.dumps(tree, ensure_ascii=False)}\n\n"
+        f"本次只负责以下子树：\n{json.dumps(subtree, ensure_ascii=False)}\n\n"
+        f"本次需要输出洞察的节点 id：{', '.join(node_ids)}"
     )
 
-    # 将 20 条预设场景作为 few-shot 示例，帮助模型学会如何根据任务语义做分类
-    examples_lines: List[str] = []
-    examples_lines.append("以下是若干已标注好的示例：")
-    for s in find_best_scenario.__globals__["SCENARIOS"]:  # 直接复用已加载的场景列表
-        examples_lines.append(
-            f"- 示例任务：{s.example_input}  → 对应支援模型：{s.model_name}（测试项目：{s.name}）"
+    return [
+        {"role": "system", "content": _build_system_content(model_name, scenario)},
+        {"role": "user", "content": user_instruction},
+    ]
+
+
+_classification_system: Optional[str] = None
+
+
+def _classification_system_content() -> str:
+    """分类 system 提示词（候选集合 + few-shot 示例），首次构造后缓存。"""
+    global _classification_system
+    if _classification_system is None:
+        # 将预设场景作为 few-shot 示例，帮助模型学会如何根据任务语义做分类
+        examples_lines: List[str] = []
+        examples_lines.append("以下是若干已标注好的示例：")
+        for s in load_scenarios():
+            examples_lines.append(
+                f"- 示例任务：{s.example_input}  → 对应支援模型：{s.model_name}（测试项目：{s.name}）"
+            )
+        _classification_system = (
+            "你是一个支援模型测试系统的路由助手，需要根据自然语言任务描述判断应当使用的支援模型类型。\n"
+            "支援模型的备选集合（model_name）为："
+            + "、".join(SUPPORT_MODELS)
+            + "。\n"
+            "请只返回 JSON，格式如下：\n"
+            '{ "model_name": "越野物流", "reason": "你的简要中文推理说明" }\n'
+            "其中 model_name 必须严格为上述候选集合中的一个值。\n\n"
+            + "\n".join(examples_lines)
         )
-    examples_block = "\n".join(examples_lines)
+    return _classification_system
 
+
+def _build_classification_prompt(task_description: str) -> List[Dict[str, Any]]:
+    """
+    构造用于"根据任务描述自动判断支援模型类型"的提示词。
+
+    - 仅在 SUPPORT_MODELS 中进行选择
+    - 利用 scenarios 中预设的测试任务作为 few-shot 示例（位于可缓存的 system 前缀中）
+    """
     user_instruction = (
-        f"{examples_block}\n\n"
-        f"现在有一个新的任务描述：{task_description or '（空）'}。\n"
-        "请判断它最适合归属于哪个支援模型（从上述候选集合中选择一个），"
-        "并给出简要理由。只输出一个 JSON 对象，不要包含任何多余文字或 Markdown。"
+        "请判断下面的任务最适合归属于哪个支援模型（从上述候选集合中选择一个），"
+        "并给出简要理由。只输出一个 JSON 对象，不要包含任何多余文字或 Markdown。\n"
+        f"现在有一个新的任务描述：{task_description or '（空）'}。"
     )
 
     return [
-        {"role": "system", "content": system_content},
+        {"role": "system", "content": _classification_system_content()},
         {"role": "user", "content": user_instruction},
     ]
 
 
+_prefix_lock = threading.Lock()
+_last_prompt: Dict[str, bytes] = {}
+_prefix_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _prompt_bytes(messages: List[Dict[str, Any]]) -> bytes:
+    return "\x00".join(
+        f"{m.get('role')}\x01{m.get('content')}" for m in messages
+    ).encode("utf-8")
+
+
+def _shared_prefix_len(a: bytes, b: bytes) -> int:
+    """二分查找最长公共前缀长度，切片比较走 memcmp。"""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _record_prompt_prefix(stage: str, messages: List[Dict[str, Any]]) -> int:
+    """
+    记录同一阶段相邻两次提示词共享的前缀字节数，用于观察服务端前缀缓存的可复用程度。
+    """
+    current = _prompt_bytes(messages)
+    with _prefix_lock:
+        previous = _last_prompt.get(stage)
+        shared = _shared_prefix_len(previous, current) if previous is not None else 0
+        _last_prompt[stage] = current
+        stats = _prefix_stats.setdefault(
+            stage, {"prompts": 0, "prompt_bytes": 0, "shared_prefix_bytes": 0, "last_shared_prefix_bytes": 0}
+        )
+        stats["prompts"] += 1
+        stats["prompt_bytes"] += len(current)
+        stats["shared_prefix_bytes"] += shared
+        stats["last_shared_prefix_bytes"] = shared
+    return shared
+
+
+def get_prompt_prefix_stats() -> Dict[str, Dict[str, int]]:
+    """返回按阶段统计的提示词字节数与相邻提示词共享前缀字节数（副本）。"""
+    with _prefix_lock:
+        return {stage: dict(stats) for stage, stats in _prefix_stats.items()}
+
+
+@traced()
 def _extract_json(content: str) -> Dict[str, Any]:
     """
     从模型返回的文本中尽可能鲁棒地提取 JSON。
@@ -313,6 +747,7 @@ def _extract_json(content: str) -> Dict[str, Any]:
     - 若失败，则尝试移除 Markdown 代码块标记
     - 再尝试使用平衡括号算法提取完整的 JSON 对象
     """
+    current_span().set_attribute("content.length", len(content))
     content = content.strip()
     
     # 移除可能的 Markdown 代码块标记
@@ -431,6 +866,253 @@ def _extract_json(content: str) -> Dict[str, Any]:
     raise ValueError(f"无法从内容中提取有效的 JSON。内容开头：{content[:500]}")
 
 
+def _response_text(response: Any) -> str:
+    """兼容 OpenAI 风格的返回结构，提取文本内容。"""
+    message = response.choices[0].message
+    if isinstance(message.content, list):
+        # 多模态内容，这里只拼接文本部分
+        return "".join(
+            part.get("text", "") for part in message.content if isinstance(part, dict)
+        )
+    return str(message.content or "")
+
+
+def _validate_insights(insights: Dict[str, Any]) -> None:
+    """
+    校验并就地修正 node_insights：缺失字段补默认值，非法 knowledge_graph 移除。
+    """
+    if not isinstance(insights, dict):
+        raise ValueError("node_insights 必须是字典类型")
+
+    # 验证每个节点的洞察信息
+    for node_id, insight in insights.items():
+        if not isinstance(insight, dict):
+            logger.warning("节点 %s 的洞察信息不是字典类型，将使用默认值", node_id)
+            continue
+
+        required_insight_fields = ["title", "summary", "key_points", "knowledge_trace"]
+        for field in required_insight_fields:
+            if field not in insight:
+                logger.warning("节点 %s 的洞察信息缺少字段 '%s'，将使用默认值", node_id, field)
+                if field == "key_points":
+                    insight[field] = []
+                else:
+                    insight[field] = ""
+
+        # 验证 knowledge_graph（如果存在）
+        if "knowledge_graph" in insight:
+            kg = insight["knowledge_graph"]
+            if not isinstance(kg, dict):
+                logger.warning("节点 %s 的 knowledge_graph 不是字典类型，将移除", node_id)
+                del insight["knowledge_graph"]
+            else:
+                if "nodes" not in kg or "edges" not in kg:
+                    logger.warning("节点 %s 的 knowledge_graph 缺少 nodes 或 edges，将移除", node_id)
+                    del insight["knowledge_graph"]
+
+
+def _validate_tree(blueprint: Dict[str, Any], raw_content: str) -> None:
+    """校验蓝图中的 behavior_tree 根节点结构。"""
+    # 验证蓝图结构
+    if not isinstance(blueprint, dict):
+        raise ValueError("蓝图必须是字典类型")
+
+    if "behavior_tree" not in blueprint:
+        logger.debug("提取出的 JSON 结构: %s", list(blueprint.keys()))
+        log_raw_content(logger, logging.DEBUG, "蓝图缺少 behavior_tree", raw_content)
+        raise ValueError("蓝图缺少 'behavior_tree' 字段")
+
+    # 验证 behavior_tree 结构
+    tree = blueprint["behavior_tree"]
+    if not isinstance(tree, dict):
+        raise ValueError("behavior_tree 必须是字典类型")
+
+    required_tree_fields = ["id", "label", "status", "summary", "children"]
+    for field in required_tree_fields:
+        if field not in tree:
+            raise ValueError(f"behavior_tree 缺少必需字段: {field}")
+
+    # 验证 status 值
+    if tree["status"] not in ["pending", "active", "completed"]:
+        logger.warning("behavior_tree.status 值 '%s' 不在标准值列表中，将使用 'pending'", tree["status"])
+        tree["status"] = "pending"
+
+
+def _validate_blueprint(blueprint: Dict[str, Any], raw_content: str) -> None:
+    """
+    校验完整蓝图（behavior_tree + node_insights），不合法时抛出 ValueError。
+    """
+    _validate_tree(blueprint, raw_content)
+    if "node_insights" not in blueprint:
+        raise ValueError("蓝图缺少 'node_insights' 字段")
+    _validate_insights(blueprint["node_insights"])
+
+
+def _log_parse_failure(error: Exception, raw_content: str) -> None:
+    logger.warning("蓝图解析或验证失败: %s", error)
+    log_raw_content(logger, logging.WARNING, "蓝图解析或验证失败", raw_content)
+
+
+def _collect_node_ids(node: Dict[str, Any]) -> List[str]:
+    """按先序遍历收集子树中的全部节点 id。"""
+    ids: List[str] = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if not isinstance(current, dict):
+            continue
+        if current.get("id"):
+            ids.append(current["id"])
+        stack.extend(reversed(current.get("children") or []))
+    return ids
+
+
+def _missing_insights(blueprint: Dict[str, Any]) -> List[str]:
+    """行为树中没有对应 node_insights 的节点 id。"""
+    insights = blueprint.get("node_insights") or {}
+    return [nid for nid in _collect_node_ids(blueprint.get("behavior_tree") or {}) if nid not in insights]
+
+
+def _fanout_parallelism() -> int:
+    try:
+        return max(1, int(os.environ.get("LLM_FANOUT_PARALLELISM", "4")))
+    except ValueError:
+        return 4
+
+
+def _use_fanout() -> bool:
+    return os.environ.get("LLM_FANOUT", "").lower() in {"1", "true", "yes"}
+
+
+def _generate_single_shot(
+    model_name: str, task_description: str, scenario: Optional[Scenario]
+) -> Tuple[Dict[str, Any], str]:
+    """单次调用同时生成 behavior_tree 与全部 node_insights。"""
+    messages = _build_prompt(
+        model_name=model_name,
+        task_description=task_description,
+        scenario=scenario,
+    )
+
+    raw_content = ""
+    try:
+        blueprint, raw_content = _chat_json("generate", messages)
+        logger.debug("蓝图生成完成，原始内容 %d 字符，提取出的键: %s", len(raw_content), list(blueprint.keys()))
+        with stage_timer("validate"):
+            _validate_blueprint(blueprint, raw_content)
+        logger.debug("蓝图结构验证通过")
+    except (ValueError, json.JSONDecodeError) as e:
+        _log_parse_failure(e, raw_content)
+        raise
+
+    return blueprint, raw_content
+
+
+def _generate_subtree_insights(
+    model_name: str,
+    task_description: str,
+    scenario: Optional[Scenario],
+    tree: Dict[str, Any],
+    subtree: Dict[str, Any],
+    node_ids: List[str],
+) -> Tuple[Dict[str, Any], str]:
+    """为单棵子树请求 node_insights，只保留本次负责的节点。"""
+    messages = _build_insights_prompt(
+        model_name=model_name,
+        task_description=task_description,
+        scenario=scenario,
+        tree=tree,
+        subtree=subtree,
+        node_ids=node_ids,
+    )
+    data, raw_content = _chat_json("generate", messages)
+    # 兼容模型直接输出 {节点id: 洞察} 而省略外层 node_insights 的情况
+    insights = data.get("node_insights", data) if isinstance(data, dict) else {}
+    if not isinstance(insights, dict):
+        raise ValueError("子树洞察必须是字典类型")
+    wanted = set(node_ids)
+    return {k: v for k, v in insights.items() if k in wanted}, raw_content
+
+
+def _generate_two_phase(
+    model_name: str, task_description: str, scenario: Optional[Scenario]
+) -> Tuple[Dict[str, Any], str, int]:
+    """
+    两阶段生成：先生成行为树，再按一级子树并发生成 node_insights。
+
+    - 第一阶段只输出 default_focus + behavior_tree，顺序解码长度大幅缩短；
+    - 第二阶段根节点单独一组，其余每棵一级子树一组，在 LLM_FANOUT_PARALLELISM
+      限制下并发请求；
+    - 单组失败只影响该组节点（前端回退到默认洞察），全部失败时抛出异常交由上层回退。
+
+    返回 (蓝图, 原始内容, 失败组数)；失败组数非 0 时蓝图不完整，上层不应写入缓存。
+    """
+    messages = _build_tree_prompt(
+        model_name=model_name,
+        task_description=task_description,
+        scenario=scenario,
+    )
+    tree_raw = ""
+    try:
+        blueprint, tree_raw = _chat_json("generate", messages)
+        logger.debug("第一阶段行为树生成完成，原始内容 %d 字符", len(tree_raw))
+        with stage_timer("validate"):
+            _validate_tree(blueprint, tree_raw)
+    except (ValueError, json.JSONDecodeError) as e:
+        _log_parse_failure(e, tree_raw)
+        raise
+
+    tree = blueprint["behavior_tree"]
+    root_only = {k: v for k, v in tree.items() if k != "children"}
+    groups: List[Tuple[Dict[str, Any], List[str]]] = [(root_only, [tree["id"]])]
+    for child in tree.get("children") or []:
+        node_ids = _collect_node_ids(child)
+        if node_ids:
+            groups.append((child, node_ids))
+
+    node_insights: Dict[str, Any] = {}
+    raw_parts: List[str] = [tree_raw]
+    failures = 0
+    with ThreadPoolExecutor(max_workers=min(_fanout_parallelism(), len(groups))) as pool:
+        futures = [
+            pool.submit(
+                wrap_context(_generate_subtree_insights),
+                model_name,
+                task_description,
+                scenario,
+                tree,
+                subtree,
+                node_ids,
+            )
+            for subtree, node_ids in groups
+        ]
+        for (subtree, _), future in zip(groups, futures):
+            try:
+                insights, raw = future.result()
+            except Exception as e:
+                failures += 1
+                FALLBACKS.inc(reason="fanout_group_failed")
+                current_span().set_attribute("fanout.failed_groups", failures)
+                logger.warning("子树 %s 洞察生成失败: %s", subtree.get("id"), e)
+                continue
+            node_insights.update(insights)
+            raw_parts.append(raw)
+
+    if failures == len(groups):
+        raise ValueError("所有子树的 node_insights 均生成失败")
+
+    blueprint["node_insights"] = node_insights
+    missing = _missing_insights(blueprint)
+    if missing:
+        logger.warning("以下节点缺少洞察，将使用默认洞察: %s", missing)
+
+    with stage_timer("validate"):
+        _validate_blueprint(blueprint, tree_raw)
+    logger.info("两阶段蓝图生成完成: groups=%d, failures=%d", len(groups), failures)
+    return blueprint, "\n".join(raw_parts), failures
+
+
+@traced()
 def generate_blueprint_with_llm(
     model_name: str, task_description: str
 ) -> BlueprintResult:
@@ -439,20 +1121,31 @@ def generate_blueprint_with_llm(
 
     - 会自动在预设的测试任务场景中查找与 task_description 最相近的一条，
       并将其作为 one-shot 示例融入提示词。
+    - 环境变量 LLM_FANOUT 为真时使用两阶段生成（先树后并发洞察），否则单次生成。
     - 返回 BlueprintResult，便于上层在需要时查看匹配到的场景和原始内容。
     """
-    best: Tuple[Optional[Scenario], float] = find_best_scenario(
-        model_name=model_name, query=task_description
-    )
+    with stage_timer("scenario_match"):
+        best: Tuple[Optional[Scenario], float] = find_best_scenario(
+            model_name=model_name, query=task_description
+        )
     scenario, score = best
+    trace_span = current_span()
+    trace_span.set_attributes(**{
+        "model.name": model_name,
+        "scenario.id": getattr(scenario, "id", None),
+        "scenario.score": round(score, 4),
+    })
 
     # 若与某个预设场景的 example_input 相似度 >= 0.9，且该场景预置了标准 example_output，
     # 则直接返回该标准蓝图，不再调用大模型，以保证结果稳定且粒度一致。
     if scenario is not None and score >= 0.9 and getattr(scenario, "example_output", None):
-        print(
-            f"[LLM] 命中高相似度标准场景，直接返回预置 example_output: "
-            f"support_model={model_name}, scenario_id={scenario.id}, score={score:.3f}",
-            file=sys.stderr,
+        CACHE_EVENTS.inc(cache="static_example", result="hit")
+        trace_span.set_attribute("blueprint.source", "example_output")
+        logger.info(
+            "命中高相似度标准场景，直接返回预置 example_output: support_model=%s, scenario_id=%s, score=%.3f",
+            model_name,
+            scenario.id,
+            score,
         )
         return BlueprintResult(
             blueprint=scenario.example_output,  # type: ignore[arg-type]
@@ -460,108 +1153,81 @@ def generate_blueprint_with_llm(
             raw_content="__STATIC_EXAMPLE_OUTPUT__",
         )
 
-    # 否则使用匹配到的场景提示词，构造对话调用大模型生成蓝图
-    messages = _build_prompt(
-        model_name=model_name,
-        task_description=task_description,
-        scenario=scenario,
-    )
+    # 离线预计算或此前在线生成过的同一任务，直接读取持久化缓存
+    persistent = get_blueprint_cache()
+    if persistent is not None:
+        try:
+            stored = persistent.get_blueprint(model_name, task_description)
+        except CacheError as e:
+            logger.warning("读取持久化蓝图缓存失败: %s", e)
+            stored = None
+        CACHE_EVENTS.inc(cache="persistent_blueprint", result="hit" if stored is not None else "miss")
+        if stored is not None:
+            trace_span.set_attribute("blueprint.source", "persistent_cache")
+            logger.info("命中持久化蓝图缓存: support_model=%s", model_name)
+            return BlueprintResult(
+                blueprint=stored,
+                scenario=scenario,
+                raw_content="__PERSISTENT_CACHE_HIT__",
+            )
 
-    client = _get_client()
-    print(
-        f"[LLM] 调用蓝图生成: model={os.environ.get('MODEL_NAME', 'glm-4-flash')}, "
-        f"support_model={model_name}, scenario_id={getattr(scenario, 'id', None)}, score={score:.3f}",
-        file=sys.stderr,
-    )
-    response = client.chat.completions.create(
-        model=os.environ.get("MODEL_NAME", "glm-4-flash"),
-        messages=messages,
+    # 仅实体（坐标/数量/时限/货物等）不同的近似任务，直接替换缓存蓝图中的实体值
+    use_semantic_cache = semantic_cache_enabled()
+    if use_semantic_cache:
+        cached = semantic_cache.lookup(
+            model_name,
+            task_description,
+            validate=lambda bp: _validate_blueprint(bp, ""),
+        )
+        CACHE_EVENTS.inc(cache="semantic", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            trace_span.set_attribute("blueprint.source", "semantic_cache")
+            logger.info("命中语义缓存，替换实体后返回: support_model=%s", model_name)
+            return BlueprintResult(
+                blueprint=cached,
+                scenario=scenario,
+                raw_content="__SEMANTIC_CACHE_HIT__",
+            )
+
+    # 否则使用匹配到的场景提示词，构造对话调用大模型生成蓝图
+    fanout = _use_fanout()
+    trace_span.set_attributes(**{"blueprint.source": "llm", "llm.fanout": fanout})
+    logger.info(
+        "调用蓝图生成: model=%s, support_model=%s, scenario_id=%s, score=%.3f, fanout=%s",
+        get_stage_config("generate").model,
+        model_name,
+        getattr(scenario, "id", None),
+        score,
+        fanout,
     )
+    failures = 0
+    with stage_timer("llm_generate"):
+        if fanout:
+            blueprint, raw_content, failures = _generate_two_phase(model_name, task_description, scenario)
+        else:
+            blueprint, raw_content = _generate_single_shot(model_name, task_description, scenario)
 
-    # 兼容 OpenAI 风格的返回结构
-    message = response.choices[0].message
-    raw_content = ""
-    if isinstance(message.content, list):
-        # 多模态内容，这里只拼接文本部分
-        raw_content = "".join(
-            part.get("text", "") for part in message.content if isinstance(part, dict)
+    # 部分子树失败（含被准入控制拒绝）或缺少节点洞察的蓝图只用于本次响应，
+    # 不写入缓存，避免后续相同 / 近似任务一直拿到不完整的结果
+    missing = _missing_insights(blueprint)
+    if failures or missing:
+        logger.warning(
+            "蓝图不完整，跳过缓存写入: support_model=%s, failed_groups=%d, missing_insights=%d",
+            model_name,
+            failures,
+            len(missing),
         )
-    else:
-        raw_content = str(message.content or "")
+        return BlueprintResult(blueprint=blueprint, scenario=scenario, raw_content=raw_content)
 
-    print("[LLM] 蓝图生成完成，开始解析 JSON", file=sys.stderr)
-    print(f"[LLM] 原始内容长度: {len(raw_content)} 字符", file=sys.stderr)
-    try:
-        blueprint = _extract_json(raw_content)
-        print(f"[LLM] JSON提取成功，提取出的键: {list(blueprint.keys())}", file=sys.stderr)
-        
-        # 验证蓝图结构
-        if not isinstance(blueprint, dict):
-            raise ValueError("蓝图必须是字典类型")
-        
-        if "behavior_tree" not in blueprint:
-            print(f"[LLM] 调试: 提取出的JSON结构: {list(blueprint.keys())}", file=sys.stderr)
-            print(f"[LLM] 调试: 原始内容前1000字符: {raw_content[:1000]}", file=sys.stderr)
-            raise ValueError("蓝图缺少 'behavior_tree' 字段")
-        
-        if "node_insights" not in blueprint:
-            raise ValueError("蓝图缺少 'node_insights' 字段")
-        
-        # 验证 behavior_tree 结构
-        tree = blueprint["behavior_tree"]
-        if not isinstance(tree, dict):
-            raise ValueError("behavior_tree 必须是字典类型")
-        
-        required_tree_fields = ["id", "label", "status", "summary", "children"]
-        for field in required_tree_fields:
-            if field not in tree:
-                raise ValueError(f"behavior_tree 缺少必需字段: {field}")
-        
-        # 验证 status 值
-        if tree["status"] not in ["pending", "active", "completed"]:
-            print(f"[LLM] 警告: behavior_tree.status 值 '{tree['status']}' 不在标准值列表中，将使用 'pending'", file=sys.stderr)
-            tree["status"] = "pending"
-        
-        # 验证 node_insights 结构
-        insights = blueprint["node_insights"]
-        if not isinstance(insights, dict):
-            raise ValueError("node_insights 必须是字典类型")
-        
-        # 验证每个节点的洞察信息
-        for node_id, insight in insights.items():
-            if not isinstance(insight, dict):
-                print(f"[LLM] 警告: 节点 {node_id} 的洞察信息不是字典类型，将使用默认值", file=sys.stderr)
-                continue
-            
-            required_insight_fields = ["title", "summary", "key_points", "knowledge_trace"]
-            for field in required_insight_fields:
-                if field not in insight:
-                    print(f"[LLM] 警告: 节点 {node_id} 的洞察信息缺少字段 '{field}'，将使用默认值", file=sys.stderr)
-                    if field == "key_points":
-                        insight[field] = []
-                    else:
-                        insight[field] = ""
-            
-            # 验证 knowledge_graph（如果存在）
-            if "knowledge_graph" in insight:
-                kg = insight["knowledge_graph"]
-                if not isinstance(kg, dict):
-                    print(f"[LLM] 警告: 节点 {node_id} 的 knowledge_graph 不是字典类型，将移除", file=sys.stderr)
-                    del insight["knowledge_graph"]
-                else:
-                    if "nodes" not in kg or "edges" not in kg:
-                        print(f"[LLM] 警告: 节点 {node_id} 的 knowledge_graph 缺少 nodes 或 edges，将移除", file=sys.stderr)
-                        del insight["knowledge_graph"]
-        
-        print("[LLM] 蓝图结构验证通过", file=sys.stderr)
-        
-    except (ValueError, json.JSONDecodeError) as e:
-        print(f"[LLM] 蓝图解析或验证失败: {e}", file=sys.stderr)
-        print(f"[LLM] 原始内容长度: {len(raw_content)} 字符", file=sys.stderr)
-        print(f"[LLM] 原始内容前1000字符: {raw_content[:1000]}", file=sys.stderr)
-        if len(raw_content) > 1000:
-            print(f"[LLM] 原始内容后500字符: {raw_content[-500:]}", file=sys.stderr)
-        raise
+    if use_semantic_cache:
+        semantic_cache.store(model_name, task_description, blueprint)
+    if persistent is not None:
+        try:
+            persistent.put_blueprint(
+                model_name, task_description, blueprint, getattr(scenario, "id", None)
+            )
+        except CacheError as e:
+            logger.warning("写入持久化蓝图缓存失败: %s", e)
 
     return BlueprintResult(
         blueprint=blueprint,
@@ -576,36 +1242,50 @@ def classify_model_with_llm(task_description: str) -> ClassificationResult:
 
     - 仅在 SUPPORT_MODELS 集合内进行选择
     - 使用 instruction/task.md 中等价的示例（通过 SCENARIOS）作为 few-shot
+    - 分类结果写入持久化缓存，同一任务描述再次请求时不再调用大模型
     """
+    persistent = get_blueprint_cache()
+    if persistent is not None:
+        try:
+            stored = persistent.get_classification(task_description)
+        except CacheError as e:
+            logger.warning("读取持久化分类缓存失败: %s", e)
+            stored = None
+        hit = stored is not None and stored[0] in SUPPORT_MODELS
+        CACHE_EVENTS.inc(cache="persistent_classification", result="hit" if hit else "miss")
+        if hit:
+            current_span().set_attribute("classification.source", "persistent_cache")
+            return ClassificationResult(
+                model_name=stored[0],
+                reason=stored[1],
+                raw_content="__PERSISTENT_CACHE_HIT__",
+            )
+
     messages = _build_classification_prompt(task_description=task_description)
 
-    client = _get_client()
-    print(
-        f"[LLM] 调用模型分类: model={os.environ.get('MODEL_NAME', 'glm-4-flash')}, "
-        f"task_snippet={task_description[:40]!r}",
-        file=sys.stderr,
+    logger.info(
+        "调用模型分类: model=%s, task_snippet=%r",
+        get_stage_config("classify").model,
+        task_description[:40],
     )
-    response = client.chat.completions.create(
-        model=os.environ.get("MODEL_NAME", "glm-4-flash"),
-        messages=messages,
-    )
-
-    message = response.choices[0].message
-    if isinstance(message.content, list):
-        raw_content = "".join(
-            part.get("text", "") for part in message.content if isinstance(part, dict)
-        )
-    else:
-        raw_content = str(message.content or "")
+    raw_content = _chat("classify", messages).content
 
-    print("[LLM] 模型分类完成，开始解析 JSON", file=sys.stderr)
-    data = _extract_json(raw_content)
+    logger.debug("模型分类完成，开始解析 JSON")
+    with stage_timer("json_extract"):
+        data = _extract_json(raw_content)
     model_name = data.get("model_name", "") or ""
     reason = data.get("reason", "") or ""
 
-    # 兜底：若返回的 model_name 不在候选集合中，则回退到第一个模型
+    # 兜底：若返回的 model_name 不在候选集合中，则回退到第一个模型（兜底结果不写缓存）
     if model_name not in SUPPORT_MODELS:
+        FALLBACKS.inc(reason="classification_out_of_set")
+        current_span().set_attribute("fallback.cause", "classification_out_of_set")
         model_name = SUPPORT_MODELS[0]
+    elif persistent is not None:
+        try:
+            persistent.put_classification(task_description, model_name, reason)
+        except CacheError as e:
+            logger.warning("写入持久化分类缓存失败: %s", e)
 
     return ClassificationResult(
         model_name=model_name,
@@ -617,6 +1297,11 @@ def classify_model_with_llm(task_description: str) -> ClassificationResult:
 __all__ = [
     "BlueprintResult",
     "ClassificationResult",
+    "StageConfig",
+    "STAGES",
+    "get_stage_config",
+    "get_usage_stats",
+    "get_prompt_prefix_stats",
     "generate_blueprint_with_llm",
     "classify_model_with_llm",
 ]
@@ -0,0 +1,242 @@
+"""
+结构化日志。
+
+请求线程只做级别判断、限流/采样与入队，JSON 序列化与写 stderr 由后台线程（QueueListener）完成，
+慢速日志消费方（容器日志驱动、管道）不会阻塞请求。
+
+- LOG_FORMAT：json（缺省）或 text；
+- LOG_LEVEL：app 与 support_models 下各模块的缺省级别（缺省 INFO）；
+- LOG_LEVELS：按模块覆盖，如 "support_models.llm_client=WARNING,app=DEBUG"；
+- LOG_ASYNC：缺省开启，设为 0 时同步写 stderr；
+- LOG_QUEUE_SIZE：队列上限（缺省 10000），写满时丢弃新记录并计数；
+- LOG_RATE_LIMIT / LOG_RATE_LIMIT_BURST / LOG_RATE_LIMIT_INTERVAL：同一模板的 WARNING
+  每个窗口（缺省 60 秒）最多输出 burst 条（缺省 5），其余计入下一条的 suppressed 字段；
+- LOG_RAW_SAMPLE_RATE / LOG_RAW_MAX_CHARS：大模型原始内容转储的采样率（缺省 0.1）与截断长度（缺省 1000）。
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import REGISTRY, Counter
+from .tracing import current_span
+
+LOGGER_ROOTS = ("app", "support_models")
+
+LOG_RECORDS_DROPPED: Counter = REGISTRY.register(Counter(  # type: ignore[assignment]
+    "supportmodel_log_records_dropped_total",
+    "Log records not written, by reason (queue_full, rate_limited, sampled_out).",
+    ["reason"],
+))
+
+# LogRecord 自带的属性，其余属性视为 extra 结构化字段
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id", "suppressed"}
+
+
+def _env_number(name: str, cast, default):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _enabled(name: str) -> bool:
+    return os.environ.get(name, "1").lower() not in {"0", "false", "no"}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON：ts / level / logger / message / trace_id / suppressed / extra 字段 / exc。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, object] = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("trace_id", "suppressed"):
+            value = getattr(record, key, None)
+            if value:
+                data[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """在调用方线程上附加当前 trace id（后台线程已拿不到请求上下文）。"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = current_span().trace_id
+        if trace_id:
+            record.trace_id = trace_id
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    按 (logger, 级别, 消息模板) 限流 WARNING：每个 interval 窗口最多放行 burst 条。
+
+    消息模板是格式化前的 record.msg，因此只有参数不同的重复警告（如逐节点的“缺少字段”）会被合并。
+    """
+
+    def __init__(self, burst: int = 5, interval: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows: Dict[Tuple[str, int, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.WARNING:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            # [窗口起点, 窗口内已放行数, 被抑制数]
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = int(window[2]) if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > 4096:
+                    self._windows = {k: v for k, v in self._windows.items() if now - v[0] < self.interval}
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = int(window[2])
+                window[2] = 0
+            else:
+                window[2] += 1
+                LOG_RECORDS_DROPPED.inc(reason="rate_limited")
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列写满时丢弃记录而不是阻塞请求线程。"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在调用方线程完成 %-格式化（参数可能是之后会被修改的对象），异常栈单独保留到 exc_text
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(force: bool = False) -> None:
+    """为 app 与 support_models 日志器安装处理器（幂等；force 为真时按当前环境变量重新配置）。"""
+    global _configured, _listener
+    with _configure_lock:
+        if _configured and not force:
+            return
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+        stream = logging.StreamHandler(sys.stderr)
+        if os.environ.get("LOG_FORMAT", "json").lower() == "text":
+            stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        else:
+            stream.setFormatter(JsonFormatter())
+
+        if _enabled("LOG_ASYNC"):
+            handler: logging.Handler = DroppingQueueHandler(queue.Queue(max(1, _env_number("LOG_QUEUE_SIZE", int, 10000))))
+            _listener = logging.handlers.QueueListener(handler.queue, stream)  # type: ignore[attr-defined]
+            _listener.start()
+        else:
+            handler = stream
+        handler.addFilter(ContextFilter())
+        if _enabled("LOG_RATE_LIMIT"):
+            handler.addFilter(RateLimitFilter(
+                burst=max(1, _env_number("LOG_RATE_LIMIT_BURST", int, 5)),
+                interval=_env_number("LOG_RATE_LIMIT_INTERVAL", float, 60.0),
+            ))
+
+        default_level = os.environ.get("LOG_LEVEL", "INFO").upper()
+        for name in LOGGER_ROOTS:
+            logger = logging.getLogger(name)
+            for old in list(logger.handlers):
+                logger.removeHandler(old)
+            logger.addHandler(handler)
+            logger.setLevel(default_level)
+            logger.propagate = False
+        for name, level in _parse_levels(os.environ.get("LOG_LEVELS", "")).items():
+            logging.getLogger(name).setLevel(level)
+        _configured = True
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+
+
+def log_raw_content(logger: logging.Logger, level: int, label: str, content: str) -> None:
+    """
+    按 LOG_RAW_SAMPLE_RATE 采样输出大模型原始内容（长度 + 截断后的首尾片段）。
+
+    未被采样时不做任何字符串处理。
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if random.random() >= _env_number("LOG_RAW_SAMPLE_RATE", float, 0.1):
+        LOG_RECORDS_DROPPED.inc(reason="sampled_out")
+        return
+    limit = max(0, _env_number("LOG_RAW_MAX_CHARS", int, 1000))
+    head = content[:limit]
+    tail = content[-(limit // 2):] if len(content) > limit and limit else ""
+    logger.log(
+        level,
+        "%s: 原始内容 %d 字符",
+        label,
+        len(content),
+        extra={"raw_head": head, "raw_tail": tail},
+    )
+
+
+__all__ = [
+    "DroppingQueueHandler",
+    "JsonFormatter",
+    "RateLimitFilter",
+    "configure_logging",
+    "log_raw_content",
+]
@@ -0,0 +1,315 @@
+"""
+运行时指标。
+
+各阶段（分类、场景匹配、规则解析、大模型生成、JSON 提取、校验、深拷贝/序列化）的耗时直方图，
+缓存命中、回退原因计数与进行中的大模型调用数，通过 /metrics 以 Prometheus 文本格式导出。
+
+记录只是加锁后的字典累加，渲染只在抓取时进行，没有抓取方时开销可以忽略。
+启动预热等内部流量在 suppress_metrics() 设置的上下文中执行，期间的记录被丢弃。
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+_suppressed: "contextvars.ContextVar[bool]" = contextvars.ContextVar(
+    "supportmodel_metrics_suppressed", default=False
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if _suppressed.get():
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """进入时加一、退出时减一，用于统计进行中的调用数。"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每个标签组合：[各桶计数..., 总和, 总数]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if _suppressed.get():
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines: List[str] = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {_format_number(cumulative)}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {_format_number(state[-1])}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {_format_number(state[-2])}")
+            lines.append(f"{self.name}_count{plain} {_format_number(state[-1])}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """抓取时才调用 collect() 取值，用于导出已有模块自行维护的统计（如内存缓存的 stats()）。"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Dict[LabelValues, float]],
+        kind: str = "gauge",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self._collect = collect
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+            for key, value in sorted(self._collect().items())
+        ]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS: Histogram = REGISTRY.register(Histogram(  # type: ignore[assignment]
+    "supportmodel_stage_duration_seconds",
+    "Latency of each /api/update pipeline stage.",
+    ["stage"],
+))
+REQUEST_SECONDS: Histogram = REGISTRY.register(Histogram(  # type: ignore[assignment]
+    "supportmodel_http_request_duration_seconds",
+    "HTTP request latency by route and status.",
+    ["route", "method", "status"],
+))
+LLM_CALL_SECONDS: Histogram = REGISTRY.register(Histogram(  # type: ignore[assignment]
+    "supportmodel_llm_call_duration_seconds",
+    "Latency of individual chat.completions calls by LLM stage.",
+    ["stage", "outcome"],
+))
+LLM_INFLIGHT: Gauge = REGISTRY.register(Gauge(  # type: ignore[assignment]
+    "supportmodel_llm_inflight_calls",
+    "chat.completions calls currently in flight.",
+    ["stage"],
+))
+LLM_QUEUE_DEPTH: Gauge = REGISTRY.register(Gauge(  # type: ignore[assignment]
+    "supportmodel_llm_queue_depth",
+    "LLM calls waiting for admission, by priority.",
+    ["priority"],
+))
+LLM_QUEUE_WAIT_SECONDS: Histogram = REGISTRY.register(Histogram(  # type: ignore[assignment]
+    "supportmodel_llm_queue_wait_seconds",
+    "Time LLM calls spent waiting for admission, by priority and outcome (admitted / shed / timeout).",
+    ["priority", "outcome"],
+))
+LLM_TOKENS: Counter = REGISTRY.register(Counter(  # type: ignore[assignment]
+    "supportmodel_llm_tokens_total",
+    "Tokens consumed by LLM stage and kind.",
+    ["stage", "kind"],
+))
+CACHE_EVENTS: Counter = REGISTRY.register(Counter(  # type: ignore[assignment]
+    "supportmodel_cache_events_total",
+    "Cache lookups by cache and result.",
+    ["cache", "result"],
+))
+FALLBACKS: Counter = REGISTRY.register(Counter(  # type: ignore[assignment]
+    "supportmodel_fallbacks_total",
+    "Fallbacks to default model / rule or static blueprint, by reason.",
+    ["reason"],
+))
+
+
+# 当前请求内各阶段的累计耗时；仅在 app 开启 Server-Timing 时由请求钩子设置
+_request_stages: "contextvars.ContextVar[Optional[Dict[str, float]]]" = contextvars.ContextVar(
+    "supportmodel_request_stages", default=None
+)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """阶段耗时计时器：with stage_timer("scenario_match"): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+
+
+def collect_request_stages() -> contextvars.Token:
+    """开始累计当前请求的各阶段耗时，返回的令牌交给 reset_request_stages()。"""
+    return _request_stages.set({})
+
+
+def request_stages() -> Optional[Dict[str, float]]:
+    return _request_stages.get()
+
+
+def reset_request_stages(token: contextvars.Token) -> None:
+    _request_stages.reset(token)
+
+
+def suppress_metrics() -> contextvars.Token:
+    """当前上下文中不再记录计数与直方图（预热请求），返回的令牌交给 restore_metrics()。"""
+    return _suppressed.set(True)
+
+
+def restore_metrics(token: contextvars.Token) -> None:
+    _suppressed.reset(token)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+__all__ = [
+    "CACHE_EVENTS",
+    "FALLBACKS",
+    "LLM_CALL_SECONDS",
+    "LLM_INFLIGHT",
+    "LLM_QUEUE_DEPTH",
+    "LLM_QUEUE_WAIT_SECONDS",
+    "LLM_TOKENS",
+    "REGISTRY",
+    "REQUEST_SECONDS",
+    "STAGE_SECONDS",
+    "CallbackMetric",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "collect_request_stages",
+    "render_metrics",
+    "request_stages",
+    "reset_request_stages",
+    "restore_metrics",
+    "stage_timer",
+    "suppress_metrics",
+]
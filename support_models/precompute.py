@@ -0,0 +1,201 @@
+"""
+离线批量预计算蓝图。
+
+演练前大部分任务文本是已知的。本工具读取任务语料，对每条任务执行
+分类 → 场景匹配 → 蓝图生成，把校验通过的结果写入持久化蓝图缓存
+（support_models.blueprint_cache），演练当天首个请求即为缓存命中。
+
+- 语料格式：JSONL（每行 {"model_name"?: ..., "task_description": ...}）或带表头的 CSV；
+- 有界并发、失败重试（指数退避）与进度输出；大模型调用使用 batch 优先级（见 support_models.admission）；
+- 不使用语义缓存：近似任务的实体替换结果只是近似值，且不会写入持久化缓存，这里一律真实生成；
+- 已缓存的条目直接跳过；每条结果单独落盘，中断后重新运行即可续跑。
+
+用法：
+    python -m support_models.precompute corpus.jsonl --concurrency 4 --retries 2
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from . import SUPPORT_MODELS
+from .admission import llm_priority
+from .blueprint_cache import get_blueprint_cache
+from .cache_backends import MemoryBackend
+from .llm_client import classify_model_with_llm, generate_blueprint_with_llm
+from .logging_config import configure_logging
+from .scenarios import find_best_scenario
+from .semantic_cache import bypass_semantic_cache
+
+
+@dataclass
+class CorpusItem:
+    line: int
+    task_description: str
+    model_name: Optional[str] = None
+
+
+@dataclass
+class ItemResult:
+    item: CorpusItem
+    status: str  # generated / skipped / static / failed
+    model_name: str = ""
+    elapsed: float = 0.0
+    error: str = ""
+
+
+def read_corpus(path: str) -> List[CorpusItem]:
+    """读取 JSONL 或 CSV 语料，去除空任务与重复条目。"""
+    items: List[CorpusItem] = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows: Iterable[Tuple[int, dict]] = enumerate(csv.DictReader(f), start=2)
+        else:
+            rows = (
+                (number, json.loads(line))
+                for number, line in enumerate(f, start=1)
+                if line.strip()
+            )
+        for number, row in rows:
+            if isinstance(row, str):
+                row = {"task_description": row}
+            task = (row.get("task_description") or "").strip()
+            if not task:
+                continue
+            items.append(CorpusItem(number, task, (row.get("model_name") or "").strip() or None))
+
+    seen = set()
+    unique: List[CorpusItem] = []
+    for item in items:
+        key = (item.model_name, item.task_description)
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+    return unique
+
+
+def _process(item: CorpusItem, retries: int, backoff: float) -> ItemResult:
+    with llm_priority("batch"), bypass_semantic_cache():
+        return _process_item(item, retries, backoff)
+
+
+def _process_item(item: CorpusItem, retries: int, backoff: float) -> ItemResult:
+    cache = get_blueprint_cache()
+    assert cache is not None
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            # 1. 分类：显式模型优先，否则调用分类（结果同样写入持久化缓存）
+            model_name = item.model_name if item.model_name in SUPPORT_MODELS else None
+            if model_name is None:
+                model_name = classify_model_with_llm(item.task_description).model_name
+
+            # 2. 场景匹配：命中标准 example_output 的任务在线上本就不调用大模型
+            scenario, score = find_best_scenario(model_name=model_name, query=item.task_description)
+            if scenario is not None and score >= 0.9 and scenario.example_output:
+                return ItemResult(item, "static", model_name, time.perf_counter() - started)
+
+            # 3. 已缓存则跳过（断点续跑）
+            if cache.has_blueprint(model_name, item.task_description):
+                return ItemResult(item, "skipped", model_name, time.perf_counter() - started)
+
+            # 4. 生成：generate_blueprint_with_llm 内部完成校验并写入持久化缓存；
+            #    部分子树失败的不完整蓝图不会落盘，按失败重试
+            generate_blueprint_with_llm(model_name=model_name, task_description=item.task_description)
+            if not cache.has_blueprint(model_name, item.task_description):
+                raise RuntimeError("生成结果不完整或未写入持久化缓存")
+            return ItemResult(item, "generated", model_name, time.perf_counter() - started)
+        except Exception as e:
+            if attempt >= retries:
+                return ItemResult(item, "failed", item.model_name or "", time.perf_counter() - started, str(e))
+            delay = backoff * (2 ** attempt)
+            attempt += 1
+            print(
+                f"[Precompute] 第 {item.line} 行失败，{delay:.1f}s 后第 {attempt} 次重试: {e}",
+                file=sys.stderr,
+            )
+            time.sleep(delay)
+
+
+def run(
+    items: List[CorpusItem], concurrency: int = 4, retries: int = 2, backoff: float = 2.0
+) -> List[ItemResult]:
+    """有界并发处理全部条目，逐条输出进度。"""
+    results: List[ItemResult] = []
+    counts = {"generated": 0, "skipped": 0, "static": 0, "failed": 0}
+    lock = threading.Lock()
+    total = len(items)
+    started = time.perf_counter()
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    futures = [pool.submit(_process, item, retries, backoff) for item in items]
+    try:
+        for future in as_completed(futures):
+            result = future.result()
+            with lock:
+                results.append(result)
+                counts[result.status] += 1
+                done = len(results)
+            detail = f" error={result.error}" if result.error else ""
+            print(
+                f"[Precompute] [{done}/{total}] {result.status:<9} line={result.item.line} "
+                f"model={result.model_name or '-'} {result.elapsed:.1f}s "
+                f"task={result.item.task_description[:30]!r}{detail}",
+                file=sys.stderr,
+                flush=True,
+            )
+    except KeyboardInterrupt:
+        for future in futures:
+            future.cancel()
+        print("[Precompute] 已中断，已完成的条目均已落盘，重新运行即可续跑。", file=sys.stderr)
+        raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    print(
+        f"[Precompute] 完成 {total} 条，用时 {time.perf_counter() - started:.1f}s: "
+        + ", ".join(f"{k}={v}" for k, v in counts.items()),
+        file=sys.stderr,
+    )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="离线批量预计算蓝图并写入持久化缓存")
+    parser.add_argument("corpus", help="JSONL 或 CSV 语料文件")
+    parser.add_argument("--concurrency", type=int, default=4, help="最大并发条目数")
+    parser.add_argument("--retries", type=int, default=2, help="单条失败后的重试次数")
+    parser.add_argument("--backoff", type=float, default=2.0, help="重试退避基数（秒）")
+    parser.add_argument("--cache-path", help="SQLite 缓存路径（覆盖 CACHE_PATH）")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    if args.cache_path:
+        os.environ["CACHE_PATH"] = args.cache_path
+    os.environ.setdefault("BLUEPRINT_CACHE", "1")
+    cache = get_blueprint_cache()
+    if cache is None:
+        print("[Precompute] 持久化蓝图缓存已被 BLUEPRINT_CACHE=0 或 CACHE_BACKEND=none 关闭", file=sys.stderr)
+        return 2
+    if isinstance(cache.cache.backend, MemoryBackend):
+        print("[Precompute] CACHE_BACKEND=memory 的结果不会被服务进程共享，请使用 sqlite 或 redis", file=sys.stderr)
+        return 2
+
+    items = read_corpus(args.corpus)
+    print(f"[Precompute] 读取 {len(items)} 条任务，缓存中已有 {cache.count()} 条蓝图", file=sys.stderr)
+    try:
+        results = run(items, args.concurrency, args.retries, args.backoff)
+    except KeyboardInterrupt:
+        return 130
+    return 1 if any(r.status == "failed" for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
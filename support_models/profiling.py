@@ -0,0 +1,215 @@
+"""
+按需的单请求性能剖析。
+
+配置 PROFILE_TOKEN 后，携带 X-Profile: <token> 请求头（或 ?profile=<token>）的请求会在剖析器下执行：
+- cprofile（缺省）：确定性剖析，报告为按累计耗时排序的前 N 个函数；
+- sample：后台线程按 PROFILE_INTERVAL 对请求线程采样调用栈，报告为 collapsed stack
+  （可直接交给 flamegraph.pl / speedscope）。
+
+报告保存到 PROFILE_DIR 供下载，JSON 响应体内同时附带 profile 字段。
+未配置 PROFILE_TOKEN 时每个请求只多一次环境变量读取。
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional, Tuple
+
+MODES = ("cprofile", "sample")
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+_DEFAULT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "profiles"
+)
+
+
+def _env_number(name: str, cast, default):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def profile_token() -> str:
+    return os.environ.get("PROFILE_TOKEN", "")
+
+
+def is_authorized(supplied: Optional[str]) -> bool:
+    """
+    PROFILE_TOKEN 未配置时总是 False。
+
+    按 UTF-8 字节比较：compare_digest 对含非 ASCII 字符的 str 会抛出 TypeError，
+    任意客户端都能借此让请求在 before_request 钩子中失败。
+    """
+    token = profile_token()
+    if not token or not supplied:
+        return False
+    return hmac.compare_digest(
+        token.encode("utf-8", "surrogateescape"), supplied.encode("utf-8", "surrogateescape")
+    )
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    module = os.path.splitext(os.path.basename(filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+class _StackSampler:
+    """对单个线程周期性采样调用栈，累计 collapsed stack 计数。"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels: List[str] = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class RequestProfiler:
+    """剖析当前线程上的一段执行：start() … stop() 后通过 report() 取得文本报告。"""
+
+    def __init__(self, mode: str = "cprofile", top: int = 40, interval: float = 0.001):
+        if mode not in MODES:
+            raise ValueError(f"未知的剖析模式: {mode}")
+        self.mode = mode
+        self.top = top
+        self.interval = interval
+        self.elapsed = 0.0
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_StackSampler] = None
+        self._started = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = _StackSampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.elapsed = time.perf_counter() - self._started
+
+    @property
+    def samples(self) -> Optional[int]:
+        return self._sampler.samples if self._sampler is not None else None
+
+    @property
+    def format(self) -> str:
+        return "top" if self.mode == "cprofile" else "collapsed"
+
+    def report(self) -> str:
+        if self._profile is not None:
+            out = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=out)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            return out.getvalue()
+        if self._sampler is not None:
+            lines = [f"{stack} {count}" for stack, count in self._sampler.stacks.most_common()]
+            return "\n".join(lines) + ("\n" if lines else "")
+        return ""
+
+
+class ProfileStore:
+    """把报告写入目录，只保留最近 keep 份。"""
+
+    def __init__(self, directory: str, keep: int = 50):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str, fmt: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{fmt}.txt")
+
+    def save(self, report: str, fmt: str) -> str:
+        profile_id = uuid.uuid4().hex
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(profile_id, fmt), "w", encoding="utf-8") as f:
+                f.write(report)
+            files = sorted(
+                (os.path.join(self.directory, name) for name in os.listdir(self.directory)),
+                key=os.path.getmtime,
+            )
+            for stale in files[: max(0, len(files) - self.keep)]:
+                os.remove(stale)
+        return profile_id
+
+    def load(self, profile_id: str) -> Optional[Tuple[str, str]]:
+        """返回 (格式, 报告)，不存在时返回 None。"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        for fmt in ("top", "collapsed"):
+            path = self._path(profile_id, fmt)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    return fmt, f.read()
+        return None
+
+
+def profiler_from_request(supplied: Optional[str], mode: Optional[str]) -> Optional[RequestProfiler]:
+    """令牌匹配时按请求参数与 PROFILE_TOP / PROFILE_INTERVAL 构造剖析器，否则返回 None。"""
+    if not is_authorized(supplied):
+        return None
+    return RequestProfiler(
+        mode=mode if mode in MODES else "cprofile",
+        top=max(1, _env_number("PROFILE_TOP", int, 40)),
+        interval=max(0.0001, _env_number("PROFILE_INTERVAL", float, 0.001)),
+    )
+
+
+_store: Optional[ProfileStore] = None
+
+
+def get_profile_store() -> ProfileStore:
+    """PROFILE_DIR（缺省为仓库下 cache/profiles），PROFILE_KEEP（缺省 50）。"""
+    global _store
+    if _store is None:
+        _store = ProfileStore(
+            os.environ.get("PROFILE_DIR") or _DEFAULT_DIR,
+            keep=max(1, _env_number("PROFILE_KEEP", int, 50)),
+        )
+    return _store
+
+
+__all__ = [
+    "MODES",
+    "ProfileStore",
+    "RequestProfiler",
+    "get_profile_store",
+    "is_authorized",
+    "profile_token",
+    "profiler_from_request",
+]
@@ -1,18 +1,66 @@
+import hashlib
+import json
+import logging
 from difflib import SequenceMatcher
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .cache_backends import CacheError, get_shared_cache
+from .metrics import CACHE_EVENTS
 from .scenes.schema import Scenario
-from .scenes import off_road_logistics, equipment_deployment, casualty_rescue, personnel_transport, logistics_resource_management_control, resource_support
 
-SCENARIOS: List[Scenario] = [
-    *[s for s in [
-        off_road_logistics,
-        equipment_deployment,
+logger = logging.getLogger(__name__)
+
+SCENARIO_NAMESPACE = "scenario"
+
+
+@lru_cache(maxsize=1)
+def load_scenarios() -> List[Scenario]:
+    """
+    首次调用时才导入场景库（含全部 example_output，体积较大），之后复用同一列表。
+
+    仍可通过 `from support_models.scenarios import SCENARIOS` 取得，同样在首次访问时加载。
+    """
+    from .scenes import (
         casualty_rescue,
-        personnel_transport,
+        equipment_deployment,
         logistics_resource_management_control,
-        resource_support
-    ] for s in s.SCENARIOS]
-]
+        off_road_logistics,
+        personnel_transport,
+        resource_support,
+    )
+
+    return [
+        *[s for s in [
+            off_road_logistics,
+            equipment_deployment,
+            casualty_rescue,
+            personnel_transport,
+            logistics_resource_management_control,
+            resource_support
+        ] for s in s.SCENARIOS]
+    ]
+
+
+@lru_cache(maxsize=1)
+def scenarios_version() -> str:
+    """场景库版本：各场景 id、模型与 example_input 的内容哈希，场景库变更后旧的匹配缓存自然失效。"""
+    content = json.dumps(
+        [(s.id, s.model_name, s.example_input) for s in load_scenarios()],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+@lru_cache(maxsize=1)
+def _scenarios_by_id() -> Dict[str, Scenario]:
+    return {s.id: s for s in load_scenarios()}
+
+
+def __getattr__(name: str):
+    if name == "SCENARIOS":
+        return load_scenarios()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _similarity(a: str, b: str) -> float:
@@ -25,10 +73,35 @@ def find_best_scenario(model_name: str, query: str) -> Tuple[Optional[Scenario],
     """
     在给定模型下，根据用户任务描述找到最相近的预设场景。
 
-    返回 (Scenario 或 None, 相似度 0~1)。
+    返回 (Scenario 或 None, 相似度 0~1)。逐条计算相似度约需毫秒级，
+    结果按 (场景库版本, 模型, 任务描述) 写入共享缓存（support_models.cache_backends），多个 worker 共用。
     """
+    cache = get_shared_cache() if query else None
+    if cache is None:
+        return _match(model_name, query)
+
+    key = hashlib.sha256(f"{scenarios_version()}\x00{model_name}\x00{query}".encode("utf-8")).hexdigest()
+    try:
+        cached = cache.get(SCENARIO_NAMESPACE, key)
+    except CacheError as e:
+        logger.warning("读取场景匹配缓存失败: %s", e)
+        cached = None
+    if cached is not None and (cached["id"] is None or cached["id"] in _scenarios_by_id()):
+        CACHE_EVENTS.inc(cache="scenario_match", result="hit")
+        return _scenarios_by_id().get(cached["id"]) if cached["id"] else None, cached["score"]
+    CACHE_EVENTS.inc(cache="scenario_match", result="miss")
+
+    best, score = _match(model_name, query)
+    try:
+        cache.set(SCENARIO_NAMESPACE, key, {"id": getattr(best, "id", None), "score": score})
+    except CacheError as e:
+        logger.warning("写入场景匹配缓存失败: %s", e)
+    return best, score
+
+
+def _match(model_name: str, query: str) -> Tuple[Optional[Scenario], float]:
     candidates: List[Scenario] = [
-        s for s in SCENARIOS if s.model_name == model_name]
+        s for s in load_scenarios() if s.model_name == model_name]
     if not candidates:
         return None, 0.0
 
@@ -43,4 +116,4 @@ def find_best_scenario(model_name: str, query: str) -> Tuple[Optional[Scenario],
     return best, best_score
 
 
-__all__ = ["Scenario", "SCENARIOS", "find_best_scenario"]
+__all__ = ["Scenario", "SCENARIOS", "find_best_scenario", "load_scenarios", "scenarios_version"]
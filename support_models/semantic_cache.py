@@ -0,0 +1,348 @@
+"""
+近似重复任务的语义缓存。
+
+大量任务只在坐标、地点代号、货物名称、数量与时限上不同，例如
+"向位置X（190,100）运输2车冷链物资"。这里用规则解析器抽取这些实体，
+把任务文本抽象成模板（实体替换为占位符）作为缓存键；命中时把缓存蓝图
+JSON 文本中的旧实体值替换为新值，从而免去一次大模型调用。
+
+只替换地点代号与货物名称。蓝图中由坐标、数量、时限推算出的内容（车辆与载重分配、
+百分比、时间安排等）无法逐字对齐，因此这三类实体的原值也计入缓存键：数值不同的任务
+视为未命中，按正常流程生成。
+
+替换有护栏：数值实体不同、旧值在蓝图中找不到（无法对齐）、同一旧值对应多个新值、
+替换后不是合法 JSON 等情况一律拒绝，交由上层正常调用大模型。
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .offroad_logistics import parse_task_description
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Entity:
+    """任务文本中抽取出的一个实体。"""
+
+    kind: str  # COORD / TIME / QTY / LOC / CARGO
+    value: str
+    start: int
+    end: int
+
+
+_COORD_RE = re.compile(r"[（(]\s*(-?\d+(?:\.\d+)?)\s*[,，]\s*(-?\d+(?:\.\d+)?)\s*[)）]")
+_TIME_RE = re.compile(r"\d+(?:\.\d+)?\s*(?:小时|分钟|天)")
+_QTY_RE = re.compile(
+    r"\d+(?:\.\d+)?\s*(?:车|辆|箱|架|台|名|人|吨|kg|公斤|件|套|批|个|份|组|m³)"
+)
+_LOC_RE = re.compile(
+    r"(?:位置|区域|地点|阵地|据点|目标点|安全点)\s*[A-Za-z][A-Za-z0-9]*"
+    r"|(?<![A-Za-z0-9])[A-Z][A-Za-z0-9]*(?:点|位置|区域)"
+)
+_DEST_RE = re.compile(r"[A-Za-z0-9]|(?:点|地|区|站|营|库|所)$")
+# 货物名称止于连接词与方向词，如"冷链物资到A点"只取"冷链物资"
+_CARGO_STOP_RE = re.compile(r"到|至|前往|送往|运往|以及|及|和|与|并|[，,。；;]")
+# 数值实体：蓝图中由其推算出的内容无法逐字替换，只缓存原值
+NUMERIC_KINDS = ("COORD", "TIME", "QTY")
+_TRIM = "。.；;、，,的 "
+
+
+def _claim(spans: List[Tuple[int, int]], start: int, end: int) -> bool:
+    if any(start < e and s < end for s, e in spans):
+        return False
+    spans.append((start, end))
+    return True
+
+
+def _uncovered_piece(spans: List[Tuple[int, int]], start: int, end: int) -> Tuple[int, int]:
+    """返回 [start, end) 中未被已有实体覆盖的最长片段。"""
+    best = (start, start)
+    cursor = start
+    for s, e in sorted(spans):
+        if e <= cursor:
+            continue
+        if s >= end:
+            break
+        if s - cursor > best[1] - best[0]:
+            best = (cursor, s)
+        cursor = max(cursor, e)
+    if end - cursor > best[1] - best[0]:
+        best = (cursor, end)
+    return best
+
+
+def extract_entities(task_description: str) -> List[Entity]:
+    """
+    抽取坐标、时限、数量、地点代号与货物名称。
+
+    细粒度实体（坐标/时限/数量/地点）优先用正则认领；货物与目的地沿用
+    parse_task_description 的规则结果，只保留未被细粒度实体覆盖的部分。
+    """
+    text = task_description or ""
+    spans: List[Tuple[int, int]] = []
+    entities: List[Entity] = []
+
+    for match in _COORD_RE.finditer(text):
+        if _claim(spans, match.start(), match.end()):
+            entities.append(Entity("COORD", f"{match.group(1)},{match.group(2)}", match.start(), match.end()))
+    for kind, pattern in (("TIME", _TIME_RE), ("QTY", _QTY_RE), ("LOC", _LOC_RE)):
+        for match in pattern.finditer(text):
+            if _claim(spans, match.start(), match.end()):
+                entities.append(Entity(kind, re.sub(r"\s+", "", match.group(0)), match.start(), match.end()))
+
+    parsed = parse_task_description(text)
+    for key in ("cargo", "destination"):
+        value = parsed.get(key)
+        if not value:
+            continue
+        at = text.find(value)
+        if at < 0:
+            continue
+        s, e = _uncovered_piece(spans, at, at + len(value))
+        piece = text[s:e]
+        if key == "cargo":
+            stop = _CARGO_STOP_RE.search(piece)
+            if stop is not None:
+                piece = piece[: stop.start()]
+        lead = len(piece) - len(piece.lstrip(_TRIM))
+        piece = piece.strip(_TRIM)
+        if len(piece) < 2 or re.fullmatch(r"[\d\W_]+", piece):
+            continue
+        # 目的地规则较宽（如"前往实施救助"），只接受带代号或地点后缀的片段
+        if key == "destination" and not _DEST_RE.search(piece):
+            continue
+        s += lead
+        if _claim(spans, s, s + len(piece)):
+            entities.append(Entity("CARGO" if key == "cargo" else "LOC", piece, s, s + len(piece)))
+
+    entities.sort(key=lambda ent: ent.start)
+    return entities
+
+
+def task_template(task_description: str, entities: Optional[List[Entity]] = None) -> str:
+    """把任务文本中的实体替换为类型占位符，得到实体无关的任务模板。"""
+    text = task_description or ""
+    if entities is None:
+        entities = extract_entities(text)
+    parts: List[str] = []
+    cursor = 0
+    for ent in entities:
+        parts.append(text[cursor : ent.start])
+        parts.append(f"<{ent.kind}>")
+        cursor = ent.end
+    parts.append(text[cursor:])
+    return "".join(parts).strip()
+
+
+def _json_fragment(value: str) -> str:
+    """实体值在 JSON 文本中的转义形式。"""
+    return json.dumps(value, ensure_ascii=False)[1:-1]
+
+
+def _entity_pattern(entity: Entity) -> "re.Pattern[str]":
+    if entity.kind == "COORD":
+        x, y = entity.value.split(",", 1)
+        return re.compile(rf"(?<![\d.]){re.escape(x)}(\s*[,，]\s*){re.escape(y)}(?![\d.])")
+    if entity.kind in ("TIME", "QTY"):
+        number = re.match(r"\d+(?:\.\d+)?", entity.value).group(0)  # type: ignore[union-attr]
+        unit = entity.value[len(number):]
+        return re.compile(rf"(?<![\d.]){re.escape(number)}\s*{re.escape(unit)}")
+    if entity.kind == "LOC":
+        return re.compile(rf"(?<![A-Za-z0-9]){re.escape(_json_fragment(entity.value))}(?![A-Za-z0-9])")
+    return re.compile(re.escape(_json_fragment(entity.value)))
+
+
+class SubstitutionRejected(ValueError):
+    """实体无法对齐，拒绝替换。"""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+
+def substitute_entities(
+    blueprint_text: str, old: List[Entity], new: List[Entity]
+) -> Dict[str, Any]:
+    """
+    把蓝图 JSON 文本中的旧实体值替换为新值并解析；坐标、数量、时限不同时拒绝。
+
+    两遍替换：先把所有旧值替换为哨兵，再把哨兵替换为新值，避免替换链
+    （如 2→3 之后 3→5）相互干扰；较长的旧值先替换，避免子串误伤。
+    """
+    if [e.kind for e in old] != [e.kind for e in new]:
+        raise SubstitutionRejected("entity_mismatch", "实体类型或数量不一致")
+
+    mapping: Dict[Tuple[str, str], str] = {}
+    for o, n in zip(old, new):
+        if o.kind in NUMERIC_KINDS and o.value != n.value:
+            raise SubstitutionRejected("numeric_changed", f"{o.value} → {n.value}")
+        previous = mapping.setdefault((o.kind, o.value), n.value)
+        if previous != n.value:
+            raise SubstitutionRejected("ambiguous", f"{o.value} 对应多个新值")
+
+    text = blueprint_text
+    pending = sorted(
+        ((kind, value, target) for (kind, value), target in mapping.items() if value != target),
+        key=lambda item: -len(item[1]),
+    )
+    replacements: List[Tuple[str, str]] = []
+    for index, (kind, value, target) in enumerate(pending):
+        pattern = _entity_pattern(Entity(kind, value, 0, 0))
+
+        def _sentinel(match: "re.Match[str]", index: int = index) -> str:
+            sep = match.group(1) if match.groups() else ""
+            return f"\ue000{index}\ue002{sep}\ue001"
+
+        text, count = pattern.subn(_sentinel, text)
+        if count == 0:
+            raise SubstitutionRejected("unaligned", f"蓝图中找不到实体 {kind}={value}")
+        replacements.append((kind, target))
+
+    def _restore(match: "re.Match[str]") -> str:
+        kind, target = replacements[int(match.group(1))]
+        if kind == "COORD":
+            x, y = target.split(",", 1)
+            return f"{x}{match.group(2) or ','}{y}"
+        return _json_fragment(target)
+
+    text = re.sub("\ue000(\\d+)\ue002(.*?)\ue001", _restore, text)
+    try:
+        blueprint = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise SubstitutionRejected("invalid_json", str(e)) from e
+    if not isinstance(blueprint, dict):
+        raise SubstitutionRejected("invalid_json", "替换结果不是 JSON 对象")
+    return blueprint
+
+
+@dataclass
+class _Entry:
+    entities: List[Entity]
+    blueprint_text: str
+
+
+def _cache_key(model_name: str, task_description: str, entities: List[Entity]) -> Tuple[str, str, Tuple[str, ...]]:
+    numeric = tuple(f"{e.kind}={e.value}" for e in entities if e.kind in NUMERIC_KINDS)
+    return model_name, task_template(task_description, entities), numeric
+
+
+class SemanticBlueprintCache:
+    """
+    以 (支援模型, 任务模板, 数值实体原值) 为键的 LRU 蓝图缓存。
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, Tuple[str, ...]], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0}
+
+    def _count(self, key: str) -> None:
+        self._stats[key] = self._stats.get(key, 0) + 1
+
+    def lookup(
+        self,
+        model_name: str,
+        task_description: str,
+        validate: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """命中且实体可对齐时返回替换后的蓝图，否则返回 None。"""
+        entities = extract_entities(task_description)
+        key = _cache_key(model_name, task_description, entities)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count("misses")
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            blueprint = substitute_entities(entry.blueprint_text, entry.entities, entities)
+            if validate is not None:
+                validate(blueprint)
+        except SubstitutionRejected as e:
+            with self._lock:
+                self._count(f"rejected_{e.reason}")
+            logger.info("拒绝替换: %s", e)
+            return None
+        except ValueError as e:
+            with self._lock:
+                self._count("rejected_invalid")
+            logger.info("替换结果校验失败: %s", e)
+            return None
+
+        with self._lock:
+            self._count("hits")
+        return blueprint
+
+    def store(self, model_name: str, task_description: str, blueprint: Dict[str, Any]) -> None:
+        entities = extract_entities(task_description)
+        key = _cache_key(model_name, task_description, entities)
+        entry = _Entry(entities=entities, blueprint_text=json.dumps(blueprint, ensure_ascii=False))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._count("stores")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_bypassed: "contextvars.ContextVar[bool]" = contextvars.ContextVar("supportmodel_semantic_cache_bypassed", default=False)
+
+
+@contextmanager
+def bypass_semantic_cache() -> Iterator[None]:
+    """在该上下文内既不查询也不写入语义缓存（如离线预计算需要真实生成并落盘的结果）。"""
+    token = _bypassed.set(True)
+    try:
+        yield
+    finally:
+        _bypassed.reset(token)
+
+
+def semantic_cache_enabled() -> bool:
+    """环境变量 LLM_SEMANTIC_CACHE 为 0/false/no 或处于 bypass_semantic_cache() 内时关闭，缺省开启。"""
+    if _bypassed.get():
+        return False
+    return os.environ.get("LLM_SEMANTIC_CACHE", "1").lower() not in {"0", "false", "no"}
+
+
+def _max_entries() -> int:
+    try:
+        return max(1, int(os.environ.get("LLM_SEMANTIC_CACHE_SIZE", "512")))
+    except ValueError:
+        return 512
+
+
+semantic_cache = SemanticBlueprintCache(max_entries=_max_entries())
+
+
+__all__ = [
+    "NUMERIC_KINDS",
+    "Entity",
+    "SemanticBlueprintCache",
+    "SubstitutionRejected",
+    "bypass_semantic_cache",
+    "extract_entities",
+    "semantic_cache",
+    "semantic_cache_enabled",
+    "substitute_entities",
+    "task_template",
+]
@@ -0,0 +1,288 @@
+"""
+请求追踪。
+
+每个被采样的请求分配一个 trace id，分类、构建行为树、大模型生成、JSON 提取、节点洞察提取等步骤
+各记录一个嵌套 span（附场景 id、相似度、token 数、回退原因等属性），请求结束后按 OpenTelemetry
+OTLP/JSON 的 span 形态逐行写入可轮转的 JSONL 文件，便于复原现场慢请求实际走过的路径。
+
+采样：
+- TRACE_SAMPLE_RATE：按比例采样（0~1，缺省 0）；
+- TRACE_SLOW_MS：大于 0 时所有请求都先在内存中记录，耗时超过该阈值的请求一律落盘；
+- 请求携带 W3C traceparent 且 sampled 标志为 01 时沿用其 trace id 并强制采样。
+两者均未配置时不记录任何 span，各埋点只是一次 ContextVar 读取。
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    """转换为 OTLP/JSON 的 KeyValue。"""
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        record = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": 2 if not self.parent_id or self.parent_id == self.trace.remote_parent_id else 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+            "resource": {"attributes": [_attribute("service.name", "supportmodel")]},
+        }
+        return record
+
+
+class _NoopSpan:
+    """未采样时返回的占位 span，所有操作均为空。"""
+
+    trace_id = ""
+    span_id = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, trace_id: str, remote_parent_id: str, sampled: bool, slow_ns: int):
+        self.trace_id = trace_id
+        self.remote_parent_id = remote_parent_id
+        self.sampled = sampled
+        self.slow_ns = slow_ns
+        self.spans: List[Span] = []
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            if not self.closed:
+                self.spans.append(span)
+
+    def close(self, root: Span) -> List[Span]:
+        """返回需要导出的 span（未采样且未超过慢请求阈值时为空）。"""
+        with self._lock:
+            self.closed = True
+            spans = self.spans
+        keep = self.sampled or (self.slow_ns > 0 and root.end_ns - root.start_ns >= self.slow_ns)
+        return spans if keep else []
+
+
+class JsonlSpanExporter:
+    """按大小轮转的 JSONL 文件：超过 max_bytes 时 path → path.1 → … → path.<backup_count>。"""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    def _rotate(self) -> None:
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def export(self, spans: List[Span]) -> None:
+        if not spans:
+            return
+        lines = "".join(json.dumps(span.to_otlp(), ensure_ascii=False) + "\n" for span in spans)
+        data = lines.encode("utf-8")
+        with self._lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, "ab") as f:
+                    f.write(data)
+            except OSError as e:
+                logger.warning("写入追踪文件失败: %s", e)
+
+
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("supportmodel_span", default=None)
+_exporter: Optional[JsonlSpanExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> JsonlSpanExporter:
+    """TRACE_PATH（缺省 traces/spans.jsonl）、TRACE_MAX_BYTES（缺省 10 MB）、TRACE_BACKUP_COUNT（缺省 5）。"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = JsonlSpanExporter(
+                os.environ.get("TRACE_PATH", os.path.join("traces", "spans.jsonl")),
+                max_bytes=int(_env_float("TRACE_MAX_BYTES", 10 * 1024 * 1024)),
+                backup_count=int(_env_float("TRACE_BACKUP_COUNT", 5)),
+            )
+        return _exporter
+
+
+def current_span():
+    """当前活动 span；未采样时返回 NOOP_SPAN，可直接调用 set_attribute。"""
+    return _current.get() or NOOP_SPAN
+
+
+def start_trace(
+    name: str, traceparent: Optional[str] = None, **attributes: Any
+) -> Optional[Tuple[Span, contextvars.Token]]:
+    """
+    开始一次请求级追踪，返回 (根 span, 上下文令牌)；本次请求不记录时返回 None。
+
+    必须与 finish_trace() 成对调用。
+    """
+    rate = _env_float("TRACE_SAMPLE_RATE", 0.0)
+    slow_ns = int(_env_float("TRACE_SLOW_MS", 0.0) * 1_000_000)
+    match = _TRACEPARENT.match((traceparent or "").strip().lower())
+    forced = bool(match) and int(match.group(3), 16) & 1 == 1  # type: ignore[union-attr]
+    sampled = forced or (rate > 0 and random.random() < rate)
+    if not sampled and slow_ns <= 0:
+        return None
+
+    if match:
+        trace = Trace(match.group(1), match.group(2), sampled, slow_ns)
+    else:
+        trace = Trace("%032x" % random.getrandbits(128), "", sampled, slow_ns)
+    root = Span(trace, name, trace.remote_parent_id, attributes)
+    trace.add(root)
+    return root, _current.set(root)
+
+
+def finish_trace(handle: Optional[Tuple[Span, contextvars.Token]], error: Optional[BaseException] = None) -> None:
+    if handle is None:
+        return
+    root, token = handle
+    if error is not None and root.error is None:
+        root.error = f"{type(error).__name__}: {error}"
+    root.end_ns = time.time_ns()
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
+    get_exporter().export(root.trace.close(root))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """在当前追踪下开启一个子 span；未采样时直接产出 NOOP_SPAN。"""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    parent.trace.add(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """把整个函数调用记录为一个 span（名称缺省为函数名）。"""
+
+    def decorator(fn: F) -> F:
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def wrap_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """绑定调用方的上下文，使提交到线程池的任务挂在当前 span 之下。"""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+__all__ = [
+    "JsonlSpanExporter",
+    "NOOP_SPAN",
+    "Span",
+    "current_span",
+    "finish_trace",
+    "get_exporter",
+    "span",
+    "start_trace",
+    "traced",
+    "wrap_context",
+]
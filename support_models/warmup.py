@@ -0,0 +1,159 @@
+"""
+启动预热。
+
+worker 接收流量前预先构建并校验全部静态蓝图（_BLUEPRINTS）与场景预置 example_output，
+由 app 追加响应缓存的预热步骤，逐项记录耗时；就绪探针（/readyz）在预热完成后才返回 200，
+部署后的第一批请求不再承担深拷贝、场景库加载与首次 JSON 编码的开销。
+
+- WARMUP：background（缺省，后台线程执行，期间 /readyz 返回 503）、sync（加载 app 时同步执行，
+  导入 app 的脚本与测试都要等待预热完成）或 0（关闭，立即就绪）。
+"""
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import SUPPORT_MODELS, get_model_blueprint, registry_version
+from .llm_client import _validate_blueprint
+from .scenarios import load_scenarios
+
+logger = logging.getLogger(__name__)
+
+# (类别, 名称, 执行函数)；执行函数返回真值表示校验时修正了内容
+WarmupStep = Tuple[str, str, Callable[[], Optional[bool]]]
+
+
+@dataclass
+class WarmupItem:
+    kind: str
+    name: str
+    seconds: float
+    ok: bool
+    repaired: bool = False
+    error: Optional[str] = None
+
+
+def _check_blueprint(blueprint: Dict[str, Any]) -> bool:
+    """在副本上校验蓝图并完成一次 JSON 编码，返回校验是否修正了内容（原蓝图不变）。"""
+    checked = copy.deepcopy(blueprint)
+    _validate_blueprint(checked, "")
+    json.dumps(blueprint, ensure_ascii=False)
+    return checked != blueprint
+
+
+def _registry_version() -> None:
+    registry_version()
+
+
+def _load_scenes() -> None:
+    load_scenarios()
+
+
+def blueprint_steps() -> Iterable[WarmupStep]:
+    """注册表版本与各模型静态蓝图。"""
+    yield "registry", "version", _registry_version
+    for model_name in SUPPORT_MODELS:
+        yield "blueprint", model_name, lambda model_name=model_name: _check_blueprint(get_model_blueprint(model_name))
+
+
+def scenario_steps() -> Iterable[WarmupStep]:
+    """场景库加载与各场景的预置 example_output。"""
+    yield "scenes", "load", _load_scenes
+    for scenario in load_scenarios():
+        if scenario.example_output:
+            yield "example_output", scenario.id, lambda output=scenario.example_output: _check_blueprint(output)
+
+
+class Warmup:
+    """执行预热步骤并保存报告；ready 在全部步骤执行完（或预热关闭）后为真。"""
+
+    def __init__(self):
+        self.items: List[WarmupItem] = []
+        self.status = "pending"
+        self.seconds = 0.0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _run_step(self, kind: str, name: str, fn: Callable[[], Optional[bool]]) -> WarmupItem:
+        started = time.perf_counter()
+        try:
+            item = WarmupItem(kind, name, 0.0, ok=True, repaired=bool(fn()))
+        except Exception as e:
+            item = WarmupItem(kind, name, 0.0, ok=False, error=f"{type(e).__name__}: {e}")
+            logger.warning("预热失败: %s %s: %s", kind, name, item.error)
+        item.seconds = time.perf_counter() - started
+        if item.repaired:
+            logger.warning("预热校验修正了内容: %s %s", kind, name)
+        logger.debug("预热 %s %s 耗时 %.2f ms", kind, name, item.seconds * 1000)
+        return item
+
+    def run(self, steps: Iterable[WarmupStep]) -> None:
+        """依次执行（单个步骤失败只记录，不中断预热），结束后标记为就绪。"""
+        with self._lock:
+            self.status = "running"
+        started = time.perf_counter()
+        try:
+            for kind, name, fn in steps:
+                item = self._run_step(kind, name, fn)
+                with self._lock:
+                    self.items.append(item)
+        finally:
+            self.seconds = time.perf_counter() - started
+            with self._lock:
+                self.status = "ready"
+            self._ready.set()
+        report = self.report()
+        logger.info(
+            "预热完成: %d 项, 失败 %d, 修正 %d, 耗时 %.1f ms, 最慢: %s",
+            report["items"],
+            report["failed"],
+            report["repaired"],
+            self.seconds * 1000,
+            ", ".join(f"{item['kind']}:{item['name']} {item['ms']:.1f} ms" for item in report["slowest"]),
+        )
+
+    def start(self, steps: Callable[[], Iterable[WarmupStep]]) -> None:
+        """按 WARMUP 环境变量同步执行、在后台线程执行或跳过。"""
+        mode = os.environ.get("WARMUP", "background").lower()
+        if mode in {"0", "false", "no", "off"}:
+            with self._lock:
+                self.status = "skipped"
+            self._ready.set()
+        elif mode == "sync":
+            self.run(steps())
+        else:
+            threading.Thread(target=lambda: self.run(steps()), name="warmup", daemon=True).start()
+
+    def report(self, verbose: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            items = list(self.items)
+            status = self.status
+        slowest = sorted(items, key=lambda item: item.seconds, reverse=True)[:5]
+        report: Dict[str, Any] = {
+            "status": status,
+            "seconds": round(self.seconds, 4),
+            "items": len(items),
+            "failed": sum(1 for item in items if not item.ok),
+            "repaired": sum(1 for item in items if item.repaired),
+            "slowest": [{"kind": item.kind, "name": item.name, "ms": round(item.seconds * 1000, 2)} for item in slowest],
+        }
+        if verbose:
+            report["details"] = [dict(asdict(item), seconds=round(item.seconds, 6)) for item in items]
+        return report
+
+
+warmup = Warmup()
+
+
+__all__ = ["Warmup", "WarmupItem", "blueprint_steps", "scenario_steps", "warmup"]
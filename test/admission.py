@@ -0,0 +1,185 @@
+"""
+大模型准入控制检查：优先级、令牌桶限速、提前拒绝与排队超时，/api/update 的回退，
+以及异步任务以 batch 优先级执行、回退结果标记为降级且不被复用。
+
+端到端检查在本地假服务（bench/fake_llm.py）上进行：并发上限为 1 时，
+占用名额的请求正常走大模型，其余在线请求在时限内被拒绝并回退规则蓝图。
+
+用法：
+    python test/admission.py
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ["BLUEPRINT_CACHE"] = "0"
+os.environ["LLM_SEMANTIC_CACHE"] = "0"
+
+from support_models.admission import AdmissionController, AdmissionRejected, current_priority  # noqa: E402
+from support_models.metrics import render_metrics  # noqa: E402
+
+
+def _hold(controller, priority, seconds, order=None):
+    with controller.admit(priority):
+        if order is not None:
+            order.append(priority)
+        time.sleep(seconds)
+
+
+def check_interactive_first():
+    controller = AdmissionController(max_concurrency=1, budgets={"interactive": 5, "batch": 5})
+    order = []
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        first = pool.submit(_hold, controller, "interactive", 0.2)
+        time.sleep(0.05)
+        batch = pool.submit(_hold, controller, "batch", 0.01, order)
+        time.sleep(0.05)
+        interactive = pool.submit(_hold, controller, "interactive", 0.01, order)
+        for future in (first, batch, interactive):
+            future.result()
+    assert order == ["interactive", "batch"], order
+
+
+def check_batch_leaves_reserved_slot():
+    controller = AdmissionController(max_concurrency=2, interactive_reserved=1, budgets={"batch": 0.1})
+    with controller.admit("batch"):
+        try:
+            controller.acquire("batch")
+        except AdmissionRejected:
+            pass
+        else:
+            raise AssertionError("batch 不应占用为 interactive 预留的名额")
+        with controller.admit("interactive") as waited:
+            assert waited == 0.0
+
+
+def check_token_bucket():
+    controller = AdmissionController(max_concurrency=0, rate=20, burst=1, budgets={"interactive": 5})
+    started = time.monotonic()
+    for _ in range(5):
+        with controller.admit("interactive"):
+            pass
+    elapsed = time.monotonic() - started
+    # 突发 1 个，其余 4 个按 20 次/秒补充
+    assert 0.18 <= elapsed < 1.0, elapsed
+
+
+def check_early_shed():
+    controller = AdmissionController(max_concurrency=1, budgets={"interactive": 0.5})
+    controller.acquire("interactive")
+    controller.release(2.0)  # 记录一次 2 秒的占用
+    holder = threading.Thread(target=_hold, args=(controller, "interactive", 0.3))
+    holder.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    try:
+        controller.acquire("interactive")
+    except AdmissionRejected as e:
+        assert e.waited == 0.0 and time.monotonic() - started < 0.05, e
+    else:
+        raise AssertionError("预计等待超过时限时应立即拒绝")
+    finally:
+        holder.join()
+
+
+def check_queue_timeout():
+    controller = AdmissionController(max_concurrency=1, budgets={"interactive": 0.1})
+    holder = threading.Thread(target=_hold, args=(controller, "interactive", 0.4))
+    holder.start()
+    time.sleep(0.05)
+    try:
+        controller.acquire("interactive")
+    except AdmissionRejected as e:
+        assert 0.09 <= e.waited < 0.3, e.waited
+    else:
+        raise AssertionError("排队超过时限时应拒绝")
+    finally:
+        holder.join()
+    assert controller.stats()["queued_interactive"] == 0
+
+
+def check_update_sheds_to_rule_blueprint():
+    from fake_llm import FakeLLM, FakeLLMConfig, base_url, start_server
+
+    server = start_server(FakeLLM(FakeLLMConfig(ttft=1.0)))
+    os.environ.update({
+        "BASE_URL": base_url(server),
+        "API_KEY": "fake",
+        "USE_LLM_BLUEPRINT": "1",
+        "LLM_MAX_CONCURRENCY": "1",
+        "LLM_QUEUE_BUDGET_INTERACTIVE": "0.2",
+    })
+    from app import app
+
+    body = {"model_name": "越野物流", "task_description": "向位置Z（33,44）运输4车燃油，要求5小时内送达，途经沼泽。"}
+
+    def _post(index):
+        started = time.monotonic()
+        response = app.test_client().post("/api/update", json=dict(body, task_description=body["task_description"] + str(index)))
+        assert response.status_code == 200
+        return time.monotonic() - started
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        elapsed = sorted(pool.map(_post, range(4)))
+    server.shutdown()
+    # 一个请求走大模型（约 1 秒），其余在时限附近回退
+    assert elapsed[-1] >= 0.9 and elapsed[0] < 0.6, elapsed
+    metrics = render_metrics()
+    assert 'supportmodel_fallbacks_total{reason="llm_shed"}' in metrics
+    assert 'supportmodel_llm_queue_wait_seconds_count{priority="interactive",outcome="timeout"}' in metrics
+
+
+def check_async_job_priority_and_fallback():
+    import tempfile
+
+    import app as app_module
+    from support_models.job_queue import JobQueue, JobWorkers
+
+    seen = []
+    original = app_module._build_update_payload
+
+    def _shed_build(data, progress=None):
+        seen.append(current_priority())
+        if "拥塞" in data["task_description"]:
+            app_module._record_fallback("llm_shed")
+        return {"model_name": data["model_name"], "task_description": data["task_description"]}
+
+    queue = JobQueue(os.path.join(tempfile.mkdtemp(prefix="admission-jobs-"), "jobs.sqlite3"))
+    workers = JobWorkers(queue, app_module._run_update_job)
+    app_module._build_update_payload = _shed_build
+    try:
+        for task in ("拥塞时提交的任务", "正常任务"):
+            request = {"model_name": "越野物流", "task_description": task}
+            job_id, _ = queue.submit(request)
+            workers.run_one(job_id, request)
+            job = queue.get(job_id)
+            assert job["status"] == "done" and job["result"]["task_description"] == task, job
+            if task == "正常任务":
+                assert job["error"] is None and queue.submit(request) == (job_id, True)
+            else:
+                # 降级结果照常返回，但重新提交会另起任务
+                assert job["error"] == "fallback: llm_shed", job
+                assert queue.submit(request)[0] != job_id
+    finally:
+        app_module._build_update_payload = original
+    assert seen == ["batch", "batch"], seen
+    assert app_module._job_fallbacks.get() is None
+
+
+if __name__ == "__main__":
+    check_interactive_first()
+    check_batch_leaves_reserved_slot()
+    check_token_bucket()
+    check_early_shed()
+    check_queue_timeout()
+    check_update_sheds_to_rule_blueprint()
+    check_async_job_priority_and_fallback()
+    print("admission checks passed")
@@ -0,0 +1,117 @@
+"""
+批量接口检查：相同条目去重（精简 / 增量字段参与去重）、单条超时、超时参数校验，
+以及批量结果使用独立的会话存储、不挤掉交互会话。
+
+用法：
+    python test/batch.py
+"""
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+
+import app as app_module  # noqa: E402
+from support_models.blueprint_store import batch_blueprint_store, blueprint_store  # noqa: E402
+
+client = app_module.app.test_client()
+TASK = "向位置X（190,100）运输2车冷链物资，要求2小时内送达。"
+
+
+class _CountingBuild:
+    """替换 _build_update_payload：统计调用次数，任务描述含"慢"时先休眠。"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._original = app_module._build_update_payload
+
+    def __call__(self, data, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if "慢" in (data.get("task_description") or ""):
+            time.sleep(self.delay)
+        return self._original(data, *args, **kwargs)
+
+    def __enter__(self):
+        app_module._build_update_payload = self
+        return self
+
+    def __exit__(self, *exc):
+        app_module._build_update_payload = self._original
+
+
+def _batch(body):
+    response = client.post("/api/update/batch", json=body)
+    return response.status_code, response.get_json()
+
+
+def check_dedup():
+    base_id = client.post("/api/update", json={"model_name": "越野物流", "task_description": TASK}).get_json()["blueprint_id"]
+    edited = TASK.replace("2小时", "3小时")
+    items = [
+        {"model_name": "越野物流", "task_description": edited},
+        {"model_name": "越野物流", "task_description": f"  {edited} "},
+        {"model_name": "越野物流", "task_description": edited, "lean": True},
+        {"model_name": "越野物流", "task_description": edited, "base_blueprint_id": base_id},
+    ]
+    with _CountingBuild() as build:
+        status, data = _batch({"items": items})
+    assert status == 200 and build.calls == 3, (status, build.calls)
+    results = [r["result"] for r in data["results"]]
+    assert [r["index"] for r in data["results"]] == [0, 1, 2, 3]
+    assert results[0] == results[1] and "node_insights" in results[0]
+    assert "node_insights" not in results[2] and "graph_node_ids" in results[2]
+    assert results[3].get("base_blueprint_id") == base_id and "patch" in results[3], results[3].keys()
+
+
+def check_item_timeout():
+    items = [
+        {"model_name": "越野物流", "task_description": "慢：" + TASK},
+        {"model_name": "越野物流", "task_description": TASK},
+    ]
+    with _CountingBuild(delay=1.0):
+        started = time.monotonic()
+        status, data = _batch({"items": items, "timeout": 0.3})
+        elapsed = time.monotonic() - started
+    assert status == 200 and elapsed < 0.9, (status, elapsed)
+    by_index = {r["index"]: r for r in data["results"]}
+    assert by_index[0]["status"] == "timeout" and by_index[1]["status"] == "ok", data
+
+
+def check_timeout_validation():
+    for timeout in (0, -5, "abc", float("nan")):
+        status, data = _batch({"items": [{"task_description": TASK}], "timeout": timeout})
+        assert status == 400 and "timeout" in data["error"], (timeout, status, data)
+
+
+def check_separate_store():
+    session = client.post("/api/update", json={"model_name": "越野物流", "task_description": "交互会话任务"}).get_json()
+    entries = blueprint_store.stats()["entries"]
+    items = [{"model_name": "越野物流", "task_description": f"批量任务{i}：{TASK}"} for i in range(20)]
+    status, data = _batch(items)
+    assert status == 200 and all(r["status"] == "ok" for r in data["results"])
+    assert blueprint_store.stats()["entries"] == entries
+    assert batch_blueprint_store.stats()["entries"] >= 20
+
+    # 交互会话与批量结果的 blueprint_id 都能用于 /api/node_insight
+    for payload in (session, data["results"][0]["result"]):
+        hits = blueprint_store.stats()["hits"] + batch_blueprint_store.stats()["hits"]
+        body = {"model_name": "越野物流", "node_id": payload["default_node_id"], "blueprint_id": payload["blueprint_id"]}
+        assert client.post("/api/node_insight", json=body).get_json() == payload["insight"]
+        assert blueprint_store.stats()["hits"] + batch_blueprint_store.stats()["hits"] == hits + 1
+
+
+if __name__ == "__main__":
+    check_dedup()
+    check_item_timeout()
+    check_timeout_validation()
+    check_separate_store()
+    print("batch checks passed")
@@ -0,0 +1,82 @@
+"""
+会话蓝图存储检查：内容哈希 id、LRU 淘汰、TTL 过期，以及 /api/node_insight 按 blueprint_id 查表。
+
+用法：
+    python test/blueprint_store.py
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+
+from support_models.blueprint_store import BlueprintStore, blueprint_id  # noqa: E402
+
+
+def _blueprint(name):
+    return {"default_focus": "root", "behavior_tree": {"id": "root", "name": name}, "node_insights": {}}
+
+
+def check_content_id():
+    a = {"x": 1, "y": {"b": 2, "a": 1}}
+    b = {"y": {"a": 1, "b": 2}, "x": 1}
+    assert blueprint_id(a) == blueprint_id(b) and len(blueprint_id(a)) == 32
+    assert blueprint_id(a) != blueprint_id(dict(a, x=2))
+
+
+def check_lru():
+    store = BlueprintStore(max_entries=2)
+    first, second = store.put(_blueprint("一")), store.put(_blueprint("二"))
+    assert store.get(first) is not None  # first 变为最近使用
+    third = store.put(_blueprint("三"))
+    assert store.get(second) is None
+    assert store.get(first) is not None and store.get(third) is not None
+    # 重复写入相同内容不新增条目
+    assert store.put(_blueprint("三")) == third
+    stats = store.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1 and stats["stores"] == 4, stats
+
+
+def check_ttl():
+    store = BlueprintStore(ttl=0.05)
+    key = store.put(_blueprint("一"))
+    assert store.get(key) is not None
+    time.sleep(0.1)
+    assert store.get(key) is None
+    stats = store.stats()
+    assert stats["expired"] == 1 and stats["entries"] == 0, stats
+    # 再次写入会刷新过期时间
+    store.put(_blueprint("一"))
+    assert store.get(key) is not None
+
+
+def check_node_insight_lookup():
+    from app import app
+    from support_models.blueprint_store import blueprint_store
+
+    client = app.test_client()
+    update = client.post("/api/update", json={"model_name": "越野物流", "task_description": "向位置X运输2车燃油"}).get_json()
+    node_id = update["default_node_id"]
+    body = {"model_name": "越野物流", "node_id": node_id, "blueprint_id": update["blueprint_id"]}
+    before = blueprint_store.stats()["hits"]
+    insight = client.post("/api/node_insight", json=body).get_json()
+    assert blueprint_store.stats()["hits"] == before + 1
+    assert insight == update["insight"], insight
+
+    # 条目被淘汰后按任务描述回退，仍返回洞察
+    blueprint_store.clear()
+    fallback = client.post("/api/node_insight", json=dict(body, task_description="向位置X运输2车燃油"))
+    assert fallback.status_code == 200 and fallback.get_json()
+
+
+if __name__ == "__main__":
+    check_content_id()
+    check_lru()
+    check_ttl()
+    check_node_insight_lookup()
+    print("blueprint store checks passed")
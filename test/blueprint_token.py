@@ -0,0 +1,108 @@
+"""
+蓝图令牌检查：编解码往返、篡改与错误密钥、过期、解压超限，以及其他主机凭令牌回答 /api/node_insight。
+
+用法：
+    python test/blueprint_token.py
+"""
+import os
+import sys
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+
+from support_models.blueprint_token import (  # noqa: E402
+    InvalidBlueprintToken,
+    _b64encode,
+    _sign,
+    decode_token,
+    encode_token,
+)
+
+KEY = b"check-key"
+BLUEPRINT = {
+    "default_focus": "root",
+    "behavior_tree": {"id": "root", "name": "向位置X运输", "children": [{"id": "n1", "name": "路线规划"}]},
+    "node_insights": {"n1": {"title": "路线规划", "content": "优先选择硬质路面。"}},
+}
+
+
+def _signed(payload: bytes) -> str:
+    body = f"v1.{_b64encode(zlib.compress(payload))}"
+    return f"{body}.{_b64encode(_sign(KEY, body.encode('ascii')))}"
+
+
+def _rejected(token, key=KEY, reason=""):
+    try:
+        decode_token(token, key)
+    except InvalidBlueprintToken as e:
+        assert reason in str(e), (reason, str(e))
+    else:
+        raise AssertionError(f"令牌应被拒绝: {reason or token[:40]}")
+
+
+def check_roundtrip():
+    token = encode_token(BLUEPRINT, KEY)
+    assert token.startswith("v1.") and token.count(".") == 2
+    assert decode_token(token, KEY) == BLUEPRINT
+
+
+def check_tamper():
+    token = encode_token(BLUEPRINT, KEY)
+    version, data, signature = token.split(".")
+    other = encode_token(dict(BLUEPRINT, default_focus="n1"), KEY).split(".")[1]
+    _rejected(f"{version}.{other}.{signature}", reason="签名")
+    _rejected(f"{version}.{data}.{signature[:-2]}AA", reason="签名")
+    _rejected(token, key=b"other-key", reason="签名")
+    _rejected(f"v2.{data}.{signature}", reason="版本")
+    _rejected("v1.only-two", reason="格式")
+    _rejected(None, reason="格式")
+    # 签名有效但内容不是蓝图
+    _rejected(_signed(b"[1, 2]"), reason="不是蓝图")
+    _rejected(_signed(b"not json"), reason="解码失败")
+
+
+def check_expiry():
+    _rejected(encode_token(BLUEPRINT, KEY, ttl=-1), reason="过期")
+    assert decode_token(encode_token(BLUEPRINT, KEY, ttl=60), KEY) == BLUEPRINT
+
+
+def check_oversized():
+    # 签名有效的压缩炸弹：解压超过 8 MiB 上限即拒绝，不会完整展开
+    payload = b'{"exp": 9999999999, "bp": {"pad": "' + b"0" * (16 * 1024 * 1024) + b'"}}'
+    token = _signed(payload)
+    assert len(token) < 64 * 1024, len(token)
+    _rejected(token, reason="长度上限")
+
+
+def check_node_insight_from_token():
+    os.environ["BLUEPRINT_TOKEN_KEY"] = KEY.decode()
+    from app import app
+    from support_models.blueprint_store import blueprint_store
+
+    client = app.test_client()
+    update = client.post("/api/update", json={"model_name": "越野物流", "task_description": "向位置X运输2车燃油"}).get_json()
+    assert decode_token(update["blueprint_token"], KEY)["behavior_tree"] == update["behavior_tree"]
+
+    # 模拟请求落到没有该会话的主机
+    blueprint_store.clear()
+    body = {"model_name": "越野物流", "node_id": update["default_node_id"], "blueprint_token": update["blueprint_token"]}
+    insight = client.post("/api/node_insight", json=body).get_json()
+    assert insight == update["insight"], insight
+    # 无效令牌按未命中处理，回退到默认洞察而不是报错
+    tampered = client.post("/api/node_insight", json=dict(body, blueprint_token=body["blueprint_token"] + "x"))
+    assert tampered.status_code == 200
+    os.environ.pop("BLUEPRINT_TOKEN_KEY")
+
+
+if __name__ == "__main__":
+    check_roundtrip()
+    check_tamper()
+    check_expiry()
+    check_oversized()
+    check_node_insight_from_token()
+    print("blueprint token checks passed")
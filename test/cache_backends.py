@@ -0,0 +1,167 @@
+"""
+共享缓存后端检查：三种后端的读写、TTL、前缀统计与清理，memory / sqlite 的容量淘汰，
+多个 SQLite 连接共享同一文件、多线程写入计数准确、未实现全部方法的后端无法构造，
+以及蓝图 / 分类 / 场景匹配三层经由 Redis 协议后端（本地替身）读写。
+
+用法：
+    python test/cache_backends.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from fake_redis import FakeRedis, redis_url, start_server  # noqa: E402
+from support_models.cache_backends import (  # noqa: E402
+    CacheBackend,
+    CacheError,
+    Codec,
+    MemoryBackend,
+    RedisBackend,
+    SharedCache,
+    SQLiteBackend,
+    get_shared_cache,
+)
+
+_TMP = tempfile.mkdtemp(prefix="cache-check-")
+
+
+def _backends():
+    server = start_server(FakeRedis(password="secret"))
+    yield MemoryBackend()
+    yield SQLiteBackend(os.path.join(_TMP, "roundtrip.sqlite3"))
+    yield RedisBackend(redis_url(server, db=2, password="secret"))
+    server.shutdown()
+
+
+def check_codec():
+    codec = Codec(compress_min_bytes=64)
+    small = {"model_name": "越野物流"}
+    large = {"node_insights": {f"n{i}": "路线评估与风险研判" * 8 for i in range(50)}}
+    assert codec.encode(small)[:1] == b"j" and codec.decode(codec.encode(small)) == small
+    encoded = codec.encode(large)
+    assert encoded[:1] == b"z" and len(encoded) < len(Codec(compress_min_bytes=10**9).encode(large)) / 4, len(encoded)
+    assert codec.decode(encoded) == large
+
+
+def check_roundtrip_ttl_and_prefix():
+    for backend in _backends():
+        cache = SharedCache(backend, Codec(compress_min_bytes=16), prefix="check")
+        cache.clear()
+        value = {"id": "scene-1", "score": 0.5, "text": "长文本" * 40}
+        cache.set("scenario", "a", value)
+        cache.set("scenario", "b", value, ttl=0.05)
+        cache.set("blueprint", "a", value)
+        assert cache.get("scenario", "a") == value, backend.name
+        assert cache.get("scenario", "missing") is None, backend.name
+        assert cache.count("scenario") == 2, backend.name
+        time.sleep(0.1)
+        assert cache.get("scenario", "b") is None, backend.name
+        assert cache.count("scenario") == 1, backend.name
+        cache.delete("scenario", "a")
+        assert cache.get("scenario", "a") is None, backend.name
+        assert cache.count("blueprint") == 1 and cache.clear() >= 1 and cache.count("blueprint") == 0, backend.name
+
+
+def check_size_eviction():
+    memory = MemoryBackend(max_bytes=1000)
+    for i in range(20):
+        memory.set(f"k{i}", b"x" * 100)
+        memory.get("k0")  # 保持最近使用
+    assert memory.get("k0") is not None and memory.get("k1") is None and memory.count() <= 10
+
+    sqlite = SQLiteBackend(os.path.join(_TMP, "evict.sqlite3"), max_bytes=10_000)
+    for i in range(200):
+        sqlite.set(f"k{i}", b"x" * 100)
+    sqlite.evict()
+    assert sqlite.count() <= 100 and sqlite.get("k199") is not None and sqlite.get("k0") is None, sqlite.count()
+
+
+def check_sqlite_shared_between_connections():
+    path = os.path.join(_TMP, "shared.sqlite3")
+    writer, reader = SQLiteBackend(path), SQLiteBackend(path)
+    writer.set("k", b"jvalue")
+    assert reader.get("k") == b"jvalue"
+
+
+def check_sqlite_concurrent_writes():
+    backend = SQLiteBackend(os.path.join(_TMP, "threads.sqlite3"))
+
+    def _write(worker):
+        for index in range(50):
+            backend.set(f"t{worker}-{index}", b"jvalue")
+
+    threads = [threading.Thread(target=_write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend._writes == 400 and backend.count() == 400, backend._writes
+
+
+def check_incomplete_backend_rejected():
+    class _GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    try:
+        _GetOnly()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("未实现全部方法的后端应在构造时报错")
+
+
+def check_redis_unavailable():
+    backend = RedisBackend("redis://127.0.0.1:1/0", timeout=0.2)
+    for _ in range(2):
+        try:
+            backend.get("k")
+        except CacheError:
+            pass
+        else:
+            raise AssertionError("连接失败应抛出 CacheError")
+
+
+def check_layers_use_redis():
+    server = start_server(FakeRedis())
+    os.environ.update({
+        "CACHE_BACKEND": "redis",
+        "CACHE_REDIS_URL": redis_url(server),
+        "BLUEPRINT_CACHE": "1",
+    })
+    from support_models.blueprint_cache import get_blueprint_cache
+    from support_models.scenarios import SCENARIOS, find_best_scenario
+
+    shared = get_shared_cache()
+    assert isinstance(shared.backend, RedisBackend)
+    shared.clear()
+
+    scenario = SCENARIOS[0]
+    first = find_best_scenario(scenario.model_name, scenario.example_input + "（复核）")
+    second = find_best_scenario(scenario.model_name, scenario.example_input + "（复核）")
+    assert first == second and shared.count("scenario") == 1
+
+    cache = get_blueprint_cache()
+    cache.put_blueprint(scenario.model_name, " 任务 ", scenario.example_output or {"behavior_tree": {}})
+    cache.put_classification("任务", scenario.model_name, "测试")
+    assert cache.has_blueprint(scenario.model_name, "任务") and cache.count() == 1
+    assert cache.get_classification(" 任务") == (scenario.model_name, "测试")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    check_codec()
+    check_roundtrip_ttl_and_prefix()
+    check_size_eviction()
+    check_sqlite_shared_between_connections()
+    check_sqlite_concurrent_writes()
+    check_incomplete_backend_rejected()
+    check_redis_unavailable()
+    check_layers_use_redis()
+    print("cache backend checks passed")
@@ -0,0 +1,150 @@
+"""
+大模型录制 / 回放检查：经替身客户端录制后在断网状态下回放（内容、finish_reason 与 token 用量一致）、
+回放缺失时抛出 CassetteMiss 并计入指标，以及 LLM_CASSETTE_LATENCY=zero 与按录制耗时等待。
+
+用法：
+    python test/cassette.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="cassette-check-")
+os.environ.update({"LOG_LEVEL": "ERROR", "BLUEPRINT_CACHE": "0", "LLM_CASSETTE_PATH": os.path.join(_TMP, "llm.jsonl")})
+for name in ("LLM_CASSETTE", "LLM_CASSETTE_LATENCY", "BASE_URL", "API_KEY"):
+    os.environ.pop(name, None)
+
+from support_models import llm_client  # noqa: E402
+from support_models.cassette import CassetteMiss, get_cassette, request_key  # noqa: E402
+from support_models.llm_client import _chat, classify_model_with_llm  # noqa: E402
+from support_models.metrics import render_metrics  # noqa: E402
+
+RECORDED_LATENCY = 0.3
+TASK = "转运3名重伤员至后方医院，途中需持续监护。"
+
+
+class _StubClient:
+    """替身客户端：固定延迟后返回 OpenAI 风格的响应，统计调用次数。"""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        time.sleep(RECORDED_LATENCY)
+        text = kwargs["messages"][-1]["content"]
+        content = json.dumps({"model_name": "伤员救助", "reason": "伤员"}, ensure_ascii=False) if "伤员" in text else "普通回复"
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=len(text), completion_tokens=len(content)),
+        )
+
+
+class _Offline:
+    """回放阶段的客户端：任何网络调用都视为失败。"""
+
+    @property
+    def chat(self):
+        raise AssertionError("回放模式不应发起网络请求")
+
+
+def _cassette_events(result):
+    for line in render_metrics().splitlines():
+        if line.startswith(f'supportmodel_cache_events_total{{cache="cassette",result="{result}"}}'):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def _use(mode, latency=None):
+    os.environ["LLM_CASSETTE"] = mode
+    if latency is None:
+        os.environ.pop("LLM_CASSETTE_LATENCY", None)
+    else:
+        os.environ["LLM_CASSETTE_LATENCY"] = latency
+
+
+MESSAGES = [{"role": "system", "content": "你是测试助手"}, {"role": "user", "content": "随便说点什么"}]
+
+
+def check_record():
+    stub = _StubClient()
+    llm_client._client = stub
+    _use("record")
+    completion = _chat("classify", MESSAGES)
+    classified = classify_model_with_llm(TASK)
+    assert stub.calls == 2 and completion.content == "普通回复" and classified.model_name == "伤员救助"
+
+    with open(os.environ["LLM_CASSETTE_PATH"], encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert len(entries) == 2 and all(entry["stage"] == "classify" for entry in entries)
+    first = entries[0]
+    assert first["key"] == request_key(first["model"], MESSAGES) and first["content"] == "普通回复"
+    assert first["usage"] == {"prompt_tokens": len("随便说点什么"), "completion_tokens": len("普通回复")}
+    assert first["latency"] >= RECORDED_LATENCY and "随便说点什么" not in json.dumps(first, ensure_ascii=False)
+
+
+def check_replay_offline():
+    llm_client._client = _Offline()
+    _use("replay", "zero")
+    hits = _cassette_events("hit")
+    started = time.perf_counter()
+    completion = _chat("classify", MESSAGES)
+    classified = classify_model_with_llm(TASK)
+    elapsed = time.perf_counter() - started
+    assert completion.content == "普通回复" and completion.finish_reason == "stop"
+    assert completion.prompt_tokens == len("随便说点什么") and classified.model_name == "伤员救助"
+    assert elapsed < RECORDED_LATENCY, elapsed
+    assert _cassette_events("hit") == hits + 2
+
+    # 缺省按录制耗时等待
+    _use("replay")
+    started = time.perf_counter()
+    _chat("classify", MESSAGES)
+    assert time.perf_counter() - started >= RECORDED_LATENCY
+
+
+def check_replay_miss():
+    llm_client._client = _Offline()
+    _use("replay", "zero")
+    misses = _cassette_events("miss")
+    try:
+        _chat("classify", MESSAGES + [{"role": "user", "content": "没有录制过的追问"}])
+    except CassetteMiss:
+        pass
+    else:
+        raise AssertionError("未录制的请求应抛出 CassetteMiss")
+    assert _cassette_events("miss") == misses + 1
+    # 与调用失败一样向上抛出，由上层按回退路径处理，仍不发起网络请求
+    try:
+        classify_model_with_llm("完全不同的任务描述")
+    except CassetteMiss:
+        pass
+    else:
+        raise AssertionError("未录制的分类请求应抛出 CassetteMiss")
+    assert _cassette_events("miss") == misses + 2
+
+
+def check_modes_from_env():
+    _use("off")
+    assert get_cassette() is None
+    _use("replay", "bogus")
+    assert get_cassette().latency == "recorded"
+    os.environ.pop("LLM_CASSETTE")
+
+
+if __name__ == "__main__":
+    try:
+        check_record()
+        check_replay_offline()
+        check_replay_miss()
+        check_modes_from_env()
+    finally:
+        llm_client._client = None
+    print("cassette checks passed")
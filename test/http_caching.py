@@ -0,0 +1,170 @@
+"""
+HTTP 条件缓存检查：/api/models 与静态蓝图 /api/update 的 ETag、Cache-Control 与 304（重新验证不构建响应体），
+增量请求与签名令牌响应不带校验器，以及只有预置内容（空任务、example_output）进入预压缩缓存。
+
+用法：
+    python test/http_caching.py
+"""
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+os.environ.pop("BLUEPRINT_TOKEN_KEY", None)
+os.environ["BLUEPRINT_CACHE"] = "0"
+os.environ["WARMUP"] = "0"
+
+import app as app_module  # noqa: E402
+from app import app  # noqa: E402
+from support_models.compression import precompressed_cache  # noqa: E402
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+TASK = "向位置X（190,100）运输2车冷链物资，要求3小时内送达。"
+
+
+def check_models_etag():
+    client = app.test_client()
+    first = client.get("/api/models")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('"') and not etag.startswith("W/"), etag
+    assert "no-cache" in first.headers["Cache-Control"]
+
+    again = client.get("/api/models")
+    assert again.headers["ETag"] == etag and again.data == first.data
+
+    cached = client.get("/api/models", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.data == b""
+    assert cached.headers["ETag"] == etag
+
+    stale = client.get("/api/models", headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200 and stale.data == first.data
+
+
+def check_static_update_etag():
+    client = app.test_client()
+    for model_name in ("越野物流", "伤员救助"):
+        body = {"model_name": model_name, "task_description": TASK}
+        first = client.post("/api/update", json=body)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert "no-cache" in first.headers["Cache-Control"]
+
+        cached = client.post("/api/update", json=body, headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.data == b"", model_name
+
+        other = client.post(
+            "/api/update",
+            json={"model_name": model_name, "task_description": TASK + "夜间行动。"},
+            headers={"If-None-Match": etag},
+        )
+        assert other.status_code == 200 and other.headers["ETag"] != etag
+
+
+def check_revalidation_skips_build():
+    client = app.test_client()
+    body = {"model_name": "越野物流", "task_description": TASK + "（重新验证）"}
+    etag = client.post("/api/update", json=body).headers["ETag"]
+    lean_etag = client.post("/api/update", json=dict(body, lean=True)).headers["ETag"]
+    assert lean_etag != etag
+
+    original = app_module._build_update_payload
+    calls = []
+    app_module._build_update_payload = lambda data, *args, **kwargs: calls.append(data) or original(data, *args, **kwargs)
+    try:
+        cached = client.post("/api/update", json=body, headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.headers["Cache-Control"] == "private, no-cache"
+        assert calls == [], calls
+        # 精简与完整响应的校验器互不通用
+        assert client.post("/api/update", json=dict(body, lean=True), headers={"If-None-Match": etag}).status_code == 200
+        assert len(calls) == 1
+    finally:
+        app_module._build_update_payload = original
+
+
+def check_patch_and_token_responses_not_validated():
+    client = app.test_client()
+    body = {"model_name": "越野物流", "task_description": TASK}
+    first = client.post("/api/update", json=body)
+    etag = first.headers["ETag"]
+
+    # 补丁还是完整内容取决于会话存储是否仍有 base 蓝图，不带校验器
+    incremental = dict(body, task_description=TASK + "夜间行动。", base_blueprint_id=first.get_json()["blueprint_id"])
+    for extra in ({}, {"If-None-Match": etag}):
+        response = client.post("/api/update", json=incremental, headers=extra)
+        assert response.status_code == 200 and "ETag" not in response.headers
+        assert response.headers["Cache-Control"] == "no-store"
+
+    # 签名令牌带过期时间，304 会让客户端一直持有过期令牌
+    os.environ["BLUEPRINT_TOKEN_KEY"] = "http-caching-check"
+    try:
+        response = client.post("/api/update", json=body, headers={"If-None-Match": etag})
+        assert response.status_code == 200 and "blueprint_token" in response.get_json()
+        assert "ETag" not in response.headers and response.headers["Cache-Control"] == "no-store"
+    finally:
+        os.environ.pop("BLUEPRINT_TOKEN_KEY")
+
+
+def check_compressed_variant_etag():
+    client = app.test_client()
+    body = {"model_name": "人员输送", "task_description": TASK}
+    plain = client.post("/api/update", json=body, headers={"Accept-Encoding": "identity"})
+    gzipped = client.post("/api/update", json=body, headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gzipped.data) == plain.data
+    # 压缩表示使用独立的强 ETag，回传后同样命中 304
+    assert gzipped.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    cached = client.post(
+        "/api/update",
+        json=body,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["ETag"]},
+    )
+    assert cached.status_code == 304 and cached.headers["ETag"] == gzipped.headers["ETag"]
+
+
+def check_only_canned_updates_precompressed():
+    client = app.test_client()
+    scenario = next(s for s in SCENARIOS if s.example_output)
+    canned = [
+        {"model_name": "越野物流", "task_description": ""},
+        {"model_name": scenario.model_name, "task_description": scenario.example_input},
+    ]
+    for body in canned:
+        before = precompressed_cache.stats()
+        client.post("/api/update", json=body, headers={"Accept-Encoding": "gzip"})
+        after = precompressed_cache.stats()
+        assert after["hits"] + after["misses"] == before["hits"] + before["misses"] + 1, body
+
+    # 规则生成的普通任务：仍带 ETag，但不进入预压缩缓存
+    before = precompressed_cache.stats()
+    response = client.post(
+        "/api/update",
+        json={"model_name": "越野物流", "task_description": TASK + "（不会重复的任务）"},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.headers["Content-Encoding"] == "gzip" and "ETag" in response.headers
+    assert precompressed_cache.stats() == before
+
+
+def check_llm_update_not_cached():
+    os.environ["USE_LLM_BLUEPRINT"] = "1"
+    try:
+        # 自动分类结果不确定：不带校验器，且禁止缓存
+        response = app.test_client().post("/api/update", json={"task_description": TASK})
+        assert "ETag" not in response.headers
+        assert response.headers["Cache-Control"] == "no-store"
+    finally:
+        os.environ.pop("USE_LLM_BLUEPRINT", None)
+
+
+if __name__ == "__main__":
+    check_models_etag()
+    check_static_update_etag()
+    check_revalidation_skips_build()
+    check_patch_and_token_responses_not_validated()
+    check_compressed_variant_etag()
+    check_only_canned_updates_precompressed()
+    check_llm_update_not_cached()
+    print("http caching checks passed")
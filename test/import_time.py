@@ -0,0 +1,65 @@
+"""
+启动耗时检查：`import app` 不应加载 openai 与场景库，且导入耗时在预算内。
+
+在子进程中以 `python -X importtime` 导入 app，取多次运行的中位数与预算比较。
+预算可用 IMPORT_TIME_BUDGET_MS 调整（缺省 400 ms，约为加载 openai 前的一半）。
+
+用法：
+    python test/import_time.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 400))
+RUNS = 5
+
+# 只在首次使用时才允许加载的重量级模块
+DEFERRED_MODULES = ("openai", "support_models.scenes.off_road_logistics")
+
+
+def _import_app(*args):
+    env = dict(os.environ)
+    env.pop("USE_LLM_BLUEPRINT", None)
+    # 只度量导入本身；启动预热（support_models/warmup.py）有自己的逐项耗时报告
+    env["WARMUP"] = "0"
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _cumulative_ms(stderr, module):
+    """解析 -X importtime 输出中某个模块的累计耗时（微秒列 → 毫秒）。"""
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if name == module:
+            return int(cumulative_us) / 1000
+    raise AssertionError(f"importtime 输出中没有 {module}")
+
+
+def check_heavy_modules_deferred():
+    probe = "import sys, app; print(','.join(m for m in %r if m in sys.modules))" % (DEFERRED_MODULES,)
+    loaded = _import_app("-c", probe).stdout.strip()
+    assert not loaded, f"import app 时已加载: {loaded}"
+
+
+def check_import_budget():
+    timings = [_cumulative_ms(_import_app("-X", "importtime", "-c", "import app").stderr, "app") for _ in range(RUNS)]
+    median = statistics.median(timings)
+    print(f"import app: median {median:.1f} ms (runs: {', '.join(f'{t:.1f}' for t in timings)}; budget {BUDGET_MS:.0f} ms)")
+    assert median <= BUDGET_MS, f"import app 耗时 {median:.1f} ms 超出预算 {BUDGET_MS:.0f} ms"
+
+
+if __name__ == "__main__":
+    check_heavy_modules_deferred()
+    check_import_budget()
+    print("import time checks passed")
@@ -0,0 +1,151 @@
+"""
+异步任务队列检查：去重键覆盖完整请求、结果复用与过期、租约过期后重新领取、
+最大执行次数、写回结果失败时工作线程继续运行，以及进程启动时自动接手队列中遗留的任务。
+
+用法：
+    python test/job_queue.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="jobs-check-")
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ["JOB_QUEUE_PATH"] = os.path.join(_TMP, "app-jobs.sqlite3")
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+
+from support_models.job_queue import JobQueue, JobWorkers, request_key  # noqa: E402
+
+REQUEST = {"model_name": "越野物流", "task_description": "向位置X运输2车燃油"}
+
+
+def _queue(name, **kwargs):
+    return JobQueue(os.path.join(_TMP, f"{name}.sqlite3"), **kwargs)
+
+
+def check_request_key():
+    key = request_key(REQUEST)
+    assert request_key(dict(REQUEST, task_description=" 向位置X运输2车燃油 ", lean=False)) == key
+    assert request_key(dict(REQUEST, base_blueprint_id=None)) == key
+    assert request_key(dict(REQUEST, lean=True)) != key
+    assert request_key(dict(REQUEST, base_blueprint_id="abc")) != key
+    assert request_key(dict(REQUEST, model_name=None)) != key
+
+
+def check_reuse_and_expiry():
+    queue = _queue("reuse", result_ttl=0.2)
+    job_id, reused = queue.submit(REQUEST)
+    assert not reused
+    # 排队中的相同请求合并，形态不同的请求另起任务
+    assert queue.submit(dict(REQUEST, task_description=REQUEST["task_description"] + " ")) == (job_id, True)
+    lean_id, reused = queue.submit(dict(REQUEST, lean=True))
+    assert lean_id != job_id and not reused
+
+    claimed_id, data = queue.claim()
+    assert claimed_id == job_id and data == REQUEST
+    queue.complete(job_id, {"ok": True})
+    assert queue.submit(REQUEST) == (job_id, True)
+    assert queue.get(job_id)["result"] == {"ok": True}
+
+    time.sleep(0.3)
+    assert queue.get(job_id) is None
+    new_id, reused = queue.submit(REQUEST)
+    assert new_id != job_id and not reused
+    assert queue.purge_expired() == 1
+
+
+def check_lease_expiry_and_max_attempts():
+    queue = _queue("lease", lease=0.1, max_attempts=2)
+    job_id, _ = queue.submit(REQUEST)
+    assert queue.claim()[0] == job_id
+    assert queue.claim() is None  # 租约有效期内不会被重复领取
+
+    time.sleep(0.15)
+    assert queue.claim()[0] == job_id  # 模拟工作进程崩溃后重新领取
+    assert queue.get(job_id)["attempts"] == 2 and queue.pending() == 1
+
+    time.sleep(0.15)
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and "2 次" in job["error"], job
+    assert queue.pending() == 0
+    # 失败的任务不复用，重新提交会新建任务
+    assert queue.submit(REQUEST)[0] != job_id
+
+
+def check_pending_does_not_create_file():
+    queue = _queue("missing")
+    assert queue.pending() == 0 and not os.path.exists(queue.path)
+
+
+def check_worker_failure():
+    queue = _queue("worker")
+    job_id, _ = queue.submit(REQUEST)
+
+    def _handler(data, progress):
+        progress("classify")
+        raise RuntimeError("生成失败")
+
+    JobWorkers(queue, _handler).run_one(*queue.claim())
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["error"] == "生成失败" and job["stage"] == "classify", job
+
+
+class _LockedOnce(JobQueue):
+    """第一次写回结果时模拟 database is locked。"""
+
+    locked = True
+
+    def complete(self, job_id, result, degraded=None):
+        if self.locked:
+            self.locked = False
+            raise sqlite3.OperationalError("database is locked")
+        super().complete(job_id, result, degraded)
+
+
+def check_worker_survives_write_failure():
+    queue = _LockedOnce(os.path.join(_TMP, "locked.sqlite3"), lease=0.3)
+    workers = JobWorkers(queue, lambda data, progress: ({"ok": data["task_description"]}, None), workers=1, poll_interval=0.05)
+    first, _ = queue.submit(REQUEST)
+    workers.start()
+
+    deadline = time.monotonic() + 5
+    while queue.get(first)["status"] != "done":  # 同一线程在租约过期后重新领取并完成
+        assert time.monotonic() < deadline, queue.get(first)
+        time.sleep(0.05)
+    second, _ = queue.submit(dict(REQUEST, task_description="第二个任务"))
+    workers.notify()
+    while queue.get(second)["status"] != "done":
+        assert time.monotonic() < deadline, queue.get(second)
+        time.sleep(0.05)
+    assert queue.get(first)["attempts"] == 2
+
+
+def check_resume_on_startup():
+    queue = JobQueue(os.environ["JOB_QUEUE_PATH"])
+    job_id, _ = queue.submit(REQUEST)
+
+    import app  # noqa: F401  启动时发现遗留任务并启动工作线程
+
+    deadline = time.monotonic() + 10
+    while queue.get(job_id)["status"] != "done":
+        assert time.monotonic() < deadline, queue.get(job_id)
+        time.sleep(0.05)
+    assert queue.get(job_id)["result"]["model_name"] == REQUEST["model_name"]
+
+
+if __name__ == "__main__":
+    check_request_key()
+    check_reuse_and_expiry()
+    check_lease_expiry_and_max_attempts()
+    check_pending_does_not_create_file()
+    check_worker_failure()
+    check_worker_survives_write_failure()
+    check_resume_on_startup()
+    print("job queue checks passed")
@@ -0,0 +1,130 @@
+"""
+蓝图增量补丁检查：diff / apply_patch 往返（节点增删、移动、字段修改、id 重复时整体替换），
+以及 /api/update 携带 base_blueprint_id 时返回的补丁能还原出完整行为树。
+
+用法：
+    python test/json_patch.py
+"""
+import copy
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+
+from support_models.json_patch import apply_patch, diff  # noqa: E402
+
+
+def _node(node_id, name, children=None):
+    node = {"id": node_id, "name": name}
+    if children is not None:
+        node["children"] = children
+    return node
+
+
+OLD = {
+    "default_focus": "root",
+    "behavior_tree": _node("root", "运输任务", [
+        _node("a", "路线规划", [_node("a1", "侦察"), _node("a2", "选线")]),
+        _node("b", "装载"),
+        _node("c", "交付"),
+        _node("d/e~f", "特殊字符 id"),
+    ]),
+    "node_insights": {"a": {"title": "路线规划"}, "b": {"title": "装载"}},
+}
+
+
+def _roundtrip(old, new):
+    snapshot = copy.deepcopy(old)
+    patch = diff(old, new)
+    assert apply_patch(old, patch) == new, patch
+    assert old == snapshot, "diff / apply_patch 不应修改输入"
+    return patch
+
+
+def check_identical():
+    assert diff(OLD, copy.deepcopy(OLD)) == []
+
+
+def check_tree_edits():
+    new = copy.deepcopy(OLD)
+    children = new["behavior_tree"]["children"]
+    children[0]["children"][1]["name"] = "选线（避开沼泽）"
+    children.insert(0, children.pop(2))                     # c 移到最前
+    del children[2]                                         # 删除 b
+    children.append(_node("e", "回收"))                      # 新增节点
+    new["node_insights"]["e"] = {"title": "回收"}
+    del new["node_insights"]["b"]
+    patch = _roundtrip(OLD, new)
+    ops = {op["op"] for op in patch}
+    assert {"move", "remove", "add", "replace"} <= ops, patch
+    # 按 id 匹配：未改动的子树不出现在补丁里
+    assert not any(op["path"].startswith("/behavior_tree/children/1/children/0") for op in patch), patch
+
+
+def check_escaped_keys_and_lists():
+    old = {"a/b": [1, 2, 3], "m~n": {"x": 1}, "tags": ["x"]}
+    new = {"a/b": [1, 5, 3], "m~n": {"x": 2}, "tags": ["x", "y"]}
+    patch = _roundtrip(old, new)
+    assert {"op": "replace", "path": "/a~1b/1", "value": 5} in patch
+    assert {"op": "replace", "path": "/tags", "value": ["x", "y"]} in patch
+
+
+def check_duplicate_ids_replace_whole_list():
+    old = {"children": [_node("a", "1"), _node("a", "2")]}
+    new = {"children": [_node("a", "2"), _node("b", "3")]}
+    patch = _roundtrip(old, new)
+    assert patch == [{"op": "replace", "path": "/children", "value": new["children"]}]
+
+
+def check_apply_ops():
+    doc = {"list": [1, 2], "obj": {"k": "v"}}
+    patch = [
+        {"op": "test", "path": "/obj/k", "value": "v"},
+        {"op": "add", "path": "/list/-", "value": 3},
+        {"op": "copy", "from": "/obj", "path": "/copied"},
+    ]
+    assert apply_patch(doc, patch) == {"list": [1, 2, 3], "obj": {"k": "v"}, "copied": {"k": "v"}}
+    try:
+        apply_patch(doc, [{"op": "test", "path": "/obj/k", "value": "w"}])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("test 操作不匹配时应失败")
+
+
+def check_update_patch_roundtrip():
+    from app import app
+
+    client = app.test_client()
+    task = "向位置X（190,100）运输2车冷链物资，要求2小时内送达。"
+    body = {"model_name": "越野物流", "task_description": task}
+    base = client.post("/api/update", json=body).get_json()
+    edited = dict(body, task_description=task.replace("2小时", "3小时"), base_blueprint_id=base["blueprint_id"])
+    patched = client.post("/api/update", json=edited).get_json()
+    full = client.post("/api/update", json=dict(edited, base_blueprint_id=None)).get_json()
+
+    assert patched["base_blueprint_id"] == base["blueprint_id"] and "behavior_tree" not in patched, patched.keys()
+    previous = {
+        "default_focus": base["default_node_id"],
+        "behavior_tree": base["behavior_tree"],
+        "node_insights": base["node_insights"],
+    }
+    restored = apply_patch(previous, patched["patch"])
+    assert restored["behavior_tree"] == full["behavior_tree"]
+    assert restored["node_insights"] == full["node_insights"]
+    assert patched["blueprint_id"] == full["blueprint_id"]
+
+
+if __name__ == "__main__":
+    check_identical()
+    check_tree_edits()
+    check_escaped_keys_and_lists()
+    check_duplicate_ids_replace_whole_list()
+    check_apply_ops()
+    check_update_patch_roundtrip()
+    print("json patch checks passed")
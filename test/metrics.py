@@ -0,0 +1,106 @@
+"""
+运行时指标检查：Prometheus 文本格式（HELP / TYPE、标签转义）、直方图分桶累计（含边界值与 +Inf）、
+_sum / _count，以及 /metrics 接口导出请求与阶段耗时。
+
+用法：
+    python test/metrics.py
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+
+from support_models.metrics import Counter, Gauge, Histogram, Registry, restore_metrics, suppress_metrics  # noqa: E402
+
+
+def _lines(metric):
+    registry = Registry()
+    registry.register(metric)
+    text = registry.render()
+    assert text.endswith("\n")
+    return text.splitlines()
+
+
+def check_counter_and_escaping():
+    counter = Counter("demo_events_total", "Demo events.", ["cache", "result"])
+    counter.inc(cache="plain", result="hit")
+    counter.inc(2, cache="plain", result="hit")
+    counter.inc(0.5, cache='quo"te\\back\nline', result="miss")
+    assert _lines(counter) == [
+        "# HELP demo_events_total Demo events.",
+        "# TYPE demo_events_total counter",
+        'demo_events_total{cache="plain",result="hit"} 3',
+        'demo_events_total{cache="quo\\"te\\\\back\\nline",result="miss"} 0.5',
+    ]
+    unlabelled = Counter("demo_plain_total", "No labels.")
+    unlabelled.inc()
+    assert _lines(unlabelled)[-1] == "demo_plain_total 1"
+
+
+def check_gauge():
+    gauge = Gauge("demo_inflight", "In flight.", ["stage"])
+    with gauge.track(stage="generate"):
+        assert _lines(gauge)[-1] == 'demo_inflight{stage="generate"} 1'
+    assert _lines(gauge)[-1] == 'demo_inflight{stage="generate"} 0'
+    gauge.set(7, stage="generate")
+    assert _lines(gauge)[1] == "# TYPE demo_inflight gauge" and _lines(gauge)[-1].endswith(" 7")
+
+
+def check_histogram_buckets():
+    histogram = Histogram("demo_seconds", "Demo latency.", ["stage"], buckets=(1.0, 0.1, 0.5))
+    for value in (0.05, 0.1, 0.3, 0.5, 2.0):  # 等于上界的值计入该桶（le 语义）
+        histogram.observe(value, stage="llm")
+    assert _lines(histogram) == [
+        "# HELP demo_seconds Demo latency.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{stage="llm",le="0.1"} 2',
+        'demo_seconds_bucket{stage="llm",le="0.5"} 4',
+        'demo_seconds_bucket{stage="llm",le="1"} 4',
+        'demo_seconds_bucket{stage="llm",le="+Inf"} 5',
+        'demo_seconds_sum{stage="llm"} 2.95',
+        'demo_seconds_count{stage="llm"} 5',
+    ]
+
+
+def check_suppressed():
+    counter = Counter("demo_suppressed_total", "Suppressed.")
+    histogram = Histogram("demo_suppressed_seconds", "Suppressed.", buckets=(1.0,))
+    token = suppress_metrics()
+    try:
+        counter.inc()
+        histogram.observe(0.5)
+    finally:
+        restore_metrics(token)
+    assert len(_lines(counter)) == 2 and len(_lines(histogram)) == 2
+    counter.inc()
+    assert _lines(counter)[-1] == "demo_suppressed_total 1"
+
+
+def check_metrics_endpoint():
+    from app import app
+
+    client = app.test_client()
+    assert client.post("/api/update", json={"model_name": "越野物流", "task_description": ""}).status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.content_type.startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+    for name in ("supportmodel_http_request_duration_seconds", "supportmodel_stage_duration_seconds"):
+        assert f"# TYPE {name} histogram" in text, name
+    assert 'supportmodel_http_request_duration_seconds_count{route="/api/update",method="POST",status="200"} 1' in text
+    assert 'supportmodel_http_request_duration_seconds_bucket{route="/api/update",method="POST",status="200",le="+Inf"} 1' in text
+    for line in text.splitlines():
+        assert line.startswith("#") or len(line.rsplit(" ", 1)) == 2, line
+
+
+if __name__ == "__main__":
+    check_counter_and_escaping()
+    check_gauge()
+    check_histogram_buckets()
+    check_suppressed()
+    check_metrics_endpoint()
+    print("metrics checks passed")
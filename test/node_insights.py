@@ -0,0 +1,110 @@
+"""
+精简模式与批量节点洞察检查：精简 /api/update 只下发可点击节点 id、/api/node_insights 按 blueprint_id 批量查表、
+会话蓝图已淘汰时凭令牌或按任务描述重建，以及 node_ids 校验与数量上限。
+
+用法：
+    python test/node_insights.py
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+os.environ.pop("BLUEPRINT_TOKEN_KEY", None)
+
+import app as app_module  # noqa: E402
+from support_models.blueprint_store import blueprint_store  # noqa: E402
+
+client = app_module.app.test_client()
+BODY = {"model_name": "越野物流", "task_description": "向位置X（190,100）运输2车冷链物资，要求2小时内送达。"}
+
+
+def _insights(body):
+    response = client.post("/api/node_insights", json=body)
+    return response.status_code, response.get_json()
+
+
+def _single(full, node_id):
+    body = {"model_name": full["model_name"], "node_id": node_id, "blueprint_id": full["blueprint_id"]}
+    return client.post("/api/node_insight", json=body).get_json()
+
+
+def check_lean_payload():
+    full = client.post("/api/update", json=BODY).get_json()
+    lean = client.post("/api/update", json=dict(BODY, lean=True)).get_json()
+    assert "node_insights" not in lean and "node_insights" in full
+    assert lean["blueprint_id"] == full["blueprint_id"]
+    assert lean["behavior_tree"] == full["behavior_tree"] and lean["insight"] == full["insight"]
+    expected = [node_id for node_id, info in full["node_insights"].items() if info.get("knowledge_graph")]
+    assert expected and lean["graph_node_ids"] == expected, lean["graph_node_ids"]
+
+
+def check_batch_lookup():
+    full = client.post("/api/update", json=BODY).get_json()
+    node_ids = list(full["node_insights"])
+    hits = blueprint_store.stats()["hits"]
+    status, data = _insights({
+        "model_name": full["model_name"],
+        "blueprint_id": full["blueprint_id"],
+        "node_ids": node_ids + node_ids[:1],  # 重复 id 只返回一次
+    })
+    assert status == 200 and list(data["node_insights"]) == node_ids, data
+    # 整批只查一次会话存储，结果与逐个请求 /api/node_insight 一致
+    assert blueprint_store.stats()["hits"] == hits + 1
+    for node_id in node_ids:
+        assert data["node_insights"][node_id] == _single(full, node_id), node_id
+    assert _insights({"node_ids": []}) == (200, {"node_insights": {}})
+
+
+def check_evicted_blueprint():
+    full = client.post("/api/update", json=BODY).get_json()
+    node_id = next(iter(full["node_insights"]))
+    expected = _single(full, node_id)
+    blueprint_store.clear()
+
+    # 未知或已淘汰的 blueprint_id：按任务描述重建一次蓝图
+    body = dict(BODY, blueprint_id=full["blueprint_id"], node_ids=[node_id])
+    status, data = _insights(body)
+    assert status == 200 and data["node_insights"][node_id] == expected, data
+    status, data = _insights(dict(body, blueprint_id="0" * 32))
+    assert status == 200 and node_id in data["node_insights"]
+
+    # 配置令牌密钥后凭令牌取回，不再重建
+    os.environ["BLUEPRINT_TOKEN_KEY"] = "node-insights-check"
+    original = app_module._rebuild_blueprint
+    try:
+        token = client.post("/api/update", json=BODY).get_json()["blueprint_token"]
+        blueprint_store.clear()
+
+        def _no_rebuild(*args, **kwargs):
+            raise AssertionError("携带有效令牌时不应重建蓝图")
+
+        app_module._rebuild_blueprint = _no_rebuild
+        status, data = _insights(dict(body, task_description="", blueprint_token=token))
+        assert status == 200 and data["node_insights"][node_id] == expected, data
+    finally:
+        app_module._rebuild_blueprint = original
+        os.environ.pop("BLUEPRINT_TOKEN_KEY")
+
+
+def check_invalid_requests():
+    for body in ({}, {"node_ids": "n1"}, {"node_ids": ["n1", 2]}, {"node_ids": None}):
+        status, data = _insights(body)
+        assert status == 400 and "node_ids" in data["error"], (body, status, data)
+    limit = app_module.NODE_INSIGHTS_MAX_IDS
+    status, data = _insights({"node_ids": [f"n{i}" for i in range(limit + 1)]})
+    assert status == 400 and str(limit) in data["error"], data
+    status, _ = _insights(dict(BODY, node_ids=[f"n{i}" for i in range(limit)]))
+    assert status == 200
+
+
+if __name__ == "__main__":
+    check_lean_payload()
+    check_batch_lookup()
+    check_evicted_blueprint()
+    check_invalid_requests()
+    print("node insights checks passed")
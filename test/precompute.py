@@ -0,0 +1,130 @@
+"""
+离线预计算检查（本地假服务 bench/fake_llm.py）：生成并落盘、命中标准场景的条目不调用大模型、
+已缓存条目跳过（中断后续跑只处理剩余条目）、语义缓存保持缺省开启时近似任务仍真实生成并落盘，
+以及两阶段生成中部分子树失败的不完整蓝图不写入缓存。
+
+用法：
+    python test/precompute.py
+"""
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+_TMP = tempfile.mkdtemp(prefix="precompute-check-")
+os.environ.update({
+    "API_KEY": "fake",
+    "LOG_LEVEL": "ERROR",
+    "BLUEPRINT_CACHE": "1",
+    "CACHE_BACKEND": "sqlite",
+    "CACHE_PATH": os.path.join(_TMP, "cache.sqlite3"),
+})
+os.environ.pop("LLM_FANOUT", None)
+os.environ.pop("LLM_SEMANTIC_CACHE", None)
+
+from fake_llm import _NODE_IDS_RE, FakeLLM, _text, base_url, start_server  # noqa: E402
+from support_models import llm_client  # noqa: E402
+from support_models.blueprint_cache import get_blueprint_cache  # noqa: E402
+from support_models.precompute import read_corpus, run  # noqa: E402
+from support_models.scenarios import SCENARIOS  # noqa: E402
+from support_models.semantic_cache import semantic_cache  # noqa: E402
+
+_WITH_OUTPUT = [s for s in SCENARIOS if s.example_output][:3]
+TASKS = [
+    {"model_name": s.model_name, "task_description": s.example_input + "另需在途中设置两处补给点，并在返程时回收全部空置器材。"}
+    for s in _WITH_OUTPUT
+]
+STATIC = {"model_name": _WITH_OUTPUT[0].model_name, "task_description": _WITH_OUTPUT[0].example_input}
+_ROOT_IDS = {s.example_output["behavior_tree"]["id"] for s in _WITH_OUTPUT}
+
+
+class _FailingSubtrees(FakeLLM):
+    """两阶段生成的第二阶段中，不含根节点的子树组返回无法解析的内容。"""
+
+    def reply(self, body):
+        match = _NODE_IDS_RE.search(_text(body.get("messages", [])))
+        if match and not _ROOT_IDS & {i.strip() for i in match.group(1).split(",")}:
+            return "子树洞察生成中断", "stop", None
+        return super().reply(body)
+
+
+def _write_corpus(rows):
+    path = os.path.join(_TMP, f"corpus-{len(rows)}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows + rows[:1]:  # 重复条目应被去重
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return path
+
+
+def _statuses(results):
+    return sorted(r.status for r in results)
+
+
+def _use_server(fake):
+    server = start_server(fake)
+    os.environ["BASE_URL"] = base_url(server)
+    llm_client._client = None
+    return server
+
+
+def check_generate_skip_and_resume():
+    fake = FakeLLM()
+    server = _use_server(fake)
+
+    # 首次只跑一部分（模拟中途中断），之后全量重跑只处理剩余条目
+    partial = run(read_corpus(_write_corpus(TASKS[:1])), concurrency=2, retries=0)
+    assert _statuses(partial) == ["generated"], partial
+    items = read_corpus(_write_corpus(TASKS + [STATIC]))
+    assert len(items) == len(TASKS) + 1
+    resumed = run(items, concurrency=2, retries=0)
+    assert _statuses(resumed) == sorted(["skipped", "static"] + ["generated"] * (len(TASKS) - 1)), resumed
+    cache = get_blueprint_cache()
+    assert cache.count() == len(TASKS)
+    assert not cache.has_blueprint(STATIC["model_name"], STATIC["task_description"])
+
+    # 全部已缓存：再次运行不再调用大模型
+    requests = fake.stats["requests"]
+    again = run(items, concurrency=2, retries=0)
+    assert _statuses(again) == sorted(["static"] + ["skipped"] * len(TASKS)), again
+    assert fake.stats["requests"] == requests, fake.stats
+    server.shutdown()
+
+
+def check_semantic_neighbour_generated():
+    server = _use_server(FakeLLM())
+    scenario = _WITH_OUTPUT[0]
+    task = TASKS[0]["task_description"] + "（备用方案）"
+    neighbour = dict(TASKS[0], task_description=task.replace("位置X", "位置Z"))
+    # 语义缓存中已有只差地点代号的近似任务，在线请求会直接替换实体返回
+    semantic_cache.store(scenario.model_name, task, scenario.example_output)
+    assert semantic_cache.lookup(scenario.model_name, neighbour["task_description"]) is not None
+    try:
+        (result,) = run(read_corpus(_write_corpus([neighbour])), retries=0)
+    finally:
+        server.shutdown()
+    assert result.status == "generated", result
+    assert get_blueprint_cache().has_blueprint(neighbour["model_name"], neighbour["task_description"])
+
+
+def check_incomplete_blueprint_not_cached():
+    server = _use_server(_FailingSubtrees())
+    os.environ["LLM_FANOUT"] = "1"
+    row = dict(TASKS[0], task_description=TASKS[0]["task_description"] + "（夜间执行）")
+    try:
+        (result,) = run(read_corpus(_write_corpus([row])), retries=0)
+    finally:
+        os.environ.pop("LLM_FANOUT")
+        server.shutdown()
+    assert result.status == "failed" and "不完整" in result.error, result
+    assert not get_blueprint_cache().has_blueprint(row["model_name"], row["task_description"])
+
+
+if __name__ == "__main__":
+    check_generate_skip_and_resume()
+    check_semantic_neighbour_generated()
+    check_incomplete_blueprint_not_cached()
+    print("precompute checks passed")
@@ -0,0 +1,84 @@
+"""
+单请求剖析检查：令牌校验（含非 ASCII 输入不报错）、剖析报告保存与下载，以及报告目录缺省锚定在仓库下。
+
+用法：
+    python test/profiling.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["WARMUP"] = "0"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ["PROFILE_TOKEN"] = "admin-token"
+os.environ.pop("PROFILE_DIR", None)
+os.environ.pop("USE_LLM_BLUEPRINT", None)
+
+from support_models import profiling  # noqa: E402
+from support_models.profiling import get_profile_store, is_authorized  # noqa: E402
+
+
+def check_is_authorized():
+    assert is_authorized("admin-token")
+    for supplied in (None, "", "admin-toke", "admin-token ", "中", "admin-token中", "\udcff"):
+        assert not is_authorized(supplied), supplied
+    os.environ["PROFILE_TOKEN"] = "管理员令牌"
+    try:
+        assert is_authorized("管理员令牌") and not is_authorized("管理员")
+    finally:
+        os.environ["PROFILE_TOKEN"] = "admin-token"
+
+
+def check_default_dir_anchored():
+    profiling._store = None
+    cwd = os.getcwd()
+    os.chdir(tempfile.gettempdir())
+    try:
+        assert get_profile_store().directory == os.path.join(ROOT, "cache", "profiles")
+    finally:
+        os.chdir(cwd)
+        profiling._store = None
+
+
+def check_non_ascii_credential():
+    from app import app
+
+    client = app.test_client()
+    for path in ("/api/models?profile=%E4%B8%AD", "/api/models?profile=%FF"):
+        response = client.get(path)
+        assert response.status_code == 200 and "X-Profile-Id" not in response.headers, path
+    response = client.get("/api/models", headers={"X-Profile": "令牌".encode("utf-8").decode("latin-1")})
+    assert response.status_code == 200 and "X-Profile-Id" not in response.headers
+    assert client.get("/api/profiles/" + "0" * 32 + "?profile=%E4%B8%AD").status_code == 404
+
+
+def check_profile_roundtrip():
+    from app import app
+
+    os.environ["PROFILE_DIR"] = tempfile.mkdtemp(prefix="profiles-check-")
+    profiling._store = None
+    client = app.test_client()
+    response = client.post(
+        "/api/update",
+        json={"model_name": "越野物流", "task_description": "向位置X运输2车燃油"},
+        headers={"X-Profile": "admin-token"},
+    )
+    profile_id = response.headers["X-Profile-Id"]
+    assert response.get_json()["profile"]["id"] == profile_id
+    assert response.headers["Cache-Control"] == "no-store" and "ETag" not in response.headers
+
+    report = client.get(f"/api/profiles/{profile_id}", headers={"X-Profile": "admin-token"})
+    assert report.status_code == 200 and report.headers["X-Profile-Format"] == "top"
+    assert client.get(f"/api/profiles/{profile_id}").status_code == 404
+    assert f"{profile_id}.top.txt" in os.listdir(os.environ["PROFILE_DIR"])
+
+
+if __name__ == "__main__":
+    check_is_authorized()
+    check_default_dir_anchored()
+    check_non_ascii_credential()
+    check_profile_roundtrip()
+    print("profiling checks passed")
@@ -0,0 +1,76 @@
+"""
+提示词前缀稳定性检查：同一模型/场景下，不同任务描述的提示词除任务层外逐字节一致。
+
+用法：
+    python test/prompt_prefix.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support_models import llm_client  # noqa: E402
+from support_models.scenarios import SCENARIOS  # noqa: E402
+
+
+def _prompt(messages):
+    return llm_client._prompt_bytes(messages)
+
+
+def check_layers_are_prebuilt():
+    scenario = SCENARIOS[0]
+    a = llm_client._build_system_content(scenario.model_name, scenario)
+    b = llm_client._build_system_content(scenario.model_name, scenario)
+    assert a == b
+    # 场景层缓存后返回同一个字符串对象，而不是每次重新拼接
+    assert llm_client._scenario_layer(scenario.model_name, scenario) is llm_client._scenario_layer(
+        scenario.model_name, scenario
+    )
+    assert llm_client._classification_system_content() is llm_client._classification_system_content()
+    assert a.startswith(llm_client._GLOBAL_INSTRUCTIONS)
+
+
+def check_prefix_stability():
+    tasks = [
+        "向位置X（190,100）运输2车冷链物资，要求3小时内送达。",
+        "向位置Y（120,80）运输5车弹药，道路存在损毁风险。",
+    ]
+    for scenario in SCENARIOS:
+        builders = [
+            lambda t: llm_client._build_prompt(scenario.model_name, t, scenario),
+            lambda t: llm_client._build_tree_prompt(scenario.model_name, t, scenario),
+        ]
+        for build in builders:
+            first, second = build(tasks[0]), build(tasks[1])
+            assert first[0] == second[0], f"{scenario.id}: system 层不一致"
+            task_at = first[1]["content"].index(tasks[0])
+            assert first[1]["content"][:task_at] == second[1]["content"][:task_at]
+            shared = llm_client._shared_prefix_len(_prompt(first), _prompt(second))
+            # 共享前缀必须覆盖到任务文本开始之前
+            assert shared >= len(_prompt(first)) - len(tasks[0].encode("utf-8")) - len("。".encode("utf-8")) - 64
+
+    first = llm_client._build_classification_prompt(tasks[0])
+    second = llm_client._build_classification_prompt(tasks[1])
+    assert first[0] == second[0]
+
+
+def check_prefix_counter():
+    scenario = SCENARIOS[0]
+    before = llm_client.get_prompt_prefix_stats().get("generate", {}).get("prompts", 0)
+    a = llm_client._build_prompt(scenario.model_name, "向位置X运输资源Y", scenario)
+    b = llm_client._build_prompt(scenario.model_name, "向位置Z运输资源W", scenario)
+    assert llm_client._record_prompt_prefix("generate", a) == 0 or before > 0
+    shared = llm_client._record_prompt_prefix("generate", b)
+    stats = llm_client.get_prompt_prefix_stats()["generate"]
+    assert stats["prompts"] == before + 2
+    assert stats["last_shared_prefix_bytes"] == shared
+    assert shared == llm_client._shared_prefix_len(_prompt(a), _prompt(b))
+    assert shared > 0.9 * len(_prompt(a)), (shared, len(_prompt(a)))
+    print(f"consecutive prompts share {shared}/{len(_prompt(b))} bytes")
+
+
+if __name__ == "__main__":
+    check_layers_are_prebuilt()
+    check_prefix_stability()
+    check_prefix_counter()
+    print("prompt prefix checks passed")
@@ -0,0 +1,146 @@
+"""
+语义缓存检查：实体抽取（货物名称止于连接词）与模板、命中时只替换地点与货物、坐标/数量/时限不同视为未命中，
+以及各类拒绝情形（numeric_changed / unaligned / ambiguous / entity_mismatch / invalid_json）与 LRU 容量。
+
+用法：
+    python test/semantic_cache.py
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from support_models.semantic_cache import (  # noqa: E402
+    SemanticBlueprintCache,
+    SubstitutionRejected,
+    extract_entities,
+    substitute_entities,
+    task_template,
+)
+
+MODEL = "越野物流"
+TASK_A = "向位置X（190,100）运输2车冷链物资，要求3小时内送达。"
+TASK_B = "向位置Y（190,100）运输2车燃油，要求3小时内送达。"
+TASK_NUMERIC = "向位置X（190,100）运输5车冷链物资，要求3小时内送达。"
+BLUEPRINT_A = {
+    "behavior_tree": {"id": "root", "name": "向位置X运输2车冷链物资", "children": []},
+    "node_insights": {"root": "目标点 位置X（190, 100），3小时内送达，共 2车 冷链物资，每车 1辆 随行保障。"},
+}
+
+
+def _rejected(reason, blueprint_text, old_task, new_task):
+    try:
+        substitute_entities(blueprint_text, extract_entities(old_task), extract_entities(new_task))
+    except SubstitutionRejected as e:
+        assert e.reason == reason, (e.reason, reason)
+    else:
+        raise AssertionError(f"应以 {reason} 拒绝替换")
+
+
+def check_template():
+    kinds = [e.kind for e in extract_entities(TASK_A)]
+    assert kinds == ["LOC", "COORD", "QTY", "CARGO", "TIME"], kinds
+    assert task_template(TASK_A) == task_template(TASK_B) == "向<LOC><COORD>运输<QTY><CARGO>，要求<TIME>内送达。"
+    # 货物名称不吞并后面的连接词与目的地
+    for task, cargo in (
+        ("运输2车冷链物资到A点", "冷链物资"),
+        ("运输5箱药品和3箱饮用水前往B区域", "饮用水"),
+        ("运输冷链物资Y至目的地X", "冷链物资Y"),
+        ("向位置X运输2车冷链物资资源Y以及2车食物", "冷链物资资源Y"),
+    ):
+        found = [e.value for e in extract_entities(task) if e.kind == "CARGO"]
+        assert found == [cargo], (task, found)
+
+
+def check_substitution():
+    cache = SemanticBlueprintCache()
+    cache.store(MODEL, TASK_A, BLUEPRINT_A)
+    blueprint = cache.lookup(MODEL, TASK_B)
+    assert blueprint is not None
+    assert blueprint["behavior_tree"]["name"] == "向位置Y运输2车燃油"
+    assert blueprint["node_insights"]["root"] == "目标点 位置Y（190, 100），3小时内送达，共 2车 燃油，每车 1辆 随行保障。", blueprint
+    assert cache.lookup("侦察搜救", TASK_B) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def check_numeric_change_misses():
+    cache = SemanticBlueprintCache()
+    cache.store(MODEL, TASK_A, BLUEPRINT_A)
+    # 2车→5车 时蓝图中推算出的"1辆"等无法对齐，按未命中处理，交由大模型生成
+    for task in (
+        TASK_NUMERIC,
+        TASK_A.replace("190,100", "20,30"),
+        TASK_A.replace("3小时", "4小时"),
+    ):
+        assert cache.lookup(MODEL, task) is None, task
+    assert cache.stats()["misses"] == 3 and cache.stats()["hits"] == 0
+    # 数值相同的任务各自成条，互不覆盖
+    cache.store(MODEL, TASK_NUMERIC, {"name": "位置X 5车冷链物资"})
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(MODEL, TASK_NUMERIC.replace("位置X", "位置Z")) == {"name": "位置Z 5车冷链物资"}
+
+
+def check_swap_does_not_chain():
+    old = "向位置X运输燃油，再向位置Y补送，最后返回位置Z。"
+    new = "向位置Y运输燃油，再向位置Z补送，最后返回位置X。"
+    text = '{"plan": "位置X → 位置Y → 位置Z"}'
+    blueprint = substitute_entities(text, extract_entities(old), extract_entities(new))
+    assert blueprint == {"plan": "位置Y → 位置Z → 位置X"}, blueprint
+
+
+def check_rejections():
+    import json
+
+    text = json.dumps(BLUEPRINT_A, ensure_ascii=False)
+    # 坐标、数量、时限不同
+    _rejected("numeric_changed", text, TASK_A, TASK_NUMERIC)
+    # 蓝图中找不到旧货物名称
+    _rejected("unaligned", text.replace("冷链物资", "物资"), TASK_A, TASK_B)
+    # 同一地点代号对应两个新值
+    _rejected(
+        "ambiguous",
+        text,
+        "向位置X（190,100）运输2车冷链物资，再向位置X（20,30）补送。",
+        "向位置Y（190,100）运输2车冷链物资，再向位置Z（20,30）补送。",
+    )
+    # 实体数量不一致
+    _rejected("entity_mismatch", text, TASK_A, "向位置Y（190,100）运输2车燃油。")
+    # 替换结果不是合法 JSON 对象
+    _rejected("invalid_json", '["位置X 冷链物资"]', TASK_A, TASK_B)
+    _rejected("invalid_json", '{"name": "位置X 冷链物资"', TASK_A, TASK_B)
+
+
+def check_lookup_counts_rejections():
+    cache = SemanticBlueprintCache()
+    cache.store(MODEL, TASK_A, {"name": "与实体无关的蓝图"})
+    assert cache.lookup(MODEL, TASK_B) is None
+    cache.store(MODEL, TASK_A, BLUEPRINT_A)
+
+    def _validate(blueprint):
+        raise ValueError("缺少字段")
+
+    assert cache.lookup(MODEL, TASK_B, validate=_validate) is None
+    stats = cache.stats()
+    assert stats["rejected_unaligned"] == 1 and stats["rejected_invalid"] == 1 and stats["hits"] == 0, stats
+
+
+def check_lru():
+    cache = SemanticBlueprintCache(max_entries=2)
+    tasks = ["运输2车燃油。", "侦察位置X（1,2）。", "搜救3名人员。"]
+    for task in tasks:
+        cache.store(MODEL, task, {"task": task})
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(MODEL, tasks[0]) is None
+    assert cache.lookup(MODEL, tasks[2]) == {"task": tasks[2]}
+
+
+if __name__ == "__main__":
+    check_template()
+    check_substitution()
+    check_numeric_change_misses()
+    check_swap_does_not_chain()
+    check_rejections()
+    check_lookup_counts_rejections()
+    check_lru()
+    print("semantic cache checks passed")
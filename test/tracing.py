@@ -0,0 +1,188 @@
+"""
+请求追踪检查：采样开关、traceparent 强制采样、慢请求阈值、span 嵌套与 parentSpanId、
+线程池任务继承上下文、OTLP/JSON 形态的 JSONL 输出与按大小轮转，以及 /api/update 的 X-Trace-Id。
+
+用法：
+    python test/tracing.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="tracing-check-")
+os.environ.update({"WARMUP": "0", "LOG_LEVEL": "ERROR", "TRACE_PATH": os.path.join(_TMP, "spans.jsonl")})
+for name in ("TRACE_SAMPLE_RATE", "TRACE_SLOW_MS", "USE_LLM_BLUEPRINT"):
+    os.environ.pop(name, None)
+
+from support_models import tracing  # noqa: E402
+from support_models.tracing import (  # noqa: E402
+    NOOP_SPAN,
+    JsonlSpanExporter,
+    current_span,
+    finish_trace,
+    span,
+    start_trace,
+    traced,
+    wrap_context,
+)
+
+PATH = os.environ["TRACE_PATH"]
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def _read_spans():
+    if not os.path.exists(PATH):
+        return []
+    with open(PATH, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f]
+    os.remove(PATH)
+    return spans
+
+
+def _attributes(record):
+    return {item["key"]: next(iter(item["value"].values())) for item in record["attributes"]}
+
+
+def _sample(rate=None, slow_ms=None):
+    for name, value in (("TRACE_SAMPLE_RATE", rate), ("TRACE_SLOW_MS", slow_ms)):
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = str(value)
+
+
+@traced()
+def _decorated():
+    current_span().set_attribute("decorated", True)
+
+
+def check_not_sampled():
+    _sample()
+    assert start_trace("GET /") is None
+    assert current_span() is NOOP_SPAN
+    with span("child") as child:
+        assert child is NOOP_SPAN
+    _decorated()
+    # 未强制采样的 traceparent 同样不记录
+    assert start_trace("GET /", f"00-{TRACE_ID}-{PARENT_ID}-00") is None
+    finish_trace(None)
+    assert _read_spans() == []
+
+
+def check_nesting_and_output():
+    _sample(rate=1)
+    handle = start_trace("POST /api/update", **{"http.method": "POST"})
+    root, _ = handle
+    with span("build", count=3, ratio=0.5, missing=None):
+        _decorated()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(wrap_context(lambda: current_span().set_attribute("pooled", "yes"))).result()
+            pool.submit(wrap_context(_decorated)).result()
+    try:
+        with span("failing"):
+            raise ValueError("坏数据")
+    except ValueError:
+        pass
+    finish_trace(handle)
+    assert current_span() is NOOP_SPAN
+
+    spans = {record["name"]: record for record in _read_spans() if record["name"] != "_decorated"}
+    assert set(spans) == {"POST /api/update", "build", "failing"}, spans.keys()
+    assert all(record["traceId"] == root.trace_id and len(record["traceId"]) == 32 for record in spans.values())
+    top = spans["POST /api/update"]
+    assert top["parentSpanId"] == "" and top["kind"] == 2 and top["status"] == {"code": 1}
+    assert spans["build"]["parentSpanId"] == top["spanId"] and spans["build"]["kind"] == 1
+    assert _attributes(spans["build"]) == {"count": "3", "ratio": 0.5, "pooled": "yes"}
+    assert spans["failing"]["status"] == {"code": 2, "message": "ValueError: 坏数据"}
+    assert int(top["endTimeUnixNano"]) >= int(spans["build"]["endTimeUnixNano"]) > int(top["startTimeUnixNano"])
+    assert top["resource"]["attributes"][0]["value"] == {"stringValue": "supportmodel"}
+
+
+def check_decorated_parents():
+    _sample(rate=1)
+    handle = start_trace("root")
+    with span("outer"):
+        _decorated()
+    finish_trace(handle)
+    records = {record["name"]: record for record in _read_spans()}
+    assert records["_decorated"]["parentSpanId"] == records["outer"]["spanId"]
+    assert _attributes(records["_decorated"]) == {"decorated": True}
+
+
+def check_traceparent_forces_sampling():
+    _sample()
+    handle = start_trace("GET /", f"00-{TRACE_ID}-{PARENT_ID}-01")
+    assert handle is not None and handle[0].trace_id == TRACE_ID
+    finish_trace(handle)
+    (record,) = _read_spans()
+    assert record["traceId"] == TRACE_ID and record["parentSpanId"] == PARENT_ID and record["kind"] == 2
+    assert start_trace("GET /", "00-zz-bad-01") is None
+
+
+def check_slow_threshold():
+    _sample(slow_ms=50)
+    finish_trace(start_trace("fast"))
+    assert _read_spans() == []
+    handle = start_trace("slow")
+    time.sleep(0.08)
+    finish_trace(handle)
+    assert [record["name"] for record in _read_spans()] == ["slow"]
+
+
+def check_rotation():
+    path = os.path.join(_TMP, "rotate", "spans.jsonl")
+    exporter = JsonlSpanExporter(path, max_bytes=1500, backup_count=2)
+    _sample(rate=1)
+    for index in range(12):
+        handle = start_trace(f"request-{index}")
+        finish_trace(handle)
+        exporter.export([handle[0]])
+    _read_spans()
+    files = sorted(os.listdir(os.path.dirname(path)))
+    assert files == ["spans.jsonl", "spans.jsonl.1", "spans.jsonl.2"], files
+    for name in files:
+        size = os.path.getsize(os.path.join(os.path.dirname(path), name))
+        assert 0 < size <= 1500, (name, size)
+    with open(path, encoding="utf-8") as f:
+        assert json.loads(f.readlines()[-1])["name"] == "request-11"
+
+
+def check_update_trace():
+    from app import app
+
+    _sample(rate=1)
+    tracing._exporter = None
+    response = app.test_client().post(
+        "/api/update",
+        json={"model_name": "越野物流", "task_description": "向位置X运输2车燃油"},
+        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"},
+    )
+    assert response.headers["X-Trace-Id"] == TRACE_ID
+    records = _read_spans()
+    by_id = {record["spanId"]: record for record in records}
+    root = next(record for record in records if record["name"] == "POST /api/update")
+    assert root["parentSpanId"] == PARENT_ID
+    # 每个 span 的父节点要么是请求根，要么是同一追踪里的另一个 span
+    for record in records:
+        assert record["traceId"] == TRACE_ID
+        assert record is root or record["parentSpanId"] in by_id, record["name"]
+    assert "build_behavior_tree" in {record["name"] for record in records}
+    _sample()
+
+
+if __name__ == "__main__":
+    check_not_sampled()
+    check_nesting_and_output()
+    check_decorated_parents()
+    check_traceparent_forces_sampling()
+    check_slow_threshold()
+    check_rotation()
+    check_update_trace()
+    print("tracing checks passed")
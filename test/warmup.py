@@ -0,0 +1,68 @@
+"""
+启动预热检查：缺省在后台执行、不阻塞导入；预热请求不计入 /metrics 的请求与阶段直方图，也不产生追踪记录。
+
+用法：
+    python test/warmup.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="warmup-check-")
+TRACE_PATH = os.path.join(_TMP, "spans.jsonl")
+
+_BACKGROUND_PROBE = """
+import app
+status = app.warmup.report()["status"]
+assert app.warmup.wait(60), "预热未完成"
+report = app.warmup.report()
+print(status, report["status"], report["items"], report["failed"])
+"""
+
+
+def check_background_by_default():
+    env = dict(os.environ, LOG_LEVEL="ERROR", BLUEPRINT_CACHE="0")
+    env.pop("WARMUP", None)
+    output = subprocess.run(
+        [sys.executable, "-c", _BACKGROUND_PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout.split()
+    # 导入返回时预热尚未完成；之后在后台完成全部步骤
+    assert output[0] in {"pending", "running"} and output[1] == "ready", output
+    assert int(output[2]) > 0 and output[3] == "0", output
+
+
+def check_warmup_requests_not_observed():
+    os.environ.update({
+        "WARMUP": "sync",
+        "LOG_LEVEL": "ERROR",
+        "BLUEPRINT_CACHE": "0",
+        "TRACE_SAMPLE_RATE": "1",
+        "TRACE_PATH": TRACE_PATH,
+    })
+    os.environ.pop("USE_LLM_BLUEPRINT", None)
+    from app import app, warmup
+    from support_models.compression import precompressed_cache
+    from support_models.metrics import render_metrics
+
+    assert warmup.report()["status"] == "ready" and precompressed_cache.stats()["entries"] > 0
+    metrics = render_metrics()
+    assert "supportmodel_http_request_duration_seconds_count" not in metrics
+    assert "supportmodel_stage_duration_seconds_count" not in metrics
+    assert not os.path.exists(TRACE_PATH)
+
+    response = app.test_client().post("/api/update", json={"model_name": "越野物流", "task_description": ""})
+    assert response.status_code == 200 and response.headers.get("X-Trace-Id")
+    metrics = render_metrics()
+    assert 'supportmodel_http_request_duration_seconds_count{route="/api/update",method="POST",status="200"} 1' in metrics
+    assert "supportmodel_stage_duration_seconds_count" in metrics
+    assert os.path.exists(TRACE_PATH)
+
+
+if __name__ == "__main__":
+    check_background_by_default()
+    check_warmup_requests_not_observed()
+    print("warmup checks passed")